@@ -0,0 +1,72 @@
+"""Converting many rows: scalar ``convert_with_rates`` vs. :class:`RateMatrix`.
+
+    python -m benchmarks.rate_matrix [--rows 1000000] [--seed 1]
+
+Random amounts and currency pairs over a realistic rates table; checks that
+both paths give identical cents for every row before timing them.
+"""
+import argparse
+import random
+import time
+from decimal import Decimal
+
+import numpy as np
+from src.models import TransactionKind
+from src.transactions.currency_converter import convert_with_rates
+from src.transactions.rate_matrix import RateMatrix
+
+RATES = {
+    "USD": 1.0, "UAH": 41.4892, "EUR": 0.9259259259259259, "GBP": 0.7874, "PLN": 3.9714,
+    "JPY": 149.82, "CHF": 0.8801, "SEK": 10.6923, "NOK": 10.9876, "AUD": 1.5312,
+}
+
+
+def _data(rows: int, seed: int):
+    rng = random.Random(seed)
+    codes = list(RATES)
+    cents = [rng.randrange(1, 10_000_000) for _ in range(rows)]
+    src = [rng.choice(codes) for _ in range(rows)]
+    dst = [rng.choice(codes) for _ in range(rows)]
+    expense = [rng.random() < 0.8 for _ in range(rows)]
+    return cents, src, dst, expense
+
+
+def _scalar(cents, src, dst, expense) -> list:
+    kinds = {True: TransactionKind.EXPENSE, False: TransactionKind.INCOME}
+    return [
+        int(convert_with_rates(RATES, d, kinds[e], Decimal(c).scaleb(-2), s).scaleb(2))
+        for c, s, d, e in zip(cents, src, dst, expense)
+    ]
+
+
+def _vectorized(cents, src, dst, expense) -> np.ndarray:
+    return RateMatrix(RATES).convert_cents(cents, src, dst, expense)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    data = _data(args.rows, args.seed)
+
+    started = time.perf_counter()
+    scalar = _scalar(*data)
+    scalar_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    vectorized = _vectorized(*data)
+    vectorized_time = time.perf_counter() - started
+
+    mismatches = int(np.count_nonzero(np.asarray(scalar, dtype=np.int64) != vectorized))
+    print(f"rows: {args.rows}, mismatches: {mismatches}")
+    print(f"scalar:     {scalar_time * 1e3:9.1f} ms  {scalar_time / args.rows * 1e9:7.1f} ns/row")
+    print(f"vectorized: {vectorized_time * 1e3:9.1f} ms  {vectorized_time / args.rows * 1e9:7.1f} ns/row")
+    print(f"speedup: {scalar_time / vectorized_time:.1f}x")
+    if mismatches:
+        raise SystemExit("vectorized results differ from the scalar path")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Per-row cost of the transaction list response, before and after the fast path.
+
+    python -m benchmarks.serialization [--rows 1000] [--repeat 50]
+
+Runs against an in-memory SQLite database, so it measures row loading and
+serialization only, not network or Postgres time. "before" is what the
+endpoint used to do: load ORM objects, validate them through
+``response_model`` and encode with the stdlib ``json``; "after" is
+``select(*OUT_COLUMNS)`` + :func:`src.utils.fast_json.rows_response`.
+"""
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import List
+
+from pydantic import TypeAdapter
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+from src.database import Base
+from src.models import Transaction, TransactionKind, User
+from src.transactions.references import CATEGORY_NAME, CURRENCY_CODE, join_names, with_keys
+from src.transactions.schemas import TransactionOut
+from src.transactions.transaction_router import OUT_COLUMNS, OUT_KEYS
+from src.utils.fast_json import rows_response
+
+list_adapter = TypeAdapter(List[TransactionOut])
+ORM_KEYS = ("id_", "name", "amount", "kind", "date")
+
+
+async def _seed(session, rows: int) -> None:
+    session.add(User(id_=1, username="bench", email="bench@example.com", hashed_password="x"))
+    await session.flush()
+    keys = await with_keys(session, {"category_name": "food", "currency": "USD"})
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    await session.execute(insert(Transaction), [
+        {
+            "user_id": 1, "name": f"Transaction {i}", "amount": Decimal(i % 1000) + Decimal("0.99"),
+            "kind": TransactionKind.EXPENSE if i % 3 else TransactionKind.INCOME,
+            "date": start + timedelta(minutes=i), **keys,
+        }
+        for i in range(rows)
+    ])
+    await session.commit()
+
+
+async def _before(session, rows: int) -> bytes:
+    txs = (await session.execute(
+        join_names(select(Transaction, CATEGORY_NAME, CURRENCY_CODE)).where(Transaction.user_id == 1)
+        .order_by(Transaction.date.desc(), Transaction.id_.desc()).limit(rows)
+    )).all()
+    items = [
+        {**{key: getattr(tx, key) for key in ORM_KEYS}, "category_name": name, "currency": code}
+        for tx, name, code in txs
+    ]
+    content = list_adapter.dump_python(list_adapter.validate_python(items), mode="json")
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+
+async def _after(session, rows: int) -> bytes:
+    result = (await session.execute(
+        join_names(select(*OUT_COLUMNS)).where(Transaction.user_id == 1)
+        .order_by(Transaction.date.desc(), Transaction.id_.desc()).limit(rows)
+    )).all()
+    return rows_response(result, OUT_KEYS, defaults={"new_capital": None}).body
+
+
+async def _time(session_factory, fn, rows: int, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        async with session_factory() as session:
+            started = time.perf_counter()
+            await fn(session, rows)
+            best = min(best, time.perf_counter() - started)
+    return best
+
+
+async def _main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:", poolclass=StaticPool)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with session_factory() as session:
+        await _seed(session, args.rows)
+
+    async with session_factory() as session:
+        assert json.loads(await _before(session, args.rows)) == json.loads(await _after(session, args.rows))
+
+    before = await _time(session_factory, _before, args.rows, args.repeat)
+    after = await _time(session_factory, _after, args.rows, args.repeat)
+    print(f"rows per response: {args.rows}, best of {args.repeat}")
+    print(f"before: {before * 1e3:8.2f} ms  {before / args.rows * 1e6:6.2f} us/row")
+    print(f"after:  {after * 1e3:8.2f} ms  {after / args.rows * 1e6:6.2f} us/row")
+    print(f"speedup: {before / after:.1f}x")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -0,0 +1,20 @@
+from fastapi import APIRouter, Depends, Query, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.admin.schemas import CapitalReconciliationOut
+from src.database import get_db
+from src.dependencies import get_current_admin
+from src.models import User
+from src.transactions.reconciliation import RECONCILE_BATCH_SIZE, reconcile_capital
+
+admin_router = APIRouter()
+
+
+@admin_router.post("/reconcile-capital", response_model=CapitalReconciliationOut, status_code=status.HTTP_200_OK)
+async def reconcile_users_capital(
+        fix: bool = Query(False, description="Apply the drift to users.capital"),
+        batch_size: int = Query(RECONCILE_BATCH_SIZE, ge=1, le=10000),
+        session: AsyncSession = Depends(get_db),
+        admin: User = Depends(get_current_admin),
+):
+    return await reconcile_capital(session, fix=fix, batch_size=batch_size)
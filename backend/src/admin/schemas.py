@@ -0,0 +1,18 @@
+from typing import List
+
+from pydantic import BaseModel
+
+
+class CapitalDrift(BaseModel):
+    user_id: int
+    capital: float
+    expected: float
+    drift: float
+
+
+class CapitalReconciliationOut(BaseModel):
+    users_checked: int
+    drifted_count: int
+    drifted: List[CapitalDrift]
+    fixed: int
+    unconvertible_rows: int
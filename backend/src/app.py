@@ -13,25 +13,34 @@ from prometheus_fastapi_instrumentator import Instrumentator
 from starlette.middleware.sessions import SessionMiddleware
 
 import src.models  # noqa: F401 – registers all ORM models with Base.metadata
+from src.admin.admin_router import admin_router
 from src.auth.auth_router import auth_router
 from src.config import origins
 from src.currencies.currency_router import currency_router, register_currency_cron
-from src.database import Base, engine, get_db
+from src.currencies.rate_events import register_rate_listener
+from src.database import AsyncSessionLocal, Base, engine, get_db
 from src.for_testing.dev_router import dev_router
 from src.github_oauth.github_oauth import github_oauth_router
 from src.goals.goal_router import goal_router
 from src.google_oauth.google_router import google_oauth_router
 from src.health.routers import health_router
+from src.recurring.recurring_router import recurring_router
+from src.recurring.scheduler import register_recurring_cron
+from src.transactions.currency_converter import rate_cache
+from src.transactions.partitioning import register_partition_cron
 from src.transactions.transaction_router import transaction_router
 from src.two_fa.two_fa_router import two_fa_router
 from src.users.users_router import users_router
+from src.utils.idempotency import register_idempotency_cron
 
 
 @asynccontextmanager
 async def lifespan(application: FastAPI):
-    """Create all DB tables on startup (dev/docker convenience)."""
+    """Create all DB tables on startup (dev/docker convenience) and load the rates cache."""
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+    async with AsyncSessionLocal() as session:
+        await rate_cache.reload(session)
     yield
 
 
@@ -41,9 +50,11 @@ def create_app(*, enable_cron: bool = True) -> FastAPI:
     Parameters
     ----------
     enable_cron:
-        When *True* (default / production), the NBU currency-refresh cron is
-        registered as a startup task.  Pass *False* in tests to avoid
-        background tasks that prevent the event-loop from closing.
+        When *True* (default / production), the NBU currency-refresh cron and
+        the rates listener, the recurring-transaction scheduler, the partition maintenance and the
+        idempotency-key purge are registered as startup tasks.
+        Pass *False* in tests to avoid background tasks that prevent the
+        event-loop from closing.
     """
     application = FastAPI(
         title="Homiak Finance",
@@ -57,10 +68,15 @@ def create_app(*, enable_cron: bool = True) -> FastAPI:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["X-Next-Cursor", "Idempotency-Replayed"],
     )
 
     if enable_cron:
         register_currency_cron(application)
+        register_rate_listener(application)
+        register_recurring_cron(application)
+        register_partition_cron(application)
+        register_idempotency_cron(application)
 
     @application.middleware("http")
     async def add_process_time_header(request: Request, call_next):
@@ -81,7 +97,9 @@ def create_app(*, enable_cron: bool = True) -> FastAPI:
     application.include_router(google_oauth_router, prefix="/api", tags=["Google OAuth"])
     application.include_router(github_oauth_router, prefix="/api", tags=["Github OAuth"])
     application.include_router(goal_router, prefix="/api/goals", tags=["Goals"])
+    application.include_router(recurring_router, prefix="/api/recurring", tags=["Recurring"])
     application.include_router(two_fa_router, prefix="/api/2fa", tags=["2FA"])
+    application.include_router(admin_router, prefix="/api/admin", tags=["Admin"])
 
     Instrumentator().instrument(application).expose(application, endpoint="/metrics")
 
@@ -1,6 +1,7 @@
 import logging
 import os
 import re
+import tempfile
 from datetime import timedelta
 
 from dotenv import load_dotenv
@@ -51,8 +52,27 @@ console_handler.setFormatter(formatter)
 logger.addHandler(console_handler)
 
 
+# ===== transactions =====
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+# months of history kept attached to the partitioned table; unset keeps everything
+TRANSACTION_RETENTION_MONTHS = int(os.getenv("TRANSACTION_RETENTION_MONTHS") or 0) or None
+
+# how long a stored Idempotency-Key answers repeats of its request
+IDEMPOTENCY_KEY_TTL_HOURS = int(os.getenv("IDEMPOTENCY_KEY_TTL_HOURS", "24"))
+
 # ===== currencies =====
+# a file:// URL reads rates from a local NBU JSON file instead (tests, offline deployments)
 NBU_API_URL = os.getenv("NBU_API_URL")
+NBU_FETCH_RETRIES = int(os.getenv("NBU_FETCH_RETRIES", "3"))
+NBU_FETCH_BACKOFF_SECONDS = float(os.getenv("NBU_FETCH_BACKOFF_SECONDS", "1"))
+# a worker that missed a refresh reloads its in-memory rates after this long
+RATES_CACHE_TTL_SECONDS = int(os.getenv("RATES_CACHE_TTL_SECONDS", "300"))
+# how often the leader pulls rates from NBU
+CURRENCY_REFRESH_SECONDS = int(os.getenv("CURRENCY_REFRESH_SECONDS", "3600"))
+# how often workers re-read the rates when there is no Postgres LISTEN/NOTIFY
+RATES_POLL_SECONDS = float(os.getenv("RATES_POLL_SECONDS", "30"))
+# lock files for leader election when the database is not Postgres
+LEADER_LOCK_DIR = os.getenv("LEADER_LOCK_DIR", tempfile.gettempdir())
 
 # ===== JWT =====
 ALGORITHM = os.getenv("ALGORITHM")
@@ -1,62 +1,50 @@
-from typing import Dict
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, NamedTuple, Optional, Tuple
 
 import httpx
-from fastapi import APIRouter, Depends, FastAPI, HTTPException, Path, status
+from fastapi import APIRouter, Depends, FastAPI, HTTPException, Path, Request, Response, status
 from fastapi_utilities import repeat_every
-from sqlalchemy import select
 from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.config import NBU_API_URL, logger
-from src.database import AsyncSessionLocal, get_db
+from src.config import CURRENCY_REFRESH_SECONDS, logger
+from src.currencies.history import record_rates
+from src.currencies.nbu_client import NbuClient
+from src.currencies.rate_events import notify_rates
+from src.database import AsyncSessionLocal, engine, get_db
 from src.models import Currency
+from src.transactions.currency_converter import load_rates, rate_cache, utc_today
+from src.utils.fast_json import dumps
+from src.utils.leader import LeaderLock
 
 currency_router = APIRouter()
 
 
-async def fetch_rates_from_nbu() -> Dict[str, float]:
+nbu_client = NbuClient()
+
+
+async def fetch_rates_from_nbu(client: NbuClient = nbu_client) -> Optional[Dict[str, float]]:
+    """New rates from NBU, or ``None`` if they have not changed since the last confirmed fetch."""
     try:
-        async with httpx.AsyncClient(timeout=20) as client:
-            r = await client.get(NBU_API_URL)
-            r.raise_for_status()
-            data = r.json()
+        return await client.fetch()
     except httpx.TimeoutException as e:
         logger.error("NBU timeout: %s", e)
         raise HTTPException(status_code=504, detail="Rates provider timeout") from e
     except httpx.HTTPStatusError as e:
         logger.error("NBU HTTP error: %s", e)
         raise HTTPException(status_code=502, detail="Rates provider error") from e
+    except ValueError as e:
+        logger.error("NBU payload rejected: %s", e)
+        raise HTTPException(status_code=502, detail=str(e)) from e
     except Exception as e:
         logger.exception("NBU unexpected error")
         raise HTTPException(status_code=500, detail="Failed to fetch rates") from e
 
-    usd_item = next((x for x in data if str(x.get("cc", "")).upper() == "USD"), None)
-    if not usd_item or not usd_item.get("rate"):
-        raise HTTPException(status_code=502, detail="USD rate not found in NBU response")
-
-    usd_uah = float(usd_item["rate"])
-
-    result: Dict[str, float] = {"USD": 1.0, "UAH": usd_uah}
-
-    for item in data:
-        code = str(item.get("cc", "")).upper()
-        rate_uah = item.get("rate")
-        if not code or rate_uah is None:
-            continue
-        if code in ("USD", "UAH"):
-            continue
-        try:
-            rate_uah = float(rate_uah)
-            if rate_uah <= 0:
-                continue
-            result[code] = usd_uah / rate_uah
-        except (TypeError, ValueError):
-            continue
 
-    return result
-
-
-async def upsert_rates(session: AsyncSession, rates: Dict[str, float]) -> int:
+async def upsert_rates(session: AsyncSession, rates: Dict[str, float], changed_at: Optional[datetime] = None) -> int:
+    """Set the current rates and record them as today's (UTC) in the history."""
     if not rates:
         return 0
     values = [{"name": code, "rate": float(rate)} for code, rate in rates.items()]
@@ -66,45 +54,115 @@ async def upsert_rates(session: AsyncSession, rates: Dict[str, float]) -> int:
         set_={"rate": stmt.excluded.rate},
     )
     await session.execute(stmt)
+    await record_rates(session, {utc_today(): rates}, changed_at)
     return len(values)
 
 
 def register_currency_cron(app: FastAPI) -> None:
+    """Hourly refresh by the elected leader; the other workers hear of it through ``rate_events``."""
+    leader = LeaderLock(engine, "currency-refresh")
+
     @app.on_event("startup")
-    @repeat_every(seconds=60*60, wait_first=False, logger=logger)
+    @repeat_every(seconds=CURRENCY_REFRESH_SECONDS, wait_first=False, logger=logger)
     async def scheduled_refresh() -> None:
         async with AsyncSessionLocal() as session:
             try:
-                rates = await fetch_rates_from_nbu()
-                updated = await upsert_rates(session, rates)
-                await session.commit()
-                logger.info("Currencies refreshed: %s rows updated", updated)
+                if await leader.acquire():
+                    rates = await fetch_rates_from_nbu()
+                    if rates is None:
+                        logger.info("Currencies unchanged, nothing written")
+                    else:
+                        # whole seconds, so the stored time and the HTTP date agree everywhere
+                        changed_at = datetime.now(timezone.utc).replace(microsecond=0)
+                        updated = await upsert_rates(session, rates, changed_at)
+                        current = await load_rates(session)
+                        await notify_rates(session, current, changed_at)
+                        await session.commit()
+                        nbu_client.confirm()
+                        rate_cache.publish(current, changed_at=changed_at.timestamp())
+                        logger.info("Currencies refreshed: %s rows updated", updated)
             except Exception:
                 logger.exception("Currencies refresh failed")
 
+    @app.on_event("shutdown")
+    async def shutdown_refresh() -> None:
+        await leader.release()
+        await nbu_client.aclose()
+
+
+class RatesDocument(NamedTuple):
+    """Both currency responses for one rates snapshot, serialized once."""
+    version: int
+    body: bytes
+    etag: str
+    last_modified: Optional[str]
+    by_code: Dict[str, Tuple[bytes, str]]
+
+
+_document: Optional[RatesDocument] = None
+
+
+def _etag(content: bytes) -> str:
+    # derived from the bytes, so every worker hands out the same tag
+    return '"' + hashlib.sha256(content).hexdigest()[:32] + '"'
+
+
+async def rates_document(session: AsyncSession) -> RatesDocument:
+    """The current snapshot's responses, re-serialized only when its version changes."""
+    global _document
+    snapshot = await rate_cache.current(session)
+    if _document is None or _document.version != snapshot.version:
+        by_code = {}
+        for code, rate in snapshot.rates.items():
+            body = dumps(float(rate))
+            by_code[code] = (body, _etag(code.encode() + b":" + body))
+        body = dumps(dict(snapshot.rates))
+        last_modified = None
+        if snapshot.changed_at is not None:
+            last_modified = format_datetime(datetime.fromtimestamp(snapshot.changed_at, timezone.utc), usegmt=True)
+        _document = RatesDocument(snapshot.version, body, _etag(body), last_modified, by_code)
+    return _document
+
+
+def _cached_response(request: Request, body: bytes, etag: str, last_modified: Optional[str]) -> Response:
+    # rates change at most once per refresh
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={CURRENCY_REFRESH_SECONDS}"}
+    if last_modified is not None:
+        headers["Last-Modified"] = last_modified
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        fresh = if_none_match.strip() == "*" or etag in (t.strip() for t in if_none_match.split(","))
+    elif last_modified is None:
+        fresh = False
+    else:
+        try:
+            since = parsedate_to_datetime(request.headers["if-modified-since"])
+            fresh = since >= parsedate_to_datetime(last_modified)
+        except (KeyError, TypeError, ValueError):
+            fresh = False
+    if fresh:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
 
 @currency_router.get("/{code}", response_model=float, status_code=status.HTTP_200_OK)
 async def get_rate_by_code(
+    request: Request,
     code: str = Path(..., min_length=3, max_length=3, description="ISO 4217 code, e.g. UAH, EUR"),
     session: AsyncSession = Depends(get_db),
-) -> float:
-    code = code.upper()
-    if code == "USD":
-        return 1.0
-
-    stmt = select(Currency.rate).where(Currency.name == code)
-    res = await session.execute(stmt)
-    rate = res.scalar_one_or_none()
-    if rate is None:
+) -> Response:
+    document = await rates_document(session)
+    entry = document.by_code.get(code.upper())
+    if entry is None:
         raise HTTPException(status_code=404, detail="Currency not found")
-    return float(rate)
+    return _cached_response(request, *entry, document.last_modified)
 
 
 @currency_router.get("", response_model=Dict[str, float], status_code=status.HTTP_200_OK)
 async def get_rates(
+    request: Request,
     session: AsyncSession = Depends(get_db),
-) -> Dict[str, float]:
-    result = await session.execute(select(Currency.name, Currency.rate))
-    rates = {name: float(rate) for name, rate in result.all()}
-    rates.setdefault("USD", 1.0)
-    return rates
+) -> Response:
+    """All rates per USD, served from bytes built once per rates change; ``ETag``/``Last-Modified`` give 304s."""
+    document = await rates_document(session)
+    return _cached_response(request, document.body, document.etag, document.last_modified)
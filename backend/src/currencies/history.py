@@ -0,0 +1,122 @@
+"""Dated rates in ``currency_rates`` and their backfill from NBU exports.
+
+    python -m src.currencies.history --backfill nbu/2023.json nbu/2024.json
+
+Each file is an NBU ``/exchange?json`` response: a JSON list of
+``{"cc": ..., "rate": ..., "exchangedate": "DD.MM.YYYY"}`` items, for one
+day or concatenated over many. Rates are stored per USD, like
+``currencies``. Re-running a backfill overwrites the same days.
+"""
+import argparse
+import asyncio
+import json
+from collections import defaultdict
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Mapping, Optional
+
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.models import CurrencyRate
+
+BACKFILL_CHUNK_DAYS = 100
+
+
+def nbu_rates(items: Iterable[Mapping[str, Any]]) -> Dict[str, float]:
+    """Units per USD from one day of NBU items (which quote UAH per unit)."""
+    items = list(items)
+    usd_item = next((x for x in items if str(x.get("cc", "")).upper() == "USD"), None)
+    if not usd_item or not usd_item.get("rate"):
+        raise ValueError("USD rate not found in NBU response")
+
+    usd_uah = float(usd_item["rate"])
+
+    result: Dict[str, float] = {"USD": 1.0, "UAH": usd_uah}
+
+    for item in items:
+        code = str(item.get("cc", "")).upper()
+        rate_uah = item.get("rate")
+        if not code or rate_uah is None:
+            continue
+        if code in ("USD", "UAH"):
+            continue
+        try:
+            rate_uah = float(rate_uah)
+            if rate_uah <= 0:
+                continue
+            result[code] = usd_uah / rate_uah
+        except (TypeError, ValueError):
+            continue
+
+    return result
+
+
+def nbu_history(items: Iterable[Mapping[str, Any]]) -> Dict[date, Dict[str, float]]:
+    """:func:`nbu_rates` per ``exchangedate``; days without a USD quote are skipped."""
+    by_day: Dict[date, List[Mapping[str, Any]]] = defaultdict(list)
+    for item in items:
+        by_day[datetime.strptime(item["exchangedate"], "%d.%m.%Y").date()].append(item)
+    history = {}
+    for day, day_items in by_day.items():
+        try:
+            history[day] = nbu_rates(day_items)
+        except ValueError:
+            continue
+    return history
+
+
+async def record_rates(
+        session: AsyncSession, history: Mapping[date, Mapping[str, float]], recorded_at: Optional[datetime] = None
+) -> int:
+    """Upsert ``{day: {code: rate}}`` into ``currency_rates``; the caller commits."""
+    recorded_at = recorded_at or datetime.now(timezone.utc)
+    values = [
+        {"code": code, "valid_from": day, "rate": float(rate), "recorded_at": recorded_at}
+        for day, rates in history.items()
+        for code, rate in rates.items()
+    ]
+    if not values:
+        return 0
+    insert_fn = pg_insert if session.get_bind().dialect.name == "postgresql" else sqlite_insert
+    stmt = insert_fn(CurrencyRate).values(values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[CurrencyRate.code, CurrencyRate.valid_from],
+        set_={"rate": stmt.excluded.rate, "recorded_at": stmt.excluded.recorded_at},
+    )
+    await session.execute(stmt)
+    return len(values)
+
+
+async def backfill(session: AsyncSession, paths: Iterable[Path]) -> int:
+    """Load NBU history files; one commit per :data:`BACKFILL_CHUNK_DAYS` days."""
+    history: Dict[date, Dict[str, float]] = {}
+    for path in paths:
+        history.update(nbu_history(json.loads(path.read_text(encoding="utf-8"))))
+
+    days = sorted(history)
+    written = 0
+    for start in range(0, len(days), BACKFILL_CHUNK_DAYS):
+        chunk = days[start:start + BACKFILL_CHUNK_DAYS]
+        written += await record_rates(session, {day: history[day] for day in chunk})
+        await session.commit()
+    return written
+
+
+async def _main() -> None:
+    from src.config import logger
+    from src.database import AsyncSessionLocal, engine
+
+    parser = argparse.ArgumentParser(description="Backfill dated exchange rates from NBU JSON files")
+    parser.add_argument("--backfill", nargs="+", type=Path, required=True, metavar="FILE")
+    args = parser.parse_args()
+
+    async with AsyncSessionLocal() as session:
+        written = await backfill(session, args.backfill)
+    logger.info("Currency history backfilled: %s rows", written)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
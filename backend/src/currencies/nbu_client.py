@@ -0,0 +1,118 @@
+import asyncio
+import hashlib
+import json
+from pathlib import Path
+from typing import Dict, Optional
+from urllib.parse import unquote, urlparse
+
+import httpx
+
+from src.config import NBU_API_URL, NBU_FETCH_BACKOFF_SECONDS, NBU_FETCH_RETRIES, logger
+from src.currencies.history import nbu_rates
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class NbuClient:
+    """Long-lived NBU rates fetcher.
+
+    One pooled ``httpx.AsyncClient`` is kept for the life of the process.
+    Requests are conditional (``If-None-Match``/``If-Modified-Since``)
+    and retried with exponential backoff on timeouts, connection errors
+    and 429/5xx. A body with the same SHA-256 as the last stored one
+    counts as unchanged too, since NBU does not always send validators.
+
+    ``file://`` URLs read a local JSON file instead, for tests and offline
+    deployments; any other URL (e.g. a local fixture server) is fetched
+    like NBU itself.
+
+    The validators only advance in :meth:`confirm`, called after the rates
+    are committed, so a failed write is retried on the next run.
+    """
+
+    def __init__(
+            self,
+            url: Optional[str] = NBU_API_URL,
+            retries: int = NBU_FETCH_RETRIES,
+            backoff: float = NBU_FETCH_BACKOFF_SECONDS,
+            transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.url = url
+        self.retries = retries
+        self.backoff = backoff
+        self.transport = transport
+        self.etag: Optional[str] = None
+        self.last_modified: Optional[str] = None
+        self.content_hash: Optional[str] = None
+        self._pending: Dict[str, Optional[str]] = {}
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=20,
+                limits=httpx.Limits(max_connections=4, max_keepalive_connections=2),
+                transport=self.transport,
+            )
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _get(self) -> httpx.Response:
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+
+        attempt = 0
+        while True:
+            try:
+                response = await self.client.get(self.url, headers=headers)
+                if response.status_code not in RETRY_STATUSES or attempt == self.retries:
+                    return response
+                logger.warning("NBU answered %s, retrying", response.status_code)
+            except httpx.TransportError as e:     # timeouts included
+                if attempt == self.retries:
+                    raise
+                logger.warning("NBU request failed (%s), retrying", e)
+            await asyncio.sleep(self.backoff * 2 ** attempt)
+            attempt += 1
+
+    async def _body(self) -> Optional[bytes]:
+        """The payload, or ``None`` when the server says it has not changed."""
+        parsed = urlparse(self.url or "")
+        if parsed.scheme == "file":
+            return await asyncio.to_thread(Path(unquote(parsed.path)).read_bytes)
+
+        response = await self._get()
+        if response.status_code == 304:
+            return None
+        response.raise_for_status()
+        self._pending.update(
+            etag=response.headers.get("ETag"), last_modified=response.headers.get("Last-Modified"),
+        )
+        return response.content
+
+    async def fetch(self) -> Optional[Dict[str, float]]:
+        """Rates per USD, or ``None`` if nothing changed since the last :meth:`confirm`."""
+        self._pending = {}
+        body = await self._body()
+        if body is None:
+            return None
+        content_hash = hashlib.sha256(body).hexdigest()
+        if content_hash == self.content_hash:
+            self.confirm()      # same content as stored, newer validators
+            return None
+        self._pending["content_hash"] = content_hash
+        return nbu_rates(json.loads(body))
+
+    def confirm(self) -> None:
+        """Remember the last fetched payload as stored."""
+        for name, value in self._pending.items():
+            setattr(self, name, value)
+        self._pending = {}
@@ -0,0 +1,138 @@
+"""Propagating rate refreshes to every worker's :data:`rate_cache`.
+
+On Postgres the refreshing transaction sends ``NOTIFY currency_rates``
+with the new rates; it is delivered on commit, and each worker applies
+it from a dedicated ``LISTEN`` connection without touching the tables.
+Elsewhere (SQLite) workers poll ``currencies`` every
+``RATES_POLL_SECONDS`` instead.
+"""
+import asyncio
+import json
+from datetime import datetime
+from typing import Any, Mapping, Optional
+
+from fastapi import FastAPI
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, AsyncSession
+
+from src.config import RATES_POLL_SECONDS, logger
+from src.database import engine
+from src.transactions.currency_converter import RateCache, rate_cache
+
+CHANNEL = "currency_rates"
+# NOTIFY payloads must stay under 8000 bytes; larger ones only carry the version
+MAX_PAYLOAD_BYTES = 7900
+
+
+async def notify_rates(session: AsyncSession, rates: Mapping[str, float], changed_at: datetime) -> int:
+    """Queue the notification in the caller's transaction (a no-op outside Postgres).
+
+    Returns the version: ``changed_at`` (the ``recorded_at`` just written)
+    in milliseconds, which listeners turn back into the snapshot's
+    ``changed_at``.
+    """
+    version = int(changed_at.timestamp() * 1000)
+    if session.get_bind().dialect.name != "postgresql":
+        return version
+    payload = json.dumps({"version": version, "rates": dict(rates)}, separators=(",", ":"))
+    if len(payload.encode()) > MAX_PAYLOAD_BYTES:
+        payload = json.dumps({"version": version})
+    await session.execute(select(func.pg_notify(CHANNEL, payload)))
+    return version
+
+
+class RateListener:
+    """Keeps one worker's cache in step with the refreshes of any process."""
+
+    def __init__(
+            self, bind: AsyncEngine = engine, cache: RateCache = rate_cache, poll_seconds: float = RATES_POLL_SECONDS
+    ):
+        self.engine = bind
+        self.cache = cache
+        self.poll_seconds = poll_seconds
+        self.last_version = 0
+        self._conn: Optional[AsyncConnection] = None
+        self._task: Optional[asyncio.Task] = None
+        self._reload_task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self._disconnect()
+
+    def handle(self, payload: str) -> None:
+        """Apply one notification; stale and duplicate versions are ignored."""
+        data: Mapping[str, Any] = json.loads(payload)
+        if data["version"] <= self.last_version:
+            return
+        self.last_version = data["version"]
+        if "rates" in data:
+            self.cache.publish(data["rates"], changed_at=data["version"] / 1000)
+        else:
+            self._reload_task = asyncio.get_running_loop().create_task(self._reload())
+
+    async def _reload(self) -> None:
+        async with AsyncSession(self.engine, expire_on_commit=False) as session:
+            await self.cache.reload(session)
+
+    def _on_notify(self, connection, pid: int, channel: str, payload: str) -> None:
+        try:
+            self.handle(payload)
+        except Exception:
+            logger.exception("Bad %s notification: %r", CHANNEL, payload)
+
+    async def _listen(self) -> Any:
+        self._conn = await self.engine.connect()
+        raw = await self._conn.get_raw_connection()
+        driver = raw.driver_connection     # asyncpg
+        await driver.add_listener(CHANNEL, self._on_notify)
+        return driver
+
+    async def _disconnect(self) -> None:
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            try:
+                await conn.invalidate()
+            except Exception:
+                pass
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                if self.engine.dialect.name == "postgresql":
+                    driver = await self._listen()
+                    # anything sent while not listening is picked up here
+                    await self._reload()
+                    while not driver.is_closed():
+                        await asyncio.sleep(self.poll_seconds)
+                    logger.warning("%s listener connection closed, reconnecting", CHANNEL)
+                    await self._disconnect()
+                else:
+                    await asyncio.sleep(self.poll_seconds)
+                    await self._reload()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Rates listener failed")
+                await self._disconnect()
+                await asyncio.sleep(self.poll_seconds)
+
+
+def register_rate_listener(app: FastAPI) -> None:
+    listener = RateListener()
+
+    @app.on_event("startup")
+    async def start_rate_listener() -> None:
+        listener.start()
+
+    @app.on_event("shutdown")
+    async def stop_rate_listener() -> None:
+        await listener.stop()
@@ -8,6 +8,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database import get_db
 from src.models import Currencies, Transaction, TransactionKind, User
+from src.transactions.references import with_keys
 from src.utils.auth_services import hash_password
 
 dev_router = APIRouter(tags=["Dev"])
@@ -38,7 +39,7 @@ async def seed_database(session: AsyncSession = Depends(get_db)):
     session.add_all(users)
     await session.flush()
 
-    categories = ["Food", "Salary", "Transport", "Rent", "Shopping", "Health", "Entertainment", "Utilities"]
+    categories = ["food", "salary", "transportation", "housing", "shopping", "health", "entertainment", "phone"]
     currencies = [c.value for c in Currencies]
 
     txs = []
@@ -60,9 +61,8 @@ async def seed_database(session: AsyncSession = Depends(get_db)):
                 user_id=u.id_,
                 amount=amount,
                 kind=kind,
-                category_name=category,
-                currency=currency,
                 date=dt,
+                **await with_keys(session, {"category_name": category, "currency": currency}),
             ))
 
     session.add_all(txs)
@@ -1,6 +1,6 @@
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 from sqlalchemy import delete, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -8,6 +8,8 @@ from src.database import get_db
 from src.dependencies import get_current_user
 from src.goals.schemas import GoalCreate, GoalOut, GoalUpdate
 from src.models import Goal, User
+from src.utils.conditional import bump_data_version, not_modified
+from src.utils.fast_json import rows_response
 
 goal_router = APIRouter()
 
@@ -35,6 +37,7 @@ async def create_goal(
         saved=payload.saved,
     )
     session.add(goal)
+    await bump_data_version(session, current_user)
     await session.commit()
     await session.refresh(goal)
     return goal
@@ -42,14 +45,19 @@ async def create_goal(
 
 @goal_router.get("", response_model=List[GoalOut])
 async def list_goals(
+        request: Request,
+        response: Response,
         session: AsyncSession = Depends(get_db),
         current_user: User = Depends(get_current_user),
         q: Optional[str] = Query(None, description="Пошук за назвою"),
         limit: int = Query(50, ge=1, le=200),
         offset: int = Query(0, ge=0),
 ):
+    if (cached := not_modified(request, response, current_user)) is not None:
+        return cached
+
     stmt = (
-        select(Goal)
+        select(Goal.id_, Goal.name, Goal.summ, Goal.saved)
         .where(Goal.user_id == current_user.id_)
         .order_by(Goal.id_.desc())
         .limit(limit)
@@ -58,8 +66,8 @@ async def list_goals(
     if q:
         stmt = stmt.where(Goal.name == q)
 
-    rows = (await session.execute(stmt)).scalars().all()
-    return rows
+    rows = (await session.execute(stmt)).all()
+    return rows_response(rows, ("id_", "name", "summ", "saved"), response)
 
 
 @goal_router.get("/{goal_id}", response_model=GoalOut)
@@ -98,6 +106,7 @@ async def update_goal(
         .returning(Goal)
     )
     goal = (await session.execute(stmt)).scalar_one()
+    await bump_data_version(session, current_user)
     await session.commit()
     return goal
 
@@ -112,5 +121,6 @@ async def delete_goal(
     await session.execute(
         delete(Goal).where(Goal.id_ == goal_id, Goal.user_id == current_user.id_)
     )
+    await bump_data_version(session, current_user)
     await session.commit()
     return None
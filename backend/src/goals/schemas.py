@@ -1,6 +1,6 @@
 from typing import Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
 
 class GoalCreate(BaseModel):
@@ -14,11 +14,9 @@ class GoalUpdate(BaseModel):
     saved: Optional[float] = Field(default=None, ge=0)
 
 class GoalOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     id_: int
     name: str
     summ: float
     saved: float
-
-    class Config:
-        from_attributes = True
-        orm_mode = True
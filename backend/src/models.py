@@ -1,16 +1,22 @@
 import enum
 
 from sqlalchemy import (
+    DDL,
     Boolean,
     CheckConstraint,
     Column,
+    Date,
     DateTime,
     Enum,
     Float,
     ForeignKey,
+    Index,
     Integer,
+    LargeBinary,
     Numeric,
+    SmallInteger,
     String,
+    event,
 )
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -55,10 +61,15 @@ class User(Base):
     role = Column(Enum(UserStatus), nullable=False, default=UserStatus.USER)
     twofa_secret = Column(String(32), nullable=True)
     twofa_enabled = Column(Boolean, nullable=False, default=False)
+    # bumped by every write to the user's own data; the ETag of per-user GETs
+    data_version = Column(Integer, nullable=False, default=0, server_default="0")
 
     # relationships
     transactions = relationship("Transaction", back_populates="user", cascade="all, delete-orphan")
     goals = relationship("Goal", back_populates="user", cascade="all, delete-orphan")
+    recurring_transactions = relationship(
+        "RecurringTransaction", back_populates="user", cascade="all, delete-orphan"
+    )
     notifications = relationship("Notification", back_populates="user", cascade="all, delete-orphan")
 
     __table_args__ = (
@@ -76,7 +87,45 @@ class Currency(Base):
     rate = Column(Float, nullable=False, default=1.0)
 
 
+class CurrencyRate(Base):
+    """Dated history of ``currencies.rate``: a rate holds from ``valid_from``
+    until the next row of the same code. The primary key doubles as the
+    as-of index (latest ``valid_from`` not after a given day).
+    """
+    __tablename__ = "currency_rates"
+
+    code = Column(String(16), primary_key=True)
+    valid_from = Column(Date, primary_key=True)
+    rate = Column(Float, nullable=False)
+    # time of the refresh that last wrote the row; served as Last-Modified of the rates
+    recorded_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+# SQLite only autoincrements an INTEGER PRIMARY KEY
+SmallId = SmallInteger().with_variant(Integer(), "sqlite")
+
+
+class Category(Base):
+    """Interned category names; transactions keep only the smallint key."""
+    __tablename__ = "categories"
+
+    id_ = Column(SmallId, primary_key=True, autoincrement=True)
+    name = Column(String(64), nullable=False, unique=True)
+
+
+class CurrencyCode(Base):
+    """Interned currency codes of transactions (the rates live in ``currencies``)."""
+    __tablename__ = "currency_codes"
+
+    id_ = Column(SmallId, primary_key=True, autoincrement=True)
+    code = Column(String(16), nullable=False, unique=True)
+
+
 class Transaction(Base):
+    """On Postgres the table can be range-partitioned by month on ``date``
+    (see ``src.transactions.partitioning``), so every unique index below
+    includes ``date``.
+    """
     __tablename__ = "transactions"
 
     id_ = Column(Integer, primary_key=True, autoincrement=True, index=True)
@@ -84,12 +133,137 @@ class Transaction(Base):
     amount = Column(Numeric(14, 2), nullable=False)
     name = Column(String(64), nullable=False, default="")
     kind = Column(Enum(TransactionKind), nullable=False, default=TransactionKind.EXPENSE)
-    category_name = Column(String(64), nullable=False)
-    currency = Column(String(16), nullable=True)
+    category_id = Column(SmallInteger, ForeignKey("categories.id_"), nullable=False)
+    # NULL means the user's default currency
+    currency_id = Column(SmallInteger, ForeignKey("currency_codes.id_"), nullable=True)
     date = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    # content hash of a statement row, set only for imported transactions
+    import_hash = Column(String(64), nullable=True)
+    # set for occurrences materialized from a recurring rule
+    recurring_id = Column(Integer, ForeignKey("recurring_transactions.id_", ondelete="SET NULL"), nullable=True)
 
     user = relationship("User", back_populates="transactions")
 
+    __table_args__ = (
+        # Serves both offset and keyset pagination of the per-user history
+        Index("ix_transactions_user_date_id", user_id, date.desc(), id_.desc()),
+        # List filters: each one stays a range scan that is already in page order
+        Index("ix_transactions_user_category_date", user_id, category_id, date.desc(), id_.desc()),
+        Index("ix_transactions_user_currency_date", user_id, currency_id, date.desc(), id_.desc()),
+        Index("ix_transactions_user_amount", user_id, amount),
+        Index(
+            "ix_transactions_user_expense_date", user_id, date.desc(), id_.desc(),
+            postgresql_where=kind == TransactionKind.EXPENSE,
+            sqlite_where=kind == TransactionKind.EXPENSE,
+        ),
+        Index(
+            "ix_transactions_user_income_date", user_id, date.desc(), id_.desc(),
+            postgresql_where=kind == TransactionKind.INCOME,
+            sqlite_where=kind == TransactionKind.INCOME,
+        ),
+        # Substring / fuzzy search (pg_trgm + btree_gin, created below); categories
+        # are matched in their own small table
+        Index(
+            "ix_transactions_user_name_trgm", user_id, name,
+            postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"},
+        ).ddl_if(dialect="postgresql"),
+        # the hash covers the date already; the column is here for partitioning
+        Index("uq_transactions_user_import_hash", user_id, import_hash, date, unique=True),
+        # one occurrence per rule and time, however many schedulers run
+        Index("uq_transactions_recurring_date", recurring_id, date, unique=True),
+    )
+
+
+for _extension in ("pg_trgm", "btree_gin"):
+    event.listen(
+        Transaction.__table__,
+        "before_create",
+        DDL(f"CREATE EXTENSION IF NOT EXISTS {_extension}").execute_if(dialect="postgresql"),
+    )
+
+
+class TransactionMonthlyRollup(Base):
+    """Per-user monthly sums of ``transactions``, kept in step by every write path.
+
+    ``month`` is the first day of the UTC month; a transaction without a
+    currency is counted under ``currency_id = 0``.
+    """
+    __tablename__ = "transaction_monthly_rollups"
+
+    user_id = Column(Integer, ForeignKey("users.id_", ondelete="CASCADE"), primary_key=True)
+    month = Column(Date, primary_key=True)
+    category_id = Column(SmallInteger, primary_key=True)
+    kind = Column(Enum(TransactionKind), primary_key=True)
+    currency_id = Column(SmallInteger, primary_key=True, default=0)
+    total = Column(Numeric(16, 2), nullable=False, default=0)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class ArchivedBalance(Base):
+    """What a detached ``transactions`` month still contributes to a user's capital.
+
+    Written once per user and month when the retention job detaches the
+    partition: the month's rows converted to the user's default currency,
+    at the rates of their own day.
+    """
+    __tablename__ = "archived_balances"
+
+    user_id = Column(Integer, ForeignKey("users.id_", ondelete="CASCADE"), primary_key=True)
+    month = Column(Date, primary_key=True)
+    total = Column(Numeric(16, 2), nullable=False, default=0)
+
+
+class RecurringTransaction(Base):
+    """A transaction template repeated on a cron ``schedule`` (evaluated in UTC).
+
+    ``next_run_at`` is the next occurrence still to be materialized.
+    """
+    __tablename__ = "recurring_transactions"
+
+    id_ = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(Integer, ForeignKey("users.id_", ondelete="CASCADE"), nullable=False)
+    amount = Column(Numeric(14, 2), nullable=False)
+    name = Column(String(64), nullable=False, default="")
+    kind = Column(Enum(TransactionKind), nullable=False, default=TransactionKind.EXPENSE)
+    category_name = Column(String(64), nullable=False)
+    currency = Column(String(16), nullable=True)
+    schedule = Column(String(128), nullable=False)
+    next_run_at = Column(DateTime(timezone=True), nullable=False)
+    active = Column(Boolean, nullable=False, default=True)
+
+    user = relationship("User", back_populates="recurring_transactions")
+
+    __table_args__ = (
+        Index(
+            "ix_recurring_transactions_due", next_run_at,
+            postgresql_where=active.is_(True),
+            sqlite_where=active.is_(True),
+        ),
+        Index("ix_recurring_transactions_user", user_id, id_),
+    )
+
+
+class IdempotencyKey(Base):
+    """A client ``Idempotency-Key`` and the response it was first answered with.
+
+    The row is written in the same transaction as the request's own writes,
+    so a key is only ever stored together with its effects; ``status_code``
+    stays NULL while a request that commits in several steps is running.
+    """
+    __tablename__ = "idempotency_keys"
+
+    user_id = Column(Integer, ForeignKey("users.id_", ondelete="CASCADE"), primary_key=True)
+    key = Column(String(255), primary_key=True)
+    # sha256 of method, path, query and body; a key reused for another request is rejected
+    fingerprint = Column(String(64), nullable=False)
+    status_code = Column(Integer, nullable=True)
+    response_body = Column(LargeBinary, nullable=True)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (
+        Index("ix_idempotency_keys_expires_at", expires_at),
+    )
+
 
 class Goal(Base):
     __tablename__ = "goals"
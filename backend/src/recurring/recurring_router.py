@@ -0,0 +1,137 @@
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database import get_db
+from src.dependencies import get_current_user
+from src.models import RecurringTransaction, TransactionKind, User
+from src.recurring.scheduler import first_occurrence, validate_schedule
+from src.recurring.schemas import RecurringCreate, RecurringOut, RecurringUpdate
+from src.transactions.currency_converter import convert_with_rates, get_rates_map
+
+recurring_router = APIRouter()
+
+
+async def _get_user_rule_or_404(
+        session: AsyncSession, rule_id: int, user_id: int
+) -> RecurringTransaction:
+    stmt = select(RecurringTransaction).where(
+        RecurringTransaction.id_ == rule_id, RecurringTransaction.user_id == user_id
+    )
+    rule = (await session.execute(stmt)).scalar_one_or_none()
+    if not rule:
+        raise HTTPException(status_code=404, detail="Recurring transaction not found")
+    return rule
+
+
+def _checked_schedule(schedule: str) -> str:
+    try:
+        return validate_schedule(schedule)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+async def _checked_currency(session: AsyncSession, user: User, currency: Optional[str]) -> Optional[str]:
+    """Reject a currency the scheduler could not convert into the user's default one."""
+    try:
+        convert_with_rates(await get_rates_map(session), user.default_currency, TransactionKind.EXPENSE, 0, currency)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return currency
+
+
+@recurring_router.post("", response_model=RecurringOut, status_code=status.HTTP_201_CREATED)
+async def create_recurring(
+        payload: RecurringCreate,
+        session: AsyncSession = Depends(get_db),
+        current_user: User = Depends(get_current_user),
+):
+    schedule = _checked_schedule(payload.schedule)
+    currency = await _checked_currency(session, current_user, payload.currency)
+    rule = RecurringTransaction(
+        user_id=current_user.id_,
+        amount=payload.amount,
+        name=payload.name,
+        kind=payload.kind,
+        category_name=payload.category_name,
+        currency=currency,
+        schedule=schedule,
+        next_run_at=first_occurrence(schedule, payload.start_at or datetime.now(timezone.utc)),
+        active=True,
+    )
+    session.add(rule)
+    await session.commit()
+    await session.refresh(rule)
+    return rule
+
+
+@recurring_router.get("", response_model=List[RecurringOut])
+async def list_recurring(
+        session: AsyncSession = Depends(get_db),
+        current_user: User = Depends(get_current_user),
+        limit: int = Query(50, ge=1, le=200),
+        offset: int = Query(0, ge=0),
+):
+    stmt = (
+        select(RecurringTransaction)
+        .where(RecurringTransaction.user_id == current_user.id_)
+        .order_by(RecurringTransaction.id_.desc())
+        .limit(limit)
+        .offset(offset)
+    )
+    return (await session.execute(stmt)).scalars().all()
+
+
+@recurring_router.get("/{rule_id}", response_model=RecurringOut)
+async def get_recurring(
+        rule_id: int,
+        session: AsyncSession = Depends(get_db),
+        current_user: User = Depends(get_current_user),
+):
+    return await _get_user_rule_or_404(session, rule_id, current_user.id_)
+
+
+@recurring_router.patch("/{rule_id}", response_model=RecurringOut)
+async def update_recurring(
+        rule_id: int,
+        payload: RecurringUpdate,
+        session: AsyncSession = Depends(get_db),
+        current_user: User = Depends(get_current_user),
+):
+    rule = await _get_user_rule_or_404(session, rule_id, current_user.id_)
+    updates = payload.model_dump(exclude_unset=True, exclude_none=True)
+
+    # a new schedule, or resuming a paused rule, starts from now instead of back-filling
+    if "schedule" in updates:
+        updates["schedule"] = _checked_schedule(updates["schedule"])
+    if "currency" in updates:
+        updates["currency"] = await _checked_currency(session, current_user, updates["currency"])
+    if "schedule" in updates or (updates.get("active") and not rule.active):
+        updates["next_run_at"] = first_occurrence(
+            updates.get("schedule", rule.schedule), datetime.now(timezone.utc)
+        )
+
+    for field, value in updates.items():
+        setattr(rule, field, value)
+    await session.commit()
+    await session.refresh(rule)
+    return rule
+
+
+@recurring_router.delete("/{rule_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_recurring(
+        rule_id: int,
+        session: AsyncSession = Depends(get_db),
+        current_user: User = Depends(get_current_user),
+):
+    await _get_user_rule_or_404(session, rule_id, current_user.id_)
+    await session.execute(
+        delete(RecurringTransaction).where(
+            RecurringTransaction.id_ == rule_id, RecurringTransaction.user_id == current_user.id_
+        )
+    )
+    await session.commit()
+    return None
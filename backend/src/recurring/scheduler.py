@@ -0,0 +1,163 @@
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from croniter import croniter
+from fastapi import FastAPI
+from fastapi_utilities import repeat_every
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.engine import RowMapping
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.config import logger
+from src.database import AsyncSessionLocal
+from src.models import RecurringTransaction, Transaction, User
+from src.transactions.currency_converter import convert_with_rates, load_historical_rates
+from src.transactions.references import with_keys
+from src.transactions.transaction_services import apply_capital_deltas, insert_new_transactions
+
+recurring_table = RecurringTransaction.__table__
+transactions_table = Transaction.__table__
+
+RECURRING_BATCH_SIZE = 500
+RECURRING_INTERVAL_SECONDS = 60
+# occurrences materialized per rule and tick, so a long-paused rule cannot flood one batch
+MAX_CATCH_UP = 366
+
+
+def as_utc(value: datetime) -> datetime:
+    """SQLite hands timezone-aware columns back naive; they are stored as UTC."""
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def validate_schedule(schedule: str) -> str:
+    schedule = schedule.strip()
+    if not croniter.is_valid(schedule):
+        raise ValueError(f"Invalid cron schedule '{schedule}'")
+    return schedule
+
+
+def first_occurrence(schedule: str, start: datetime) -> datetime:
+    """First occurrence at or after ``start``."""
+    return croniter(schedule, as_utc(start) - timedelta(seconds=1)).get_next(datetime)
+
+
+def due_occurrences(
+        schedule: str, next_run_at: datetime, now: datetime, limit: int = MAX_CATCH_UP
+) -> Tuple[List[datetime], datetime]:
+    """Occurrences from ``next_run_at`` up to ``now`` and the following ``next_run_at``."""
+    occurrences: List[datetime] = []
+    current = as_utc(next_run_at)
+    schedule_iter = croniter(schedule, current)
+    while current <= now and len(occurrences) < limit:
+        occurrences.append(current)
+        current = schedule_iter.get_next(datetime)
+    return occurrences, current
+
+
+async def _default_currencies(session: AsyncSession, user_ids: Iterable[int]) -> Dict[int, str]:
+    return dict((await session.execute(
+        select(User.id_, User.default_currency).where(User.id_.in_(set(user_ids)))
+    )).all())
+
+
+def _capital_deltas(rows: Sequence[RowMapping], values: Dict[Tuple[int, datetime], Decimal]) -> Dict[int, Decimal]:
+    """Per-user capital change of the rows actually inserted, from their precomputed values."""
+    deltas: Dict[int, Decimal] = defaultdict(Decimal)
+    for row in rows:
+        deltas[row["user_id"]] += values[row["recurring_id"], as_utc(row["date"])]
+    return deltas
+
+
+async def materialize_due(
+        session: AsyncSession, now: Optional[datetime] = None, batch_size: int = RECURRING_BATCH_SIZE
+) -> int:
+    """Write every due occurrence of every active rule; returns the number of new transactions.
+
+    Each batch of rules becomes one bulk insert, one grouped capital update,
+    one rollup upsert and one ``next_run_at`` update, committed together.
+    On Postgres the rules are claimed ``FOR UPDATE SKIP LOCKED`` so
+    concurrent workers split the work; everywhere the unique
+    ``(recurring_id, date)`` index drops any occurrence written twice.
+
+    Occurrences are converted before they are written. A rule whose
+    currency cannot be converted is paused at that occurrence rather than
+    producing transactions that ``capital`` does not account for.
+    """
+    now = as_utc(now or datetime.now(timezone.utc))
+    created = 0
+    while True:
+        stmt = (
+            select(recurring_table)
+            .where(recurring_table.c.active.is_(True), recurring_table.c.next_run_at <= now)
+            .order_by(recurring_table.c.next_run_at, recurring_table.c.id_)
+            .limit(batch_size)
+        )
+        if session.get_bind().dialect.name == "postgresql":
+            stmt = stmt.with_for_update(skip_locked=True)
+        rules = (await session.execute(stmt)).mappings().all()
+        if not rules:
+            break
+
+        planned = [(rule, *due_occurrences(rule["schedule"], rule["next_run_at"], now)) for rule in rules]
+        history = await load_historical_rates(
+            session, (when for _, occurrences, _ in planned for when in occurrences)
+        )
+        currencies = await _default_currencies(session, (rule["user_id"] for rule in rules))
+
+        rows: List[Dict[str, Any]] = []
+        values: Dict[Tuple[int, datetime], Decimal] = {}
+        advances: List[Dict[str, Any]] = []
+        for rule, occurrences, next_run_at in planned:
+            keys = None
+            advance = {"rid": rule["id_"], "next_run": next_run_at, "active": True}
+            for when in occurrences:
+                try:
+                    # a rule stored before categories were checked fails here like a bad currency
+                    keys = keys or await with_keys(session, rule)
+                    values[rule["id_"], when] = convert_with_rates(
+                        history.on(when), currencies[rule["user_id"]], rule["kind"], rule["amount"], rule["currency"],
+                    )
+                except ValueError as e:
+                    logger.warning("Recurring transaction %s paused at %s: %s", rule["id_"], when, e)
+                    advance.update(next_run=when, active=False)
+                    break
+                rows.append({
+                    "user_id": rule["user_id"],
+                    "amount": rule["amount"],
+                    "name": rule["name"],
+                    "kind": rule["kind"],
+                    "category_id": keys["category_id"],
+                    "currency_id": keys["currency_id"],
+                    "date": when,
+                    "recurring_id": rule["id_"],
+                })
+            advances.append(advance)
+
+        # ON CONFLICT (recurring_id, date): an occurrence another worker wrote is not counted twice
+        inserted = await insert_new_transactions(session, rows, ["recurring_id", "date"])
+        await apply_capital_deltas(session, _capital_deltas(inserted, values))
+        await session.execute(
+            update(recurring_table)
+            .where(recurring_table.c.id_ == bindparam("rid"))
+            .values(next_run_at=bindparam("next_run"), active=bindparam("active")),
+            advances,
+        )
+        await session.commit()
+        created += len(inserted)
+    return created
+
+
+def register_recurring_cron(app: FastAPI) -> None:
+    @app.on_event("startup")
+    @repeat_every(seconds=RECURRING_INTERVAL_SECONDS, wait_first=False, logger=logger)
+    async def scheduled_materialize() -> None:
+        async with AsyncSessionLocal() as session:
+            try:
+                created = await materialize_due(session)
+                if created:
+                    logger.info("Recurring transactions materialized: %s rows", created)
+            except Exception:
+                await session.rollback()
+                logger.exception("Recurring transactions run failed")
@@ -0,0 +1,41 @@
+from datetime import datetime
+from decimal import Decimal
+from typing import Optional
+
+from pydantic import BaseModel, ConfigDict, Field
+
+from src.models import TransactionKind
+from src.transactions.schemas import CategoryName, Money
+
+
+class RecurringCreate(BaseModel):
+    amount: Money
+    name: str = Field(default="", max_length=64)
+    kind: TransactionKind = TransactionKind.EXPENSE
+    category_name: CategoryName
+    currency: Optional[str] = Field(default=None, max_length=16)
+    schedule: str = Field(min_length=9, max_length=128, description="Cron expression, evaluated in UTC")
+    start_at: Optional[datetime] = Field(default=None, description="First occurrence is at or after this time")
+
+
+class RecurringUpdate(BaseModel):
+    amount: Optional[Money] = None
+    name: Optional[str] = Field(default=None, max_length=64)
+    category_name: Optional[CategoryName] = None
+    currency: Optional[str] = Field(default=None, max_length=16)
+    schedule: Optional[str] = Field(default=None, min_length=9, max_length=128)
+    active: Optional[bool] = None
+
+
+class RecurringOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id_: int
+    amount: Decimal
+    name: str
+    kind: TransactionKind
+    category_name: str
+    currency: Optional[str]
+    schedule: str
+    next_run_at: datetime
+    active: bool
@@ -0,0 +1,335 @@
+from collections import defaultdict
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from sqlalchemy import Select, case, func, literal, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+from sqlalchemy.sql.elements import ColumnElement
+
+from src.models import (
+    Currency,
+    CurrencyCode,
+    CurrencyRate,
+    Transaction,
+    TransactionKind,
+    TransactionMonthlyRollup,
+    User,
+)
+from src.transactions.currency_converter import (
+    converted_amount_sql,
+    load_historical_rates,
+    rate_as_of_sql,
+    utc_day_sql,
+    utc_today,
+)
+from src.transactions.rate_matrix import HistoricalMatrices, RateMatrix, current_rate_matrix
+from src.transactions.references import categories, currency_codes
+
+PERIODS = ("day", "week", "month")
+GROUP_FIELDS = ("period", "category", "kind")
+
+
+def user_timezone(user: User) -> str:
+    """The user's IANA zone, or UTC when it is unset or unknown."""
+    if user.timezone:
+        try:
+            ZoneInfo(user.timezone)
+            return user.timezone
+        except (ZoneInfoNotFoundError, ValueError):
+            pass
+    return "UTC"
+
+
+def period_bucket(dialect_name: str, column: ColumnElement, period: str, tz: str = "UTC") -> ColumnElement:
+    """Start of the day/week/month ``column`` falls into, as seen in ``tz``.
+
+    Postgres truncates the local wall-clock time; SQLite has no timezone
+    database, so there the buckets are always UTC.
+    """
+    if period not in PERIODS:
+        raise ValueError(f"Unknown period '{period}'")
+    if dialect_name == "postgresql":
+        # rendered inline so the SELECT and GROUP BY copies compare equal
+        return func.date_trunc(
+            literal(period, literal_execute=True),
+            func.timezone(literal(tz, literal_execute=True), column),
+        )
+    if period == "day":
+        return func.date(column)
+    if period == "week":
+        return func.date(column, "weekday 0", "-6 days")  # ISO weeks start on Monday
+    return func.date(column, "start of month")
+
+
+def epoch_seconds(dialect_name: str, column: ColumnElement) -> ColumnElement:
+    if dialect_name == "postgresql":
+        return func.extract("epoch", column)
+    return (func.julianday(column) - 2440587.5) * 86400.0
+
+
+def _timestamp(value: datetime) -> float:
+    # naive values are UTC, which is also how SQLite stores them
+    return (value if value.tzinfo else value.replace(tzinfo=timezone.utc)).timestamp()
+
+
+def as_date(value: Any) -> date:
+    """Normalize a bucket value coming back from either dialect."""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def _is_month_start(value: Optional[datetime]) -> bool:
+    if value is None:
+        return True
+    if value.tzinfo is not None and value.utcoffset():
+        return False
+    return value.day == 1 and value.time() == datetime.min.time()
+
+
+def _rollup_covers(
+        group_by: Sequence[str], period: str, tz: str, date_from: Optional[datetime], date_to: Optional[datetime]
+) -> bool:
+    """Whether the monthly rollup (UTC months) can answer the request exactly."""
+    if "period" in group_by and (period != "month" or tz != "UTC"):
+        return False
+    return _is_month_start(date_from) and _is_month_start(date_to)
+
+
+def _grouped_from_rollup(
+        user: User, group_by: Sequence[str], date_from: Optional[datetime], date_to: Optional[datetime]
+) -> Tuple[Select, Dict[str, ColumnElement]]:
+    rollup = TransactionMonthlyRollup
+    columns: Dict[str, ColumnElement] = {}
+    if "period" in group_by:
+        columns["period"] = rollup.month
+    if "category" in group_by:
+        columns["category"] = rollup.category_id
+    # the month stands in for the day: only used when no rate history applies
+    keys = [*columns.values(), rollup.kind, rollup.currency_id, rollup.month]
+
+    stmt = (
+        select(*keys, func.sum(rollup.total), func.sum(rollup.count))
+        .where(rollup.user_id == user.id_, rollup.count > 0)
+        .group_by(*keys)
+    )
+    if date_from is not None:
+        stmt = stmt.where(rollup.month >= date_from.date())
+    if date_to is not None:
+        stmt = stmt.where(rollup.month < date_to.date())
+    return stmt, columns
+
+
+def _grouped_from_transactions(
+        dialect_name: str,
+        user: User,
+        group_by: Sequence[str],
+        period: str,
+        tz: str,
+        date_from: Optional[datetime],
+        date_to: Optional[datetime],
+) -> Tuple[Select, Dict[str, ColumnElement]]:
+    columns: Dict[str, ColumnElement] = {}
+    if "period" in group_by:
+        columns["period"] = period_bucket(dialect_name, Transaction.date, period, tz)
+    if "category" in group_by:
+        columns["category"] = Transaction.category_id
+    # kind, currency and UTC day are always grouped on: all are needed to convert the sums
+    keys = [*columns.values(), Transaction.kind, Transaction.currency_id, utc_day_sql(dialect_name, Transaction.date)]
+
+    stmt = (
+        select(*keys, func.sum(Transaction.amount), func.count())
+        .where(Transaction.user_id == user.id_)
+        .group_by(*keys)
+    )
+    if date_from is not None:
+        stmt = stmt.where(Transaction.date >= date_from)
+    if date_to is not None:
+        stmt = stmt.where(Transaction.date < date_to)
+    return stmt, columns
+
+
+async def spending_summary(
+        session: AsyncSession,
+        user: User,
+        group_by: Sequence[str],
+        period: str = "month",
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+) -> List[Dict[str, Any]]:
+    """Signed totals (expenses negative) in the user's default currency.
+
+    The database does the grouping; amounts are summed per currency and UTC
+    day there, and each group is converted here at the rates of its day,
+    like the capital change of its transactions was: one
+    :meth:`RateMatrix.convert_cents` call per distinct set of rates, with
+    the same cents as ``convert_with_rates`` per group. Whenever the request
+    lines up with UTC months the sums come from the monthly rollup instead,
+    unless it holds foreign-currency totals of past days while there is
+    rate history: those need the per-day rates the rollup does not keep.
+    """
+    dialect_name = session.get_bind().dialect.name
+    tz = user_timezone(user)
+    rows = None
+    if _rollup_covers(group_by, period, tz, date_from, date_to):
+        stmt, columns = _grouped_from_rollup(user, group_by, date_from, date_to)
+        rows = (await session.execute(stmt)).all()
+        if await _needs_daily_rates(session, user, rows):
+            rows = None
+    if rows is None:
+        stmt, columns = _grouped_from_transactions(dialect_name, user, group_by, period, tz, date_from, date_to)
+        rows = (await session.execute(stmt)).all()
+
+    keys, moments, cents, currencies, expense, counts = [], [], [], [], [], []
+    for *group_values, kind, currency_id, day, amount, count in rows:
+        group = dict(zip(columns, group_values))
+        keys.append((
+            as_date(group["period"]) if "period" in group else None,
+            await categories.name_for(session, group.get("category")),
+            kind if "kind" in group_by else None,
+        ))
+        moments.append(_day_start(day))
+        cents.append(int(_to_cents(amount).scaleb(2)))
+        # no currency means the user's default one, as in convert_with_rates
+        currencies.append(await currency_codes.name_for(session, currency_id) or user.default_currency)
+        expense.append(kind == TransactionKind.EXPENSE)
+        counts.append(count)
+
+    matrices = HistoricalMatrices(
+        await load_historical_rates(session, moments), await current_rate_matrix(session),
+    )
+    by_matrix: Dict[int, Tuple[RateMatrix, List[int]]] = {}
+    for index, when in enumerate(moments):
+        matrix = matrices.on(when)
+        by_matrix.setdefault(id(matrix), (matrix, []))[1].append(index)
+
+    converted = [0] * len(keys)
+    for matrix, indices in by_matrix.values():
+        values = matrix.convert_cents(
+            [cents[i] for i in indices],
+            [currencies[i] for i in indices],
+            [user.default_currency] * len(indices),
+            [expense[i] for i in indices],
+        )
+        for index, value in zip(indices, values.tolist()):
+            converted[index] = value
+
+    totals: Dict[Tuple, List] = defaultdict(lambda: [Decimal("0"), 0])
+    for key, value, count in zip(keys, converted, counts):
+        totals[key][0] += Decimal(value).scaleb(-2)
+        totals[key][1] += count
+
+    return [
+        {"period": key[0], "category_name": key[1], "kind": key[2], "total": total, "count": count}
+        for key, (total, count) in sorted(totals.items(), key=lambda item: tuple(str(v) for v in item[0]))
+    ]
+
+
+def _day_start(value: Any) -> datetime:
+    return datetime.combine(as_date(value), datetime.min.time(), timezone.utc)
+
+
+async def _needs_daily_rates(session: AsyncSession, user: User, rows: Sequence) -> bool:
+    """Whether rollup ``rows`` hold foreign-currency sums that rate history would convert differently."""
+    today = utc_today()
+    default = user.default_currency.strip().upper()
+    for *_, currency_id, month, _amount, _count in rows:
+        currency = await currency_codes.name_for(session, currency_id)
+        if currency is not None and currency.upper() != default and as_date(month) < today:
+            return (await session.execute(select(CurrencyRate.code).limit(1))).first() is not None
+    return False
+
+
+def _to_cents(value: Any) -> Decimal:
+    return Decimal(str(value or 0)).quantize(Decimal("0.01"))
+
+
+async def balance_history(
+        session: AsyncSession,
+        user: User,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+        max_points: int = 500,
+) -> Dict[str, Any]:
+    """Running balance in the user's default currency, at most ``max_points`` points.
+
+    The running sum is a ``SUM() OVER (ORDER BY date, id_)`` over the
+    amounts converted at the rates of their own day, anchored so that the latest point equals
+    ``users.capital``. The range is cut into ``max_points`` equal time
+    buckets and only the last row of each bucket leaves the database.
+    """
+    dialect_name = session.get_bind().dialect.name
+    if date_to is None:
+        date_to = datetime.now(timezone.utc)
+    if date_from is None:
+        first = (await session.execute(
+            select(func.min(Transaction.date)).where(Transaction.user_id == user.id_)
+        )).scalar_one()
+        date_from = first or date_to
+
+    src = aliased(Currency)
+    dst = aliased(Currency)
+    dst_code = literal(user.default_currency)
+    src_code = func.upper(func.coalesce(CurrencyCode.code, dst_code))
+    day = utc_day_sql(dialect_name, Transaction.date)
+    value = converted_amount_sql(
+        Transaction.amount, Transaction.kind, src_code, dst_code,
+        rate_as_of_sql(src_code, day, src.rate), rate_as_of_sql(dst_code, day, dst.rate),
+    )
+
+    running = (
+        select(
+            Transaction.date,
+            Transaction.id_,
+            func.sum(value).over(order_by=(Transaction.date, Transaction.id_)).label("running"),
+            func.sum(value).over().label("total"),
+            func.sum(case((Transaction.date < date_from, value))).over().label("before"),
+        )
+        .select_from(Transaction)
+        .outerjoin(CurrencyCode, CurrencyCode.id_ == Transaction.currency_id)
+        .outerjoin(src, src.name == src_code)
+        .outerjoin(dst, dst.name == dst_code)
+        .where(Transaction.user_id == user.id_)
+        .subquery()
+    )
+
+    start = _timestamp(date_from)
+    width = max((_timestamp(date_to) - start) / max_points, 1.0)
+    bucket = func.floor((epoch_seconds(dialect_name, running.c.date) - start) / width)
+    ranked = (
+        select(
+            running.c.date, running.c.running, running.c.total, running.c.before,
+            func.row_number().over(
+                partition_by=bucket, order_by=(running.c.date.desc(), running.c.id_.desc()),
+            ).label("rn"),
+        )
+        .where(running.c.date >= date_from, running.c.date < date_to)
+        .subquery()
+    )
+    rows = (await session.execute(
+        select(ranked.c.date, ranked.c.running, ranked.c.total, ranked.c.before)
+        .where(ranked.c.rn == 1)
+        .order_by(ranked.c.date)
+    )).all()
+
+    capital = _to_cents(user.capital)
+    if rows:
+        total, before = _to_cents(rows[0].total), _to_cents(rows[0].before)
+    else:
+        totals = (await session.execute(
+            select(func.max(running.c.total), func.max(running.c.before))
+        )).one()
+        total, before = _to_cents(totals[0]), _to_cents(totals[1])
+    base = capital - total
+    return {
+        "currency": user.default_currency,
+        "date_from": date_from,
+        "date_to": date_to,
+        "opening_balance": base + before,
+        "points": [{"date": row.date, "balance": base + _to_cents(row.running)} for row in rows],
+    }
@@ -1,13 +1,21 @@
+import time
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import date, datetime, timezone
 from decimal import ROUND_HALF_UP, Decimal
-from typing import Dict, Union
+from types import MappingProxyType
+from typing import Dict, Iterable, List, Mapping, NamedTuple, Optional, Tuple, Union
 
-from sqlalchemy import select
+from sqlalchemy import Date, Numeric, case, cast, func, literal, select
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+from sqlalchemy.sql.elements import ColumnElement
 
-from src.models import Currency, TransactionKind
+from src.config import RATES_CACHE_TTL_SECONDS
+from src.models import Currency, CurrencyRate, TransactionKind
 
 
-async def get_rates_map(session: AsyncSession, ensure_usd: bool = True) -> Dict[str, float]:
+async def load_rates(session: AsyncSession, ensure_usd: bool = True) -> Dict[str, float]:
     result = await session.execute(select(Currency.name, Currency.rate))
     rates = {name: float(rate) for name, rate in result.all()}
     if ensure_usd and "USD" not in rates:
@@ -15,15 +23,157 @@ async def get_rates_map(session: AsyncSession, ensure_usd: bool = True) -> Dict[
     return rates
 
 
-async def convert_to_user_currency(
-    session: AsyncSession,
-    user_default_currency: str,                 # "EUR"
-    kind: TransactionKind,                      # EXPENSE / INCOME
-    amount: Union[float, Decimal],              # 123.5
-    transaction_currency: str,                  # "UAH"
+async def load_rates_changed_at(session: AsyncSession) -> Optional[float]:
+    """When the latest day of ``currency_rates`` was written, or ``None`` without history."""
+    latest_day = select(func.max(CurrencyRate.valid_from)).scalar_subquery()
+    recorded_at = (await session.execute(
+        select(func.max(CurrencyRate.recorded_at)).where(CurrencyRate.valid_from == latest_day)
+    )).scalar_one_or_none()
+    if recorded_at is None:
+        return None
+    return (recorded_at if recorded_at.tzinfo else recorded_at.replace(tzinfo=timezone.utc)).timestamp()
+
+
+class RateSnapshot(NamedTuple):
+    version: int
+    loaded_at: float            # time.monotonic() of the last load, for the TTL
+    rates: Mapping[str, float]
+    changed_at: Optional[float]     # recorded_at of the latest stored rates, the same in every worker
+
+
+class RateCache:
+    """Process-wide, read-only copy of ``currencies``.
+
+    The rates change once an hour, so conversions read them from memory.
+    A new snapshot replaces the old one in a single assignment; readers
+    keep whichever snapshot they already hold. The version only moves when
+    the rates or their ``changed_at`` actually differ. Refreshes arrive through
+    :mod:`src.currencies.rate_events`, and a snapshot older than ``ttl``
+    seconds is reloaded on the next read, which covers workers that missed
+    a refresh.
+    """
+
+    def __init__(self, ttl: float = RATES_CACHE_TTL_SECONDS):
+        self.ttl = ttl
+        self.snapshot: Optional[RateSnapshot] = None
+        self._version = 0
+
+    def publish(self, rates: Mapping[str, float], changed_at: Optional[float] = None) -> RateSnapshot:
+        current = self.snapshot
+        if current is not None and current.rates == rates and current.changed_at == changed_at:
+            self.snapshot = current._replace(loaded_at=time.monotonic())
+        else:
+            self._version += 1
+            self.snapshot = RateSnapshot(self._version, time.monotonic(), MappingProxyType(dict(rates)), changed_at)
+        return self.snapshot
+
+    def clear(self) -> None:
+        self.snapshot = None
+
+    async def reload(self, session: AsyncSession) -> RateSnapshot:
+        return self.publish(await load_rates(session), await load_rates_changed_at(session))
+
+    async def current(self, session: AsyncSession) -> RateSnapshot:
+        snapshot = self.snapshot
+        if snapshot is None or time.monotonic() - snapshot.loaded_at >= self.ttl:
+            snapshot = await self.reload(session)
+        return snapshot
+
+
+rate_cache = RateCache()
+
+
+async def get_rates_map(session: AsyncSession, ensure_usd: bool = True) -> Mapping[str, float]:
+    """Current rates per USD; served from :data:`rate_cache` without a query while it is fresh."""
+    if not ensure_usd:
+        return await load_rates(session, ensure_usd=False)
+    return (await rate_cache.current(session)).rates
+
+
+def utc_today() -> date:
+    return datetime.now(timezone.utc).date()
+
+
+def utc_day(value: datetime) -> date:
+    # SQLite hands timezone-aware columns back naive; they are stored as UTC
+    return value.date() if value.tzinfo is None else value.astimezone(timezone.utc).date()
+
+
+class HistoricalRates:
+    """Rates as of a given moment, for converting backdated transactions.
+
+    Anything dated today or later uses the current rates. An earlier day
+    takes, per code, the latest ``currency_rates`` row on or before it, and
+    codes without such a row fall back to the current rate.
+    """
+
+    def __init__(
+            self, current: Mapping[str, float], history: Mapping[str, Tuple[List[date], List[float]]], today: date
+    ):
+        self.current = current
+        self.history = history
+        self.today = today
+        self._days: Dict[date, Mapping[str, float]] = {}
+
+    def on(self, when: Optional[datetime]) -> Mapping[str, float]:
+        if when is None or not self.history:
+            return self.current
+        day = utc_day(when)
+        if day >= self.today:
+            return self.current
+        if day not in self._days:
+            rates = dict(self.current)
+            for code, (days, values) in self.history.items():
+                index = bisect_right(days, day)
+                if index:
+                    rates[code] = values[index - 1]
+            self._days[day] = rates
+        return self._days[day]
+
+
+async def load_historical_rates(session: AsyncSession, moments: Iterable[Optional[datetime]]) -> HistoricalRates:
+    """Everything needed to convert at ``moments`` in at most one query.
+
+    The query is a range join over ``currency_rates``: for every code, the
+    rows from the last one on or before the earliest day up to the latest
+    day. Without backdated moments no query is made at all.
+    """
+    current = await get_rates_map(session)
+    today = utc_today()
+    days = sorted(day for day in {utc_day(when) for when in moments if when is not None} if day < today)
+    if not days:
+        return HistoricalRates(current, {}, today)
+
+    earlier = aliased(CurrencyRate)
+    floor = (
+        select(func.max(earlier.valid_from))
+        .where(earlier.code == CurrencyRate.code, earlier.valid_from <= days[0])
+        .scalar_subquery()
+    )
+    stmt = (
+        select(CurrencyRate.code, CurrencyRate.valid_from, CurrencyRate.rate)
+        .where(CurrencyRate.valid_from <= days[-1], CurrencyRate.valid_from >= func.coalesce(floor, days[0]))
+        .order_by(CurrencyRate.code, CurrencyRate.valid_from)
+    )
+    history: Dict[str, Tuple[List[date], List[float]]] = defaultdict(lambda: ([], []))
+    for code, valid_from, rate in (await session.execute(stmt)).all():
+        history[code][0].append(valid_from)
+        history[code][1].append(float(rate))
+    return HistoricalRates(current, dict(history), today)
+
+
+def convert_with_rates(
+    rates: Mapping[str, float],
+    user_default_currency: str,
+    kind: TransactionKind,
+    amount: Union[float, Decimal],
+    transaction_currency: Optional[str],
 ) -> Decimal:
-    rates = await get_rates_map(session)
-    src = transaction_currency.strip().upper()
+    """Same as :func:`convert_to_user_currency`, but against an already loaded rates map.
+
+    A transaction without a currency is taken to be in the user's default one.
+    """
+    src = (transaction_currency or user_default_currency).strip().upper()
     dst = user_default_currency.strip().upper()
 
     if src not in rates:
@@ -44,3 +194,64 @@ async def convert_to_user_currency(
         converted = -converted
 
     return converted
+
+
+async def convert_to_user_currency(
+    session: AsyncSession,
+    user_default_currency: str,                 # "EUR"
+    kind: TransactionKind,                      # EXPENSE / INCOME
+    amount: Union[float, Decimal],              # 123.5
+    transaction_currency: str,                  # "UAH"
+    when: Optional[datetime] = None,            # transaction date; None means now
+) -> Decimal:
+    rates = (await load_historical_rates(session, [when])).on(when)
+    return convert_with_rates(rates, user_default_currency, kind, amount, transaction_currency)
+
+
+def converted_amount_sql(
+    amount: ColumnElement,
+    kind: ColumnElement,
+    src_code: ColumnElement,
+    dst_code: ColumnElement,
+    src_rate: ColumnElement,
+    dst_rate: ColumnElement,
+) -> ColumnElement:
+    """SQL counterpart of :func:`convert_with_rates` for set-based jobs.
+
+    ``src_rate``/``dst_rate`` are the (outer-joined) ``currencies.rate``
+    columns or their :func:`rate_as_of_sql` wrappers; USD falls back to 1.0 like :func:`get_rates_map` does, and an
+    unknown rate yields NULL. Rounds half away from zero to cents.
+    """
+    def rate(code: ColumnElement, joined_rate: ColumnElement) -> ColumnElement:
+        return cast(func.coalesce(joined_rate, case((code == "USD", literal(1.0)))), Numeric)
+
+    value = case(
+        (src_code == dst_code, cast(amount, Numeric)),
+        else_=func.round(cast(amount, Numeric) / rate(src_code, src_rate) * rate(dst_code, dst_rate), 2),
+    )
+    return case((kind == TransactionKind.EXPENSE, -value), else_=value)
+
+
+def utc_day_sql(dialect_name: str, column: ColumnElement) -> ColumnElement:
+    """SQL counterpart of :func:`utc_day`."""
+    if dialect_name == "postgresql":
+        return cast(func.timezone("UTC", column), Date)
+    return func.date(column)
+
+
+def rate_as_of_sql(code: ColumnElement, day: ColumnElement, current_rate: ColumnElement) -> ColumnElement:
+    """SQL counterpart of :meth:`HistoricalRates.on` for one code.
+
+    The correlated subquery is an index-only backward scan of the
+    ``currency_rates`` primary key per row (what a ``LATERAL`` join would
+    plan to on Postgres). Pass the result as ``src_rate``/``dst_rate`` of
+    :func:`converted_amount_sql`.
+    """
+    as_of = (
+        select(CurrencyRate.rate)
+        .where(CurrencyRate.code == code, CurrencyRate.valid_from <= day)
+        .order_by(CurrencyRate.valid_from.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    return case((day >= literal(utc_today(), Date), current_rate), else_=func.coalesce(as_of, current_rate))
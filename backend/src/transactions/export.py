@@ -0,0 +1,69 @@
+import csv
+import io
+import json
+from typing import AsyncIterator, Iterable, Sequence
+
+from sqlalchemy import Select, select
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from src.models import Transaction
+from src.transactions.references import CATEGORY_NAME, CURRENCY_CODE, join_names
+
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_COLUMNS = ("id_", "date", "name", "amount", "kind", "category_name", "currency")
+
+MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def export_query(user_id: int) -> Select:
+    """Plain column tuples (no ORM identity map) in the list endpoint's order."""
+    columns = {"category_name": CATEGORY_NAME, "currency": CURRENCY_CODE}
+    return join_names(
+        select(*(columns.get(col, getattr(Transaction, col, None)) for col in EXPORT_COLUMNS))
+        .where(Transaction.user_id == user_id)
+        .order_by(Transaction.date.desc(), Transaction.id_.desc())
+    )
+
+
+def _csv_chunk(rows: Iterable[Sequence]) -> str:
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator="\n")
+    for tx_id, date, name, amount, kind, category_name, currency in rows:
+        writer.writerow([tx_id, date.isoformat(), name, amount, kind.name, category_name, currency or ""])
+    return buf.getvalue()
+
+
+def _ndjson_chunk(rows: Iterable[Sequence]) -> str:
+    return "".join(
+        json.dumps({
+            "id_": tx_id,
+            "date": date.isoformat(),
+            "name": name,
+            "amount": str(amount),
+            "kind": kind.name,
+            "category_name": category_name,
+            "currency": currency,
+        }, ensure_ascii=False) + "\n"
+        for tx_id, date, name, amount, kind, category_name, currency in rows
+    )
+
+
+async def stream_export(bind: AsyncEngine, stmt: Select, fmt: str) -> AsyncIterator[bytes]:
+    """Yield the export body chunk by chunk from a server-side cursor.
+
+    Runs on its own session: the request-scoped one is closed by the time a
+    ``StreamingResponse`` starts iterating. The CSV header goes out before
+    the query is even sent.
+    """
+    if fmt == "csv":
+        yield (",".join(EXPORT_COLUMNS) + "\n").encode()
+    encode = _csv_chunk if fmt == "csv" else _ndjson_chunk
+
+    async with AsyncSession(bind) as session:
+        result = await session.stream(stmt.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        async for partition in result.partitions():
+            yield encode(partition).encode()
@@ -0,0 +1,66 @@
+from datetime import datetime
+from decimal import Decimal
+from typing import Optional
+
+from fastapi import HTTPException, Query
+from pydantic import BaseModel
+from sqlalchemy import Select
+
+from src.models import Transaction, TransactionKind
+from src.transactions.references import category_id_of, currency_id_of
+
+
+class TransactionFilters(BaseModel):
+    """Query-string filters shared by the list and export endpoints.
+
+    Every filter is an index range scan on Postgres; see the indexes on
+    :class:`src.models.Transaction`.
+    """
+    date_from: Optional[datetime] = None
+    date_to: Optional[datetime] = None
+    kind: Optional[TransactionKind] = None
+    category_name: Optional[str] = None
+    currency: Optional[str] = None
+    amount_min: Optional[Decimal] = None
+    amount_max: Optional[Decimal] = None
+
+    def apply(self, stmt: Select) -> Select:
+        if self.date_from is not None:
+            stmt = stmt.where(Transaction.date >= self.date_from)
+        if self.date_to is not None:
+            stmt = stmt.where(Transaction.date < self.date_to)
+        if self.kind is not None:
+            stmt = stmt.where(Transaction.kind == self.kind)
+        if self.category_name is not None:
+            stmt = stmt.where(Transaction.category_id == category_id_of(self.category_name))
+        if self.currency is not None:
+            stmt = stmt.where(Transaction.currency_id == currency_id_of(self.currency))
+        if self.amount_min is not None:
+            stmt = stmt.where(Transaction.amount >= self.amount_min)
+        if self.amount_max is not None:
+            stmt = stmt.where(Transaction.amount <= self.amount_max)
+        return stmt
+
+
+def transaction_filters(
+        date_from: Optional[datetime] = Query(None, description="Inclusive lower bound"),
+        date_to: Optional[datetime] = Query(None, description="Exclusive upper bound"),
+        kind: Optional[int] = Query(None, description="0 = expense, 1 = income, 2 = transfer"),
+        category_name: Optional[str] = Query(None, max_length=64),
+        currency: Optional[str] = Query(None, max_length=16),
+        amount_min: Optional[Decimal] = Query(None, ge=0),
+        amount_max: Optional[Decimal] = Query(None, ge=0),
+) -> TransactionFilters:
+    try:
+        kind = TransactionKind(kind) if kind is not None else None
+    except ValueError:
+        raise HTTPException(status_code=422, detail="Invalid 'kind' value")
+    return TransactionFilters(
+        date_from=date_from,
+        date_to=date_to,
+        kind=kind,
+        category_name=category_name,
+        currency=currency,
+        amount_min=amount_min,
+        amount_max=amount_max,
+    )
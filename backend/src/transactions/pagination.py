@@ -0,0 +1,30 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Sequence, Tuple
+
+
+def encode_cursor(*values: Any) -> str:
+    """Pack the sort key of the last row seen (e.g. ``date, id_``) into an opaque URL-safe token."""
+    payload = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, types: Sequence[type]) -> Tuple[Any, ...]:
+    """Reverse of :func:`encode_cursor` for a key of the given ``types``.
+
+    Raises ``ValueError`` on a malformed token or one issued for a
+    different sort order.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(payload, list) or len(payload) != len(types):
+            raise ValueError("cursor does not match the sort order")
+        return tuple(
+            datetime.fromisoformat(value) if type_ is datetime else type_(value)
+            for type_, value in zip(types, payload)
+        )
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
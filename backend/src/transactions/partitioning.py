@@ -0,0 +1,268 @@
+"""Monthly ``RANGE (date)`` partitioning of ``transactions`` on Postgres.
+
+``create_all`` still creates a plain table, as the model has to work on
+SQLite too; ``python -m src.transactions.partitioning --migrate`` turns it
+into a partitioned one in a single transaction. After that the daily
+maintenance keeps ``PARTITION_MONTHS_AHEAD`` future months attached and,
+when ``TRANSACTION_RETENTION_MONTHS`` is set, detaches older months with
+``DETACH PARTITION ... CONCURRENTLY``, so reads and writes of the table go
+on meanwhile. Capital still includes a detached month, so its converted
+per-user sums move to ``archived_balances``, which reconciliation adds
+back, and the table is renamed to ``transactions_archive_YYYY_MM``. A
+reconciliation running between a detach and its archive sees the month
+as drift; don't ``--fix`` while the maintenance runs.
+
+Partitions are named ``transactions_pYYYY_MM``; rows outside every month
+(typos like year 1900) land in ``transactions_default``.
+"""
+import argparse
+import asyncio
+import re
+from datetime import date, datetime, timezone
+from typing import Iterable, List, Optional
+
+from fastapi import FastAPI
+from fastapi_utilities import repeat_every
+from sqlalchemy import Date, column, func, insert, literal, select, table, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from src.config import PARTITION_MONTHS_AHEAD, TRANSACTION_RETENTION_MONTHS, logger
+from src.database import engine
+from src.models import ArchivedBalance, Transaction
+from src.transactions.reconciliation import signed_amounts
+from src.utils.leader import LeaderLock
+
+PARENT = Transaction.__tablename__
+DEFAULT_PARTITION = f"{PARENT}_default"
+PARTITION_NAME_RE = re.compile(rf"^{PARENT}_p(\d{{4}})_(\d{{2}})$")
+
+
+def add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_start(value: datetime) -> date:
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return value.date().replace(day=1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARENT}_p{month.year:04d}_{month.month:02d}"
+
+
+def archive_name(month: date) -> str:
+    return f"{PARENT}_archive_{month.year:04d}_{month.month:02d}"
+
+
+def partition_month(name: str) -> Optional[date]:
+    match = PARTITION_NAME_RE.match(name)
+    return date(int(match[1]), int(match[2]), 1) if match else None
+
+
+def months_to_detach(names: Iterable[str], today: date, retention_months: int) -> List[str]:
+    """Partitions whose whole month lies before the retention window."""
+    cutoff = add_months(today.replace(day=1), -retention_months)
+    return sorted(name for name in names if (month := partition_month(name)) and month < cutoff)
+
+
+async def is_partitioned(conn: AsyncConnection) -> bool:
+    kind = (await conn.execute(
+        text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:name)"), {"name": PARENT}
+    )).scalar_one_or_none()
+    return kind == "p"
+
+
+async def _attached_partitions(conn: AsyncConnection, detach_pending: bool = False) -> List[str]:
+    """Partitions of the table; with ``detach_pending`` those an interrupted concurrent detach left behind."""
+    return list((await conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(:name) AND i.inhdetachpending = :pending"
+    ), {"name": PARENT, "pending": detach_pending})).scalars().all())
+
+
+async def _detached_partitions(conn: AsyncConnection) -> List[str]:
+    """Tables still named like a partition but attached to nothing, i.e. not archived yet."""
+    return list((await conn.execute(text(
+        "SELECT c.relname FROM pg_class c "
+        "WHERE c.relkind = 'r' AND pg_table_is_visible(c.oid) AND c.relname LIKE :prefix "
+        "AND NOT EXISTS (SELECT 1 FROM pg_inherits i WHERE i.inhrelid = c.oid)"
+    ), {"prefix": f"{PARENT}\\_p%"})).scalars().all())
+
+
+async def ensure_partition(conn: AsyncConnection, month: date) -> bool:
+    """Attach the partition for ``month`` unless it exists; returns whether one was added.
+
+    Rows that already sit in the default partition for that month are moved
+    into the new table before it is attached, as Postgres would otherwise
+    refuse the attach.
+    """
+    name = partition_name(month)
+    if name in await _attached_partitions(conn):
+        return False
+    lower, upper = month.isoformat(), add_months(month, 1).isoformat()
+    bounds = f"FROM ('{lower} 00:00:00+00') TO ('{upper} 00:00:00+00')"
+    await conn.execute(text(f"CREATE TABLE {name} (LIKE {PARENT} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    await conn.execute(text(
+        f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} "
+        f"WHERE date >= '{lower} 00:00:00+00' AND date < '{upper} 00:00:00+00' RETURNING *) "
+        f"INSERT INTO {name} SELECT * FROM moved"
+    ))
+    await conn.execute(text(f"ALTER TABLE {PARENT} ATTACH PARTITION {name} FOR VALUES {bounds}"))
+    return True
+
+
+async def maintain_partitions(
+        conn: AsyncConnection,
+        months_ahead: int = PARTITION_MONTHS_AHEAD,
+        today: Optional[date] = None,
+) -> None:
+    """Attach the current and next ``months_ahead`` months."""
+    today = today or datetime.now(timezone.utc).date()
+    current = today.replace(day=1)
+    for offset in range(months_ahead + 1):
+        if await ensure_partition(conn, add_months(current, offset)):
+            logger.info("Transactions partition %s attached", partition_name(add_months(current, offset)))
+
+
+async def archive_partition(conn: AsyncConnection, name: str) -> None:
+    """Move a detached month's capital into ``archived_balances`` and rename its table.
+
+    Both run in the caller's transaction, so a month is archived exactly
+    once: only tables still named like a partition are picked up again.
+    """
+    month = partition_month(name)
+    detached = table(name, *(column(c.name, c.type) for c in Transaction.__table__.c))
+    signed, joined = signed_amounts(conn.dialect.name, detached)
+    await conn.execute(insert(ArchivedBalance).from_select(
+        ["user_id", "month", "total"],
+        select(detached.c.user_id, literal(month, Date), func.coalesce(func.sum(signed), 0))
+        .select_from(joined)
+        .group_by(detached.c.user_id),
+    ))
+    await conn.execute(text(f"ALTER TABLE {name} RENAME TO {archive_name(month)}"))
+
+
+async def expire_partitions(
+        bind: AsyncEngine,
+        retention_months: Optional[int] = TRANSACTION_RETENTION_MONTHS,
+        today: Optional[date] = None,
+) -> None:
+    """Detach the months before the retention window and archive their capital.
+
+    ``DETACH ... CONCURRENTLY`` cannot run in a transaction block, so it
+    goes over an autocommit connection; a detach an earlier run left
+    pending is finished with ``FINALIZE`` first. Each detached month is
+    then archived in a transaction of its own.
+    """
+    if not retention_months:
+        return
+    today = today or datetime.now(timezone.utc).date()
+    async with bind.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        for name in await _attached_partitions(conn, detach_pending=True):
+            await conn.execute(text(f"ALTER TABLE {PARENT} DETACH PARTITION {name} FINALIZE"))
+            logger.info("Transactions partition %s detached (finalized)", name)
+        for name in months_to_detach(await _attached_partitions(conn), today, retention_months):
+            await conn.execute(text(f"ALTER TABLE {PARENT} DETACH PARTITION {name} CONCURRENTLY"))
+            logger.info("Transactions partition %s detached", name)
+        detached = months_to_detach(await _detached_partitions(conn), today, retention_months)
+    for name in detached:
+        async with bind.begin() as conn:
+            await archive_partition(conn, name)
+        logger.info("Transactions partition %s archived as %s", name, archive_name(partition_month(name)))
+
+
+async def migrate_to_partitioned(conn: AsyncConnection) -> bool:
+    """Rebuild ``transactions`` as a partitioned table; ``False`` if it already is one.
+
+    Runs inside the caller's transaction and holds an exclusive lock on the
+    table while rows are copied, so schedule it in a maintenance window.
+    The primary key becomes ``(id_, date)`` because Postgres requires the
+    partition key in every unique index; ids still come from the same
+    sequence, so the ORM keeps treating ``id_`` alone as the identity.
+    """
+    if await is_partitioned(conn):
+        return False
+    old = f"{PARENT}_unpartitioned"
+
+    for index in Transaction.__table__.indexes:
+        await conn.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+    await conn.execute(text(f"ALTER TABLE {PARENT} RENAME TO {old}"))
+    await conn.execute(text(f"ALTER TABLE {old} RENAME CONSTRAINT {PARENT}_pkey TO {old}_pkey"))
+
+    await conn.execute(text(
+        f"CREATE TABLE {PARENT} (LIKE {old} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) PARTITION BY RANGE (date)"
+    ))
+    await conn.execute(text(f"ALTER TABLE {PARENT} ADD PRIMARY KEY (id_, date)"))
+    await conn.execute(text(
+        f"ALTER TABLE {PARENT} ADD FOREIGN KEY (user_id) REFERENCES users (id_) ON DELETE CASCADE"
+    ))
+    await conn.execute(text(
+        f"ALTER TABLE {PARENT} ADD FOREIGN KEY (recurring_id) REFERENCES recurring_transactions (id_) "
+        "ON DELETE SET NULL"
+    ))
+    await conn.execute(text(f"ALTER TABLE {PARENT} ADD FOREIGN KEY (category_id) REFERENCES categories (id_)"))
+    await conn.execute(text(f"ALTER TABLE {PARENT} ADD FOREIGN KEY (currency_id) REFERENCES currency_codes (id_)"))
+    await conn.execute(text(f"ALTER SEQUENCE {PARENT}_id__seq OWNED BY {PARENT}.id_"))
+    await conn.execute(text(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {PARENT} DEFAULT"))
+
+    months = (await conn.execute(text(
+        f"SELECT DISTINCT date_trunc('month', date AT TIME ZONE 'UTC')::date FROM {old}"
+    ))).scalars().all()
+    for month in sorted(months):
+        await ensure_partition(conn, month)
+    await maintain_partitions(conn)
+
+    await conn.execute(text(f"INSERT INTO {PARENT} SELECT * FROM {old}"))
+    # partitioned indexes cascade to every current and future partition
+    for index in Transaction.__table__.indexes:
+        await conn.run_sync(index.create)
+    await conn.execute(text(f"DROP TABLE {old}"))
+    await conn.execute(text(f"ANALYZE {PARENT}"))
+    return True
+
+
+def register_partition_cron(app: FastAPI) -> None:
+    """Daily maintenance by the elected leader, so workers never race on the same DDL."""
+    leader = LeaderLock(engine, "partition-maintenance")
+
+    @app.on_event("startup")
+    @repeat_every(seconds=24*60*60, wait_first=False, logger=logger)
+    async def scheduled_partition_maintenance() -> None:
+        if engine.dialect.name != "postgresql":
+            return
+        try:
+            if await leader.acquire():
+                async with engine.begin() as conn:
+                    partitioned = await is_partitioned(conn)
+                    if partitioned:
+                        await maintain_partitions(conn)
+                if partitioned:
+                    await expire_partitions(engine)
+        except Exception:
+            logger.exception("Transactions partition maintenance failed")
+
+    @app.on_event("shutdown")
+    async def shutdown_partition_maintenance() -> None:
+        await leader.release()
+
+
+async def _main() -> None:
+    parser = argparse.ArgumentParser(description="Partition the transactions table by month (Postgres)")
+    parser.add_argument("--migrate", action="store_true", help="convert a plain table first")
+    args = parser.parse_args()
+
+    async with engine.begin() as conn:
+        if args.migrate and await migrate_to_partitioned(conn):
+            logger.info("Transactions table converted to monthly partitions")
+        if not await is_partitioned(conn):
+            raise SystemExit("transactions is not partitioned; run with --migrate")
+        await maintain_partitions(conn)
+    await expire_partitions(engine)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
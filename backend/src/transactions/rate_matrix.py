@@ -0,0 +1,139 @@
+"""Currency conversion for many rows at once.
+
+:func:`~src.transactions.currency_converter.convert_with_rates` converts one
+row with ``Decimal`` arithmetic. :class:`RateMatrix` does the same for whole
+arrays in a few NumPy operations, against an N×N matrix of cross rates built
+once per rates snapshot. The spending summary converts its groups this way,
+with one matrix per day's rates (:class:`HistoricalMatrices`).
+"""
+from datetime import datetime
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Dict, Mapping, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.transactions.currency_converter import HistoricalRates, RateSnapshot, rate_cache
+
+Codes = Union[Sequence[str], np.ndarray]
+
+# a float result this close to a half cent (relative to its size) is redone in Decimal
+TIE_TOLERANCE = 1e-12
+
+
+class RateMatrix:
+    """Cross rates between every pair of known codes.
+
+    ``matrix[i, j]`` converts an amount in ``codes[i]`` to ``codes[j]``.
+    Codes can be passed as strings or as indices from :meth:`indices`.
+    """
+
+    def __init__(self, rates: Mapping[str, float]):
+        self.rates = dict(rates)
+        self.codes = sorted(self.rates)
+        self.index = {code: i for i, code in enumerate(self.codes)}
+        self.per_usd = np.array([float(self.rates[code]) for code in self.codes])
+        self.matrix = self.per_usd[np.newaxis, :] / self.per_usd[:, np.newaxis]
+
+    def indices(self, codes: Codes, role: str = "source") -> np.ndarray:
+        """Matrix positions of ``codes``; an unknown code raises ``ValueError`` like the scalar path."""
+        if isinstance(codes, np.ndarray) and codes.dtype.kind in "iu":
+            return codes
+        index = self.index
+        try:
+            return np.fromiter((index[code] for code in codes), dtype=np.intp, count=len(codes))
+        except KeyError:
+            pass
+        # slow path for codes that need normalizing
+        positions = np.empty(len(codes), dtype=np.intp)
+        for i, code in enumerate(codes):
+            key = code.strip().upper()
+            if key not in index:
+                raise ValueError(f"Rate for {role} currency '{key}' not found")
+            positions[i] = index[key]
+        return positions
+
+    def convert(self, amounts: Union[Sequence[float], np.ndarray], src: Codes, dst: Codes) -> np.ndarray:
+        """Unrounded float conversion, for charts and estimates."""
+        factors = self.matrix[self.indices(src, "source"), self.indices(dst, "target")]
+        return np.asarray(amounts, dtype=np.float64) * factors
+
+    def convert_cents(
+            self,
+            cents: Union[Sequence[int], np.ndarray],
+            src: Codes,
+            dst: Codes,
+            expense: Optional[Union[Sequence[bool], np.ndarray]] = None,
+    ) -> np.ndarray:
+        """Integer cents in, integer cents out, equal to :func:`convert_with_rates` row by row.
+
+        The float result is rounded half up (away from zero). Only values
+        within float error of a half cent are ambiguous; those few rows are
+        recomputed with the same ``Decimal`` steps as the scalar function.
+        Rows flagged in ``expense`` come back negated.
+        """
+        cents = np.asarray(cents, dtype=np.int64)
+        src_idx = self.indices(src, "source")
+        dst_idx = self.indices(dst, "target")
+
+        magnitude = np.abs(cents)
+        # same operation order as the scalar path: to USD, then to the target
+        value = magnitude / self.per_usd[src_idx] * self.per_usd[dst_idx]
+        result = np.floor(value + 0.5).astype(np.int64)
+        same = src_idx == dst_idx
+        result[same] = magnitude[same]
+
+        fraction = value - np.floor(value)
+        ties = ~same & (np.abs(fraction - 0.5) <= np.maximum(value, 1.0) * TIE_TOLERANCE)
+        for i in np.flatnonzero(ties):
+            result[i] = self._decimal_cents(int(magnitude[i]), self.codes[src_idx[i]], self.codes[dst_idx[i]])
+
+        result = np.where(cents < 0, -result, result)
+        if expense is not None:
+            result = np.where(np.asarray(expense, dtype=bool), -result, result)
+        return result
+
+    def _decimal_cents(self, cents: int, src: str, dst: str) -> int:
+        usd = Decimal(cents).scaleb(-2) / Decimal(str(self.rates[src]))
+        converted = (usd * Decimal(str(self.rates[dst]))).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+        return int(converted.scaleb(2))
+
+
+class HistoricalMatrices:
+    """:class:`RateMatrix` counterpart of :meth:`HistoricalRates.on`.
+
+    Days with the same rates share one matrix, so a range where the rates
+    rarely moved builds only a few.
+    """
+
+    def __init__(self, history: HistoricalRates, current: Optional[RateMatrix] = None):
+        self.history = history
+        self._by_rates: Dict[Tuple, RateMatrix] = {}
+        # HistoricalRates hands out one map per day, so most lookups stop here
+        self._by_map: Dict[int, RateMatrix] = {}
+        if current is not None:
+            self._by_rates[tuple(sorted(current.rates.items()))] = current
+
+    def on(self, when: Optional[datetime]) -> RateMatrix:
+        rates = self.history.on(when)
+        matrix = self._by_map.get(id(rates))
+        if matrix is None:
+            key = tuple(sorted(rates.items()))
+            matrix = self._by_rates.get(key)
+            if matrix is None:
+                matrix = self._by_rates[key] = RateMatrix(rates)
+            self._by_map[id(rates)] = matrix
+        return matrix
+
+
+_current: Optional[RateSnapshot] = None
+_current_matrix: Optional[RateMatrix] = None
+
+
+async def current_rate_matrix(session: AsyncSession) -> RateMatrix:
+    """Matrix of the current rates snapshot, rebuilt only when the snapshot changes."""
+    global _current, _current_matrix
+    snapshot = await rate_cache.current(session)
+    if _current_matrix is None or _current.version != snapshot.version:
+        _current, _current_matrix = snapshot, RateMatrix(snapshot.rates)
+    return _current_matrix
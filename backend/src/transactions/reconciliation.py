@@ -0,0 +1,147 @@
+import argparse
+import asyncio
+from decimal import Decimal
+from typing import Any, Dict, List, Tuple
+
+from sqlalchemy import ColumnElement, FromClause, Join, bindparam, func, join, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from src.models import ArchivedBalance, Currency, CurrencyCode, Transaction, User
+from src.transactions.currency_converter import converted_amount_sql, rate_as_of_sql, utc_day_sql
+from src.utils.conditional import data_version_bump
+
+RECONCILE_BATCH_SIZE = 500
+MAX_REPORTED_DRIFTS = 1000
+DEFAULT_TOLERANCE = Decimal("0.01")
+
+
+def signed_amounts(dialect_name: str, tx: FromClause, all_users: bool = False) -> Tuple[ColumnElement, Join]:
+    """``tx``'s amounts signed and converted to the owner's default currency, and the join they need.
+
+    Amounts are converted at the rates of their own day, as every write
+    path does. ``tx`` is ``transactions`` or a table of the same shape
+    (a detached partition); ``all_users`` keeps users without rows.
+    """
+    src = aliased(Currency)
+    dst = aliased(Currency)
+    src_code = func.upper(func.coalesce(CurrencyCode.code, User.default_currency))
+    day = utc_day_sql(dialect_name, tx.c.date)
+    signed = converted_amount_sql(
+        tx.c.amount, tx.c.kind, src_code, User.default_currency,
+        rate_as_of_sql(src_code, day, src.rate), rate_as_of_sql(User.default_currency, day, dst.rate),
+    )
+    joined = (
+        join(User, tx, tx.c.user_id == User.id_, isouter=all_users)
+        .outerjoin(CurrencyCode, CurrencyCode.id_ == tx.c.currency_id)
+        .outerjoin(src, src.name == src_code)
+        .outerjoin(dst, dst.name == User.default_currency)
+    )
+    return signed, joined
+
+
+def _expected_capital_query(dialect_name: str, first_id: int, last_id: int):
+    """Observed vs. recomputed capital for users ``first_id..last_id`` in one grouped pass.
+
+    Months the retention job detached count with their ``archived_balances``.
+    """
+    tx = Transaction.__table__
+    signed, joined = signed_amounts(dialect_name, tx, all_users=True)
+    archived = (
+        select(func.coalesce(func.sum(ArchivedBalance.total), 0))
+        .where(ArchivedBalance.user_id == User.id_)
+        .scalar_subquery()
+    )
+    return (
+        select(
+            User.id_,
+            User.capital,
+            func.coalesce(func.sum(signed), 0),
+            func.count(tx.c.id_) - func.count(signed),
+            archived,
+        )
+        .select_from(joined)
+        .where(User.id_.between(first_id, last_id))
+        .group_by(User.id_, User.capital)
+    )
+
+
+async def reconcile_capital(
+        session: AsyncSession,
+        fix: bool = False,
+        batch_size: int = RECONCILE_BATCH_SIZE,
+        tolerance: Decimal = DEFAULT_TOLERANCE,
+) -> Dict[str, Any]:
+    """Recompute every user's capital from their transactions and report the drift.
+
+    Users are walked in ``id_`` order, ``batch_size`` at a time, each batch in
+    its own short transaction. With ``fix=True`` the drift is added to
+    ``users.capital`` as an increment rather than overwriting it, so a write
+    that lands between the check and the fix is not lost.
+
+    Capital set by hand (``PATCH /api/users/me``) shows up as drift too,
+    which is why fixing is opt-in.
+    """
+    report: Dict[str, Any] = {
+        "users_checked": 0, "drifted_count": 0, "drifted": [], "fixed": 0, "unconvertible_rows": 0,
+    }
+    dialect_name = session.get_bind().dialect.name
+    last_id = 0
+    while True:
+        ids = (await session.execute(
+            select(User.id_).where(User.id_ > last_id).order_by(User.id_).limit(batch_size)
+        )).scalars().all()
+        if not ids:
+            break
+        rows = (await session.execute(_expected_capital_query(dialect_name, ids[0], ids[-1]))).all()
+
+        corrections: List[Dict[str, Any]] = []
+        for user_id, capital, expected, unconvertible, archived in rows:
+            expected = (Decimal(str(expected)) + Decimal(str(archived))).quantize(Decimal("0.01"))
+            drift = expected - Decimal(str(capital)).quantize(Decimal("0.01"))
+            report["unconvertible_rows"] += unconvertible
+            if abs(drift) < tolerance:
+                continue
+            report["drifted_count"] += 1
+            if len(report["drifted"]) < MAX_REPORTED_DRIFTS:
+                report["drifted"].append({
+                    "user_id": user_id, "capital": float(capital), "expected": float(expected), "drift": float(drift),
+                })
+            corrections.append({"uid": user_id, "drift": float(drift)})
+
+        if fix and corrections:
+            await session.execute(
+                update(User.__table__)
+                .where(User.__table__.c.id_ == bindparam("uid"))
+                .values(capital=func.round(User.__table__.c.capital + bindparam("drift"), 2), **data_version_bump()),
+                corrections,
+            )
+            report["fixed"] += len(corrections)
+        await session.commit()
+
+        report["users_checked"] += len(rows)
+        last_id = ids[-1]
+    return report
+
+
+async def _main() -> None:
+    from src.config import logger
+    from src.database import AsyncSessionLocal
+
+    parser = argparse.ArgumentParser(description="Check users.capital against the sum of their transactions")
+    parser.add_argument("--fix", action="store_true", help="apply the drift to users.capital")
+    parser.add_argument("--batch-size", type=int, default=RECONCILE_BATCH_SIZE)
+    args = parser.parse_args()
+
+    async with AsyncSessionLocal() as session:
+        report = await reconcile_capital(session, fix=args.fix, batch_size=args.batch_size)
+    for item in report["drifted"]:
+        logger.info("Capital drift: %s", item)
+    logger.info(
+        "Capital reconciliation: %s users checked, %s drifted, %s fixed, %s rows without a rate",
+        report["users_checked"], report["drifted_count"], report["fixed"], report["unconvertible_rows"],
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
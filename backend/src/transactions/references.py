@@ -0,0 +1,231 @@
+"""Interning of category names and currency codes into smallint keys.
+
+Name <-> id pairs never change once written, so every process keeps them
+in a plain dict. Missing rows are inserted on first use; their ids become
+visible to the cache only after the inserting transaction commits, so a
+rolled-back insert can never leave a dangling id behind. The smallint key
+space is shared by all users, so requests may only name one of
+``DEFAULT_CATEGORIES``; currency codes only get this far once they have
+converted against a known rate.
+
+``python -m src.transactions.references --migrate`` moves an existing
+Postgres ``transactions`` table from the old string columns to the keys.
+"""
+import argparse
+import asyncio
+from typing import Any, Callable, Collection, Dict, Iterable, List, Mapping, Optional
+
+from sqlalchemy import event, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+
+from src.database import Base
+from src.models import Category, CurrencyCode, Transaction, TransactionMonthlyRollup
+
+PENDING_KEY = "pending_references"
+
+# seeded into ``categories`` and the only names requests may use; names
+# added here later are inserted on first use in existing databases
+DEFAULT_CATEGORIES = (
+    "shopping", "food", "phone", "entertainment", "education", "beauty", "sports", "social",
+    "transportation", "clothing", "car", "alcohol", "cigarettes", "electronics", "travel", "health",
+    "pets", "repairs", "housing", "home", "gifts", "donations", "lottery", "kids",
+    "salary", "freelance", "investment", "other",
+)
+
+
+class ReferenceCache:
+    def __init__(
+            self, model, column: str, normalize: Callable[[str], str], allowed: Optional[Collection[str]] = None
+    ):
+        self.table = model.__table__
+        self.column = self.table.c[column]
+        self.normalize = normalize
+        self.allowed = frozenset(allowed) if allowed is not None else None
+        self.ids: Dict[str, int] = {}
+        self.names: Dict[int, str] = {}
+
+    def _remember(self, name: str, id_: int) -> None:
+        self.ids[name] = id_
+        self.names[id_] = name
+
+    def check(self, name: str) -> str:
+        """``name`` normalized; ``ValueError`` if it is outside ``allowed``."""
+        name = self.normalize(name)
+        if self.allowed is not None and name not in self.allowed:
+            raise ValueError(f"'{name}' is not one of the known {self.table.name}")
+        return name
+
+    def clear(self) -> None:
+        self.ids.clear()
+        self.names.clear()
+
+    async def load(self, session: AsyncSession) -> None:
+        for id_, name in (await session.execute(select(self.table.c.id_, self.column))).all():
+            self._remember(name, id_)
+
+    async def id_for(self, session: AsyncSession, name: str, create: bool = True) -> Optional[int]:
+        """Key of ``name``; a new name is inserted unless ``create`` is false.
+
+        With ``create`` the name must pass :meth:`check`, even if a row for
+        it already exists.
+        """
+        name = self.check(name) if create else self.normalize(name)
+        if name in self.ids:
+            return self.ids[name]
+        pending = session.info.setdefault(PENDING_KEY, {})
+        if (self, name) in pending:
+            return pending[(self, name)]
+
+        if create:
+            insert_fn = pg_insert if session.get_bind().dialect.name == "postgresql" else sqlite_insert
+            await session.execute(insert_fn(self.table).values({self.column.key: name}).on_conflict_do_nothing())
+        row = (await session.execute(
+            select(self.table.c.id_).where(self.column == name)
+        )).scalar_one_or_none()
+        if row is not None:
+            pending[(self, name)] = row
+        return row
+
+    async def name_for(self, session: AsyncSession, id_: Optional[int]) -> Optional[str]:
+        if id_ is None or id_ == 0:
+            return None
+        if id_ not in self.names:
+            for (cache, name), pending_id in session.info.get(PENDING_KEY, {}).items():
+                if cache is self and pending_id == id_:
+                    return name
+            await self.load(session)
+        return self.names[id_]
+
+
+categories = ReferenceCache(Category, "name", str.strip, allowed=DEFAULT_CATEGORIES)
+currency_codes = ReferenceCache(CurrencyCode, "code", lambda code: code.strip().upper())
+
+
+@event.listens_for(Category.__table__, "after_create")
+def _seed_categories(target, connection, **kw) -> None:
+    connection.execute(target.insert(), [{"name": name} for name in DEFAULT_CATEGORIES])
+
+
+@event.listens_for(Session, "after_commit")
+def _promote_pending(session: Session) -> None:
+    for (cache, name), id_ in session.info.pop(PENDING_KEY, {}).items():
+        cache._remember(name, id_)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _drop_pending(session: Session, previous_transaction) -> None:
+    session.info.pop(PENDING_KEY, None)
+
+
+async def with_keys(session: AsyncSession, values: Mapping[str, Any]) -> Dict[str, Any]:
+    """``values`` with ``category_name``/``currency`` swapped for their keys."""
+    row = {k: v for k, v in values.items() if k not in ("category_name", "currency")}
+    row["category_id"] = await categories.id_for(session, values["category_name"])
+    currency = values.get("currency")
+    row["currency_id"] = await currency_codes.id_for(session, currency) if currency else None
+    return row
+
+
+async def with_names(session: AsyncSession, row: Mapping[str, Any]) -> Dict[str, Any]:
+    """Reverse of :func:`with_keys` for a transaction row."""
+    values = {k: v for k, v in row.items() if k not in ("category_id", "currency_id")}
+    values["category_name"] = await categories.name_for(session, row["category_id"])
+    values["currency"] = await currency_codes.name_for(session, row["currency_id"])
+    return values
+
+
+async def many_with_keys(session: AsyncSession, rows: Iterable[Mapping[str, Any]]) -> List[Dict[str, Any]]:
+    return [await with_keys(session, row) for row in rows]
+
+
+CATEGORY_NAME = Category.name.label("category_name")
+CURRENCY_CODE = CurrencyCode.code.label("currency")
+
+
+def join_names(stmt: Select) -> Select:
+    """Join the reference tables so ``CATEGORY_NAME``/``CURRENCY_CODE`` can be selected."""
+    return (
+        stmt.join(Category, Category.id_ == Transaction.category_id)
+        .outerjoin(CurrencyCode, CurrencyCode.id_ == Transaction.currency_id)
+    )
+
+
+def category_id_of(name: str):
+    """Uncorrelated scalar subquery: filters compare integers, the name is looked up once."""
+    return select(Category.id_).where(Category.name == categories.normalize(name)).scalar_subquery()
+
+
+def currency_id_of(code: str):
+    return select(CurrencyCode.id_).where(CurrencyCode.code == currency_codes.normalize(code)).scalar_subquery()
+
+
+MIGRATION = (
+    "INSERT INTO categories (name) SELECT DISTINCT trim(category_name) FROM transactions ON CONFLICT DO NOTHING",
+    "INSERT INTO currency_codes (code) SELECT DISTINCT upper(trim(currency)) FROM transactions "
+    "WHERE trim(currency) <> '' ON CONFLICT DO NOTHING",
+    "ALTER TABLE transactions ADD COLUMN category_id smallint, ADD COLUMN currency_id smallint",
+    "UPDATE transactions t SET category_id = c.id_ FROM categories c WHERE c.name = trim(t.category_name)",
+    "UPDATE transactions t SET currency_id = cc.id_ FROM currency_codes cc WHERE cc.code = upper(trim(t.currency))",
+    "ALTER TABLE transactions ALTER COLUMN category_id SET NOT NULL",
+    "ALTER TABLE transactions ADD FOREIGN KEY (category_id) REFERENCES categories (id_)",
+    "ALTER TABLE transactions ADD FOREIGN KEY (currency_id) REFERENCES currency_codes (id_)",
+    "DROP INDEX IF EXISTS ix_transactions_user_category_trgm",
+    "DROP INDEX IF EXISTS ix_transactions_user_category_date",
+    "DROP INDEX IF EXISTS ix_transactions_user_currency_date",
+    "ALTER TABLE transactions DROP COLUMN category_name, DROP COLUMN currency",
+    "DROP TABLE IF EXISTS transaction_monthly_rollups",
+)
+
+
+async def migrate_to_keys(conn: AsyncConnection) -> bool:
+    """Convert the string columns in place; ``False`` if already done.
+
+    Runs in the caller's transaction. The monthly rollup table is dropped
+    and recreated with the new key columns; rebuild it afterwards.
+    """
+    has_names = (await conn.execute(text(
+        "SELECT 1 FROM information_schema.columns "
+        "WHERE table_name = 'transactions' AND column_name = 'category_name'"
+    ))).first()
+    if has_names is None:
+        return False
+
+    await conn.run_sync(Base.metadata.create_all, tables=[Category.__table__, CurrencyCode.__table__])
+    for statement in MIGRATION:
+        await conn.execute(text(statement))
+    for index in Transaction.__table__.indexes:
+        if index.name in ("ix_transactions_user_category_date", "ix_transactions_user_currency_date"):
+            await conn.run_sync(index.create)
+    await conn.run_sync(TransactionMonthlyRollup.__table__.create)
+    return True
+
+
+async def _main() -> None:
+    from src.config import logger
+    from src.database import AsyncSessionLocal, engine
+    from src.transactions.rollup import rebuild_rollups
+
+    parser = argparse.ArgumentParser(description="Move transactions to category/currency reference keys (Postgres)")
+    parser.add_argument("--migrate", action="store_true", help="convert the existing columns")
+    args = parser.parse_args()
+    if not args.migrate:
+        parser.error("nothing to do without --migrate")
+
+    async with engine.begin() as conn:
+        migrated = await migrate_to_keys(conn)
+    if migrated:
+        async with AsyncSessionLocal() as session:
+            rows = await rebuild_rollups(session)
+            await session.commit()
+        logger.info("Transactions moved to reference keys, %s rollup rows rebuilt", rows)
+    else:
+        logger.info("Transactions already use reference keys")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
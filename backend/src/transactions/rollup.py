@@ -0,0 +1,142 @@
+import argparse
+import asyncio
+from collections import defaultdict
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from typing import Any, Dict, Iterable, Mapping, Optional, Tuple
+
+from sqlalchemy import Date, cast, delete, func, insert, literal, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Select
+
+from src.models import Transaction, TransactionKind, TransactionMonthlyRollup
+from src.transactions.analytics import period_bucket
+
+rollups_table = TransactionMonthlyRollup.__table__
+
+RollupKey = Tuple[int, date, int, TransactionKind, int]
+
+KEY_COLUMNS = ("user_id", "month", "category_id", "kind", "currency_id")
+
+
+def month_of(value: datetime) -> date:
+    """First day of the UTC month; naive datetimes are taken to be UTC already."""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return value.date().replace(day=1)
+
+
+def rollup_key(row: Mapping[str, Any]) -> RollupKey:
+    return row["user_id"], month_of(row["date"]), row["category_id"], row["kind"], row["currency_id"] or 0
+
+
+def rollup_deltas(rows: Iterable[Mapping[str, Any]], sign: int = 1) -> Dict[RollupKey, list]:
+    """Fold transaction rows into ``{key: [amount, count]}``; ``sign=-1`` for removals."""
+    deltas: Dict[RollupKey, list] = defaultdict(lambda: [Decimal("0"), 0])
+    for row in rows:
+        entry = deltas[rollup_key(row)]
+        entry[0] += sign * Decimal(row["amount"])
+        entry[1] += sign
+    return deltas
+
+
+def rollup_change(before: Mapping[str, Any], after: Mapping[str, Any]) -> Dict[RollupKey, list]:
+    """Deltas that move one edited transaction from its old rollup bucket to the new one."""
+    deltas = rollup_deltas([before], sign=-1)
+    for key, (total, count) in rollup_deltas([after]).items():
+        deltas[key][0] += total
+        deltas[key][1] += count
+    return deltas
+
+
+def _upsert(dialect_name: str):
+    return pg_insert(rollups_table) if dialect_name == "postgresql" else sqlite_insert(rollups_table)
+
+
+def _add_on_conflict(stmt):
+    return stmt.on_conflict_do_update(
+        index_elements=list(KEY_COLUMNS),
+        set_={
+            "total": rollups_table.c.total + stmt.excluded.total,
+            "count": rollups_table.c.count + stmt.excluded.count,
+        },
+    )
+
+
+def rollup_upsert_from_select(dialect_name: str, rows: Select):
+    """``INSERT ... SELECT ... ON CONFLICT`` adding ``rows`` (columns as in ``KEY_COLUMNS`` + total, count)."""
+    return _add_on_conflict(_upsert(dialect_name).from_select([*KEY_COLUMNS, "total", "count"], rows))
+
+
+def rollup_cte_for(new_rows) -> Any:
+    """Postgres-only data-modifying CTE folding freshly inserted ``new_rows`` into the rollup."""
+    rows = select(
+        new_rows.c.user_id,
+        month_column("postgresql", new_rows.c.date),
+        new_rows.c.category_id,
+        new_rows.c.kind,
+        func.coalesce(new_rows.c.currency_id, 0),
+        new_rows.c.amount,
+        literal(1),
+    )
+    return rollup_upsert_from_select("postgresql", rows).cte("new_rollup")
+
+
+def month_column(dialect_name: str, column) -> Any:
+    bucket = period_bucket(dialect_name, column, "month")
+    # SQLite already yields 'YYYY-MM-01', which is how it stores a Date; CAST there would make it numeric
+    return cast(bucket, Date) if dialect_name == "postgresql" else bucket
+
+
+async def apply_rollup_deltas(session: AsyncSession, deltas: Mapping[RollupKey, list]) -> None:
+    """Add the folded deltas to the rollup table in a single multi-row upsert."""
+    values = [
+        dict(zip(KEY_COLUMNS, key), total=total, count=count)
+        for key, (total, count) in deltas.items()
+        if total or count
+    ]
+    if not values:
+        return
+    dialect_name = session.get_bind().dialect.name
+    await session.execute(_add_on_conflict(_upsert(dialect_name).values(values)))
+
+
+async def rebuild_rollups(session: AsyncSession, user_id: Optional[int] = None) -> int:
+    """Recompute the rollup from ``transactions`` (for one user or everyone) and return the row count."""
+    dialect_name = session.get_bind().dialect.name
+    month = month_column(dialect_name, Transaction.date)
+    currency = func.coalesce(Transaction.currency_id, 0)
+    keys = [Transaction.user_id, month, Transaction.category_id, Transaction.kind, currency]
+    rows = select(*keys, func.sum(Transaction.amount), func.count()).group_by(*keys)
+
+    wipe = delete(rollups_table)
+    if user_id is not None:
+        rows = rows.where(Transaction.user_id == user_id)
+        wipe = wipe.where(rollups_table.c.user_id == user_id)
+
+    await session.execute(wipe)
+    await session.execute(insert(rollups_table).from_select([*KEY_COLUMNS, "total", "count"], rows))
+    count_stmt = select(func.count()).select_from(rollups_table)
+    if user_id is not None:
+        count_stmt = count_stmt.where(rollups_table.c.user_id == user_id)
+    return (await session.execute(count_stmt)).scalar_one()
+
+
+async def _main() -> None:
+    from src.config import logger
+    from src.database import AsyncSessionLocal
+
+    parser = argparse.ArgumentParser(description="Rebuild transaction_monthly_rollups from transactions")
+    parser.add_argument("--user", type=int, default=None, help="only rebuild this user's rows")
+    args = parser.parse_args()
+
+    async with AsyncSessionLocal() as session:
+        rows = await rebuild_rollups(session, args.user)
+        await session.commit()
+    logger.info("Monthly rollups rebuilt: %s rows", rows)
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
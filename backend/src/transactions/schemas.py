@@ -1,18 +1,22 @@
+from datetime import date as date_type
 from datetime import datetime
 from decimal import Decimal
-from typing import Optional, Union
+from typing import Annotated, Any, List, Optional, Union
 
-from pydantic import BaseModel, Field, condecimal
+from pydantic import AfterValidator, BaseModel, ConfigDict, Field, condecimal, field_validator
 
 from src.models import TransactionKind
+from src.transactions.references import categories
 
 Money = condecimal(max_digits=14, decimal_places=2, ge=0)
+CategoryName = Annotated[str, Field(min_length=1, max_length=64), AfterValidator(categories.check)]
+
 
 class TransactionCreate(BaseModel):
     amount: Money
     name: str
     kind: TransactionKind = TransactionKind.EXPENSE
-    category_name: str = Field(min_length=1, max_length=64)
+    category_name: CategoryName
     currency: Optional[str] = Field(default=None, max_length=16)
     date: Optional[datetime] = None
 
@@ -21,22 +25,86 @@ class TransactionUpdate(BaseModel):
     amount: Optional[Money] = None
     name: Optional[str] = None
     kind: Optional[Union[int, TransactionKind]] = None
-    category_name: Optional[str] = Field(default=None, min_length=1, max_length=64)
+    category_name: Optional[CategoryName] = None
     currency: Optional[str] = Field(default=None, max_length=16)
     date: Optional[datetime] = None
 
+    @field_validator("amount", "name", "kind", "date")
+    @classmethod
+    def not_null(cls, value: Any) -> Any:
+        # these may be left out of a patch, but the columns cannot be cleared
+        if value is None:
+            raise ValueError("may be omitted but not null")
+        return value
+
+
+class TransactionBatchIn(BaseModel):
+    # unvalidated, so that one bad item (even a non-object) is reported instead of rejecting the whole batch
+    items: List[Any] = Field(min_length=1, max_length=5000)
+
+
+class TransactionBatchError(BaseModel):
+    index: int
+    detail: Any
+
+
+class TransactionBatchOut(BaseModel):
+    created: int
+    errors: List[TransactionBatchError]
+    new_capital: float
+
+
+class TransactionImportError(BaseModel):
+    row: int
+    detail: str
+
+
+class TransactionImportOut(BaseModel):
+    imported: int
+    duplicates: int
+    error_count: int
+    errors: List[TransactionImportError]
+    new_capital: float
+
+
+class TransactionSummaryItem(BaseModel):
+    period: Optional[date_type] = None
+    category_name: Optional[str] = None
+    kind: Optional[TransactionKind] = None
+    total: Decimal
+    count: int
+
+
+class TransactionSummaryOut(BaseModel):
+    currency: str
+    group_by: List[str]
+    period: Optional[str] = None
+    date_from: Optional[datetime] = None
+    date_to: Optional[datetime] = None
+    items: List[TransactionSummaryItem]
+
+
+class BalancePoint(BaseModel):
+    date: datetime
+    balance: Decimal
+
+
+class BalanceHistoryOut(BaseModel):
+    currency: str
+    date_from: datetime
+    date_to: datetime
+    opening_balance: Decimal
+    points: List[BalancePoint]
+
 
 class TransactionOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     id_: int
     name: str
-    amount: Money
     amount: Decimal
     kind: TransactionKind
     category_name: str
     currency: Optional[str]
     date: datetime
     new_capital: Optional[float] = None
-
-    class Config:
-        from_attributes = True
-        orm_mode = True
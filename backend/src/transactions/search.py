@@ -0,0 +1,49 @@
+from sqlalchemy import case, func, literal, or_, select
+from sqlalchemy.sql.elements import ColumnElement
+
+from src.models import Category, Transaction
+
+LIKE_ESCAPE = "/"
+
+
+def _escape_like(q: str) -> str:
+    return q.replace("/", "//").replace("%", "/%").replace("_", "/_")
+
+
+def _like_pattern(q: str) -> str:
+    return f"%{_escape_like(q)}%"
+
+
+def search_clause(dialect_name: str, q: str) -> ColumnElement:
+    """Rows whose name or category contains ``q`` (case-insensitive), or fuzzily matches it on Postgres.
+
+    On Postgres both ``ILIKE`` and the ``<%`` word-similarity operator are
+    answered by the ``pg_trgm`` GIN index on ``transactions.name``; the
+    matching categories are found once in the small ``categories`` table.
+    """
+    pattern = _like_pattern(q)
+    name_clauses = [Transaction.name.ilike(pattern, escape=LIKE_ESCAPE)]
+    category_clauses = [Category.name.ilike(pattern, escape=LIKE_ESCAPE)]
+    if dialect_name == "postgresql":
+        name_clauses.append(literal(q).op("<%")(Transaction.name))
+        category_clauses.append(literal(q).op("<%")(Category.name))
+    return or_(*name_clauses, Transaction.category_id.in_(select(Category.id_).where(or_(*category_clauses))))
+
+
+def search_rank(dialect_name: str, q: str) -> ColumnElement:
+    """Relevance in ``[0, 1]``, higher is better.
+
+    Postgres uses trigram word similarity; SQLite (tests) only tells a
+    name prefix from a name substring from a category hit.
+    """
+    if dialect_name == "postgresql":
+        category_name = select(Category.name).where(Category.id_ == Transaction.category_id).scalar_subquery()
+        return func.greatest(
+            func.word_similarity(q, Transaction.name),
+            func.word_similarity(q, category_name),
+        )
+    return case(
+        (Transaction.name.ilike(f"{_escape_like(q)}%", escape=LIKE_ESCAPE), 1.0),
+        (Transaction.name.ilike(_like_pattern(q), escape=LIKE_ESCAPE), 0.75),
+        else_=0.5,
+    )
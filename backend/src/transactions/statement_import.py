@@ -0,0 +1,276 @@
+import codecs
+import csv
+import hashlib
+import re
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal, InvalidOperation
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.models import Transaction, TransactionKind, User
+from src.transactions.currency_converter import convert_with_rates, load_historical_rates
+from src.transactions.references import categories, many_with_keys
+from src.transactions.transaction_services import apply_capital_delta, insert_new_transactions
+
+IMPORT_CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 100
+DEFAULT_IMPORT_CATEGORY = "other"
+# the ``Money`` column: 14 digits, 2 of them after the point
+MAX_AMOUNT = Decimal(10) ** 12
+CENT = Decimal("0.01")
+
+_OFX_TAG = re.compile(r"<(/?)([A-Z0-9.]+)>([^<\r\n]*)")
+_OFX_TZ = re.compile(r"\[([+-]?\d+(?:\.\d+)?)(?::[A-Za-z]+)?\]")
+
+
+class ImportRowError(ValueError):
+    pass
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Decode an async byte stream into lines without holding more than one line."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending.rstrip("\r")
+
+
+async def parse_csv(lines: AsyncIterator[str]) -> AsyncIterator[Dict[str, str]]:
+    """Yield one dict per CSV record; quoted fields may span several lines."""
+    header: Optional[List[str]] = None
+    record = ""
+    async for line in lines:
+        record = f"{record}\n{line}" if record else line
+        if record.count('"') % 2:
+            continue  # inside a quoted field, wait for the closing quote
+        if not record.strip():
+            record = ""
+            continue
+        values = next(csv.reader([record]))
+        record = ""
+        if header is None:
+            header = [h.strip().lower() for h in values]
+            continue
+        yield dict(zip(header, values))
+
+
+async def parse_ofx(lines: AsyncIterator[str]) -> AsyncIterator[Dict[str, str]]:
+    """Yield one dict per ``<STMTTRN>`` of an OFX 1.x (SGML) or 2.x (XML) statement."""
+    currency: Optional[str] = None
+    current: Optional[Dict[str, str]] = None
+    async for line in lines:
+        for closing, tag, value in _OFX_TAG.findall(line):
+            value = value.strip()
+            if tag == "CURDEF" and not closing:
+                currency = value
+            elif tag == "STMTTRN":
+                if not closing:
+                    current = {}
+                elif current is not None:
+                    current.setdefault("currency", currency or "")
+                    yield current
+                    current = None
+            elif current is not None and not closing and value:
+                current[tag.lower()] = value
+
+
+def _parse_ofx_date(raw: str) -> datetime:
+    digits = raw.split("[", 1)[0].split(".", 1)[0]
+    fmt = "%Y%m%d%H%M%S" if len(digits) >= 14 else "%Y%m%d"
+    dt = datetime.strptime(digits[:14] if len(digits) >= 14 else digits[:8], fmt)
+    tz = _OFX_TZ.search(raw)
+    offset = timedelta(hours=float(tz.group(1))) if tz else timedelta(0)
+    return dt.replace(tzinfo=timezone(offset))
+
+
+def _parse_kind(raw: str) -> TransactionKind:
+    raw = raw.strip().upper()
+    if raw.isdigit():
+        return TransactionKind(int(raw))
+    return TransactionKind[raw]
+
+
+def _parse_amount(raw: str) -> Decimal:
+    amount = Decimal(raw)
+    if not amount.is_finite() or abs(amount) >= MAX_AMOUNT or amount.quantize(CENT) != amount:
+        raise ValueError(f"amount {raw!r} is not a finite value with at most 12 digits and 2 decimal places")
+    return amount
+
+
+def csv_record_to_values(record: Dict[str, str]) -> Dict[str, Any]:
+    """Columns as written by ``/export?format=csv``; ``kind`` falls back to the amount's sign."""
+    try:
+        amount = _parse_amount(record["amount"].strip())
+        date = datetime.fromisoformat(record["date"].strip())
+        kind_raw = (record.get("kind") or "").strip()
+        kind = _parse_kind(kind_raw) if kind_raw else (
+            TransactionKind.EXPENSE if amount < 0 else TransactionKind.INCOME
+        )
+        category_name = categories.check((record.get("category_name") or DEFAULT_IMPORT_CATEGORY)[:64])
+    except (KeyError, ValueError, InvalidOperation) as e:
+        raise ImportRowError(f"Invalid row: {e}") from e
+    return {
+        "date": date,
+        "amount": abs(amount),
+        "kind": kind,
+        "name": (record.get("name") or "").strip()[:64],
+        "category_name": category_name,
+        "currency": (record.get("currency") or "").strip().upper() or None,
+    }
+
+
+def ofx_record_to_values(record: Dict[str, str]) -> Dict[str, Any]:
+    try:
+        amount = _parse_amount(record["trnamt"].replace(",", "."))
+        date = _parse_ofx_date(record["dtposted"])
+    except (KeyError, ValueError, InvalidOperation) as e:
+        raise ImportRowError(f"Invalid transaction: {e}") from e
+    return {
+        "date": date,
+        "amount": abs(amount),
+        "kind": TransactionKind.EXPENSE if amount < 0 else TransactionKind.INCOME,
+        "name": (record.get("name") or record.get("memo") or "")[:64],
+        "category_name": DEFAULT_IMPORT_CATEGORY,
+        "currency": record.get("currency") or None,
+        "fitid": record.get("fitid"),
+    }
+
+
+def import_hash(values: Dict[str, Any], occurrence: int = 1) -> str:
+    """Content hash that identifies a statement row across repeated imports.
+
+    ``occurrence`` numbers identical rows within one file (two equal coffees
+    on the same day), so each of them is kept; the first one hashes as before.
+    """
+    amount = Decimal(values["amount"]).quantize(CENT)
+    parts = [
+        values["date"].isoformat(), str(amount), values["kind"].name,
+        values["name"], values["category_name"], values["currency"] or "", values.get("fitid") or "",
+    ]
+    if occurrence > 1:
+        parts.append(str(occurrence))
+    return hashlib.sha256("\x1f".join(parts).encode()).hexdigest()
+
+
+async def _existing_hashes(session: AsyncSession, user_id: int, hashes: Iterable[str]) -> set:
+    stmt = select(Transaction.import_hash).where(
+        Transaction.user_id == user_id,
+        Transaction.import_hash.in_(list(hashes)),
+    )
+    return set((await session.execute(stmt)).scalars().all())
+
+
+async def _write_chunk(
+        session: AsyncSession, user: User, chunk: Dict[str, Dict[str, Any]]
+) -> Tuple[int, List[Tuple[int, str]]]:
+    """Insert the chunk's new rows; returns how many were written and the rows that failed.
+
+    The lookup of existing hashes only saves converting rows imported
+    before. The insert itself skips conflicts on ``(user_id, import_hash,
+    date)``, and capital moves by the rows it returned, so two uploads of
+    the same statement racing each other write every row once.
+    """
+    existing = await _existing_hashes(session, user.id_, chunk.keys())
+    history = await load_historical_rates(
+        session, (values["date"] for row_hash, values in chunk.items() if row_hash not in existing),
+    )
+    rows, errors = [], []
+    converted: Dict[str, Decimal] = {}
+    for row_hash, values in chunk.items():
+        if row_hash in existing:
+            continue
+        try:
+            converted[row_hash] = convert_with_rates(
+                history.on(values["date"]), user.default_currency, values["kind"], values["amount"], values["currency"],
+            )
+        except ValueError as e:
+            errors.append((values["row"], str(e)))
+            continue
+        rows.append({
+            "user_id": user.id_,
+            "name": values["name"],
+            "amount": values["amount"],
+            "kind": values["kind"],
+            "category_name": values["category_name"],
+            "currency": values["currency"],
+            "date": values["date"],
+            "import_hash": row_hash,
+        })
+
+    inserted = []
+    if rows:
+        inserted = await insert_new_transactions(
+            session, await many_with_keys(session, rows), ["user_id", "import_hash", "date"],
+        )
+        if inserted:
+            await apply_capital_delta(session, user, sum(converted[row["import_hash"]] for row in inserted))
+    await session.commit()
+    return len(inserted), errors
+
+
+async def import_statement(
+        session: AsyncSession, user: User, chunks: AsyncIterator[bytes], fmt: str
+) -> Dict[str, Any]:
+    """Import a CSV/OFX statement in fixed-size chunks, one commit per chunk.
+
+    Rows already imported before (same content hash) are skipped, so a
+    statement can be uploaded again after a partial failure. Identical rows
+    within the file are all kept, told apart by their occurrence number.
+    """
+    parse, to_values = (parse_csv, csv_record_to_values) if fmt == "csv" else (parse_ofx, ofx_record_to_values)
+
+    imported = duplicates = error_count = 0
+    errors: List[Dict[str, Any]] = []
+
+    def report(row: int, detail: str) -> None:
+        nonlocal error_count
+        error_count += 1
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors.append({"row": row, "detail": detail})
+
+    chunk: Dict[str, Dict[str, Any]] = {}
+    occurrences: Dict[str, int] = {}
+    seen = 0
+
+    async def flush() -> None:
+        nonlocal imported, duplicates
+        written, chunk_errors = await _write_chunk(session, user, chunk)
+        imported += written
+        duplicates += len(chunk) - written - len(chunk_errors)
+        for row, detail in chunk_errors:
+            report(row, detail)
+        chunk.clear()
+
+    async for record in parse(iter_lines(chunks)):
+        seen += 1
+        try:
+            values = to_values(record)
+            row_hash = import_hash(values)
+        except (ImportRowError, ValueError, InvalidOperation) as e:
+            report(seen, str(e))
+            continue
+        values["row"] = seen
+        occurrence = occurrences[row_hash] = occurrences.get(row_hash, 0) + 1
+        if occurrence > 1:
+            row_hash = import_hash(values, occurrence)
+        chunk[row_hash] = values
+        if len(chunk) >= IMPORT_CHUNK_SIZE:
+            await flush()
+    if chunk:
+        await flush()
+
+    return {
+        "imported": imported,
+        "duplicates": duplicates,
+        "error_count": error_count,
+        "errors": errors,
+        "new_capital": float(user.capital),
+    }
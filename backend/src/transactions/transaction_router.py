@@ -1,42 +1,66 @@
-from typing import List
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import List, Literal, Optional
 
-from fastapi import APIRouter, Depends, Query, status
+from fastapi import APIRouter, Depends, Query, Request, Response, status
+from fastapi.encoders import jsonable_encoder
 from fastapi.exceptions import HTTPException
-from sqlalchemy import select
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy import select, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database import get_db
 from src.dependencies import get_current_user
 from src.models import Transaction, TransactionKind, User
-from src.transactions.currency_converter import convert_to_user_currency
-from src.transactions.schemas import TransactionCreate, TransactionOut, TransactionUpdate
-
-ALLOWED_EXPENSES_CATEGORIES = [
-    "shopping",
-    "food",
-    "phone",
-    "entertainment",
-    "education",
-    "beauty",
-    "sports",
-    "social",
-    "transportation",
-    "clothing",
-    "car",
-    "alcohol",
-    "cigarettes",
-    "electronics",
-    "travel",
-    "health",
-    "pets",
-    "repairs",
-    "housing",
-    "home",
-    "gifts",
-    "donations",
-    "lottery",
-    "kids"
-]
+from src.transactions.analytics import balance_history, spending_summary
+from src.transactions.currency_converter import convert_to_user_currency, convert_with_rates, load_historical_rates
+from src.transactions.export import MEDIA_TYPES, export_query, stream_export
+from src.transactions.filters import TransactionFilters, transaction_filters
+from src.transactions.pagination import decode_cursor, encode_cursor
+from src.transactions.references import (
+    CATEGORY_NAME,
+    CURRENCY_CODE,
+    categories,
+    currency_codes,
+    join_names,
+    many_with_keys,
+    with_keys,
+    with_names,
+)
+from src.transactions.rollup import apply_rollup_deltas, rollup_change
+from src.transactions.schemas import (
+    BalanceHistoryOut,
+    TransactionBatchError,
+    TransactionBatchIn,
+    TransactionBatchOut,
+    TransactionCreate,
+    TransactionImportOut,
+    TransactionOut,
+    TransactionSummaryOut,
+    TransactionUpdate,
+)
+from src.transactions.search import search_clause, search_rank
+from src.transactions.statement_import import import_statement
+from src.transactions.transaction_services import (
+    apply_capital_delta,
+    bulk_insert_transactions,
+    delete_transaction_row,
+    insert_transaction,
+)
+from src.utils.conditional import bump_data_version, not_modified
+from src.utils.fast_json import rows_response
+from src.utils.idempotency import IdempotentRequest, idempotency_key
+
+ROLLUP_FIELDS = ("user_id", "date", "category_id", "kind", "currency_id", "amount")
+CAPITAL_FIELDS = ("amount", "kind", "currency_id", "date")
+# TransactionOut, in order; the list endpoint selects these (through join_names)
+# and serializes the rows directly
+OUT_COLUMNS = (
+    Transaction.id_, Transaction.name, Transaction.amount, Transaction.kind,
+    CATEGORY_NAME, CURRENCY_CODE, Transaction.date,
+)
+OUT_KEYS = tuple(column.key for column in OUT_COLUMNS)
 
 transaction_router = APIRouter()
 
@@ -54,12 +78,29 @@ async def _get_user_tx_or_404(
     return tx
 
 
+async def _tx_out(session: AsyncSession, tx: Transaction, new_capital=None) -> dict:
+    return {
+        "id_": tx.id_,
+        "name": tx.name,
+        "amount": tx.amount,
+        "kind": tx.kind,
+        "category_name": await categories.name_for(session, tx.category_id),
+        "currency": await currency_codes.name_for(session, tx.currency_id),
+        "date": tx.date,
+        "new_capital": new_capital,
+    }
+
+
 @transaction_router.post("", response_model=TransactionOut, status_code=status.HTTP_201_CREATED)
 async def create_transaction(
         payload: TransactionCreate,
         session: AsyncSession = Depends(get_db),
         current_user: User = Depends(get_current_user),
+        idempotency: Optional[IdempotentRequest] = Depends(idempotency_key()),
 ):
+    if idempotency is not None and (replay := await idempotency.begin()) is not None:
+        return replay
+
     values = {
         "user_id": current_user.id_,
         "name": payload.name,
@@ -67,29 +108,117 @@ async def create_transaction(
         "kind": payload.kind,
         "category_name": payload.category_name,
         "currency": payload.currency,
+        # stamped here rather than by the server default, so every row stores the same
+        # datetime format (SQLite's CURRENT_TIMESTAMP has no fraction and breaks cursor order)
+        "date": payload.date or datetime.now(timezone.utc),
     }
-    if payload.date is not None:
-        values["date"] = payload.date
 
     default_currency = current_user.default_currency
-    val = await convert_to_user_currency(session, default_currency, payload.kind, payload.amount, payload.currency)
-    current_user.capital = round(float(current_user.capital) + float(val), 2)
+    try:
+        val = await convert_to_user_currency(
+            session, default_currency, payload.kind, payload.amount, payload.currency, values["date"],
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
 
-    tx = Transaction(**values)
-    session.add(tx)
-    await session.commit()
-    await session.refresh(tx)
-    await session.refresh(current_user)
-    return {
-        "id_": tx.id_,
-        "name": tx.name,
-        "amount": tx.amount,
-        "kind": tx.kind,
-        "category_name": tx.category_name,
-        "currency": tx.currency,
-        "date": tx.date,
-        "new_capital": current_user.capital
+    tx, new_capital = await insert_transaction(session, current_user, await with_keys(session, values), val)
+    tx = await with_names(session, tx)
+    result = {
+        "id_": tx["id_"],
+        "name": tx["name"],
+        "amount": tx["amount"],
+        "kind": tx["kind"],
+        "category_name": tx["category_name"],
+        "currency": tx["currency"],
+        "date": tx["date"],
+        "new_capital": new_capital
     }
+    if idempotency is not None:
+        result = await idempotency.save(result, TransactionOut, status.HTTP_201_CREATED)
+    await session.commit()
+    return result
+
+
+@transaction_router.post("/batch", response_model=TransactionBatchOut, status_code=status.HTTP_200_OK)
+async def create_transactions_batch(
+        payload: TransactionBatchIn,
+        session: AsyncSession = Depends(get_db),
+        current_user: User = Depends(get_current_user),
+        idempotency: Optional[IdempotentRequest] = Depends(idempotency_key()),
+):
+    if idempotency is not None and (replay := await idempotency.begin()) is not None:
+        return replay
+
+    default_currency = current_user.default_currency
+
+    valid, errors = [], []
+    for index, item in enumerate(payload.items):
+        try:
+            valid.append((index, TransactionCreate.model_validate(item)))
+        except ValidationError as e:
+            errors.append(TransactionBatchError(
+                index=index, detail=jsonable_encoder(e.errors(include_url=False, include_context=False)),
+            ))
+
+    history = await load_historical_rates(session, (tx.date for _, tx in valid))
+    rows = []
+    delta = Decimal("0")
+    for index, tx in valid:
+        try:
+            delta += convert_with_rates(history.on(tx.date), default_currency, tx.kind, tx.amount, tx.currency)
+        except ValueError as e:
+            errors.append(TransactionBatchError(index=index, detail=str(e)))
+            continue
+        rows.append({
+            "user_id": current_user.id_,
+            "name": tx.name,
+            "amount": tx.amount,
+            "kind": tx.kind,
+            "category_name": tx.category_name,
+            "currency": tx.currency,
+            "date": tx.date,
+        })
+
+    errors.sort(key=lambda error: error.index)
+    new_capital = float(current_user.capital)
+    if rows:
+        new_capital = await apply_capital_delta(session, current_user, delta)
+        await bulk_insert_transactions(session, await many_with_keys(session, rows))
+    result = TransactionBatchOut(created=len(rows), errors=errors, new_capital=new_capital)
+    if idempotency is not None:
+        result = await idempotency.save(result, TransactionBatchOut)
+    await session.commit()
+    return result
+
+
+@transaction_router.post("/import", response_model=TransactionImportOut, status_code=status.HTTP_200_OK)
+async def import_transactions(
+        request: Request,
+        fmt: Literal["csv", "ofx"] = Query("csv", alias="format"),
+        session: AsyncSession = Depends(get_db),
+        current_user: User = Depends(get_current_user),
+        idempotency: Optional[IdempotentRequest] = Depends(idempotency_key(hash_body=False)),
+):
+    """Import a bank statement sent as the raw request body (CSV or OFX).
+
+    Chunks commit as they go, so a keyed import answers 409 to repeats
+    until it has finished; re-sent rows are skipped by their import hash anyway.
+    """
+    if idempotency is None:
+        return await import_statement(session, current_user, request.stream(), fmt)
+    if (replay := await idempotency.begin()) is not None:
+        return replay
+    try:
+        result = await import_statement(session, current_user, request.stream(), fmt)
+    except Exception:
+        # earlier chunks (and the claim with them) may already be committed
+        await session.rollback()
+        await idempotency.release()
+        await session.commit()
+        raise
+    result = await idempotency.save(result, TransactionImportOut)
+    await session.commit()
+    return result
 
 
 @transaction_router.patch("/{tx_id}", response_model=TransactionOut, status_code=status.HTTP_200_OK)
@@ -98,7 +227,11 @@ async def update_transaction(
         payload: TransactionUpdate,
         session: AsyncSession = Depends(get_db),
         current_user: User = Depends(get_current_user),
+        idempotency: Optional[IdempotentRequest] = Depends(idempotency_key()),
 ):
+    if idempotency is not None and (replay := await idempotency.begin()) is not None:
+        return replay
+
     tx = await session.get(Transaction, tx_id)
     if not tx:
         raise HTTPException(status_code=404, detail="Transaction not found")
@@ -107,7 +240,7 @@ async def update_transaction(
 
     data = payload.model_dump(exclude_unset=True)
     if not data:
-        return tx
+        return await _tx_out(session, tx)
 
     if "kind" in data and data["kind"] is not None:
         try:
@@ -115,12 +248,99 @@ async def update_transaction(
         except Exception:
             raise HTTPException(status_code=422, detail="Invalid 'kind' value")
 
+    if "category_name" in data:
+        category_name = data.pop("category_name")
+        if category_name is not None:
+            data["category_id"] = await categories.id_for(session, category_name)
+    if "currency" in data:
+        currency = data.pop("currency")
+        data["currency_id"] = await currency_codes.id_for(session, currency) if currency else None
+
+    before = {col: getattr(tx, col) for col in ROLLUP_FIELDS}
     for field, value in data.items():
         setattr(tx, field, value)
+    after = {col: getattr(tx, col) for col in ROLLUP_FIELDS}
 
-    await session.commit()
+    new_capital = None
+    if any(field in data for field in CAPITAL_FIELDS):
+        # only the difference between the old and the new converted value is applied
+        history = await load_historical_rates(session, (before["date"], after["date"]))
+        default_currency = current_user.default_currency
+        old_currency = await currency_codes.name_for(session, before["currency_id"])
+        new_currency = await currency_codes.name_for(session, after["currency_id"])
+        try:
+            old_val = convert_with_rates(
+                history.on(before["date"]), default_currency, before["kind"], before["amount"], old_currency,
+            )
+            new_val = convert_with_rates(
+                history.on(after["date"]), default_currency, after["kind"], after["amount"], new_currency,
+            )
+        except ValueError as e:
+            await session.rollback()
+            raise HTTPException(status_code=422, detail=str(e))
+        if new_val != old_val:
+            new_capital = await apply_capital_delta(session, current_user, new_val - old_val)
+    if new_capital is None:
+        await bump_data_version(session, current_user)
+    await apply_rollup_deltas(session, rollup_change(before, after))
+
+    await session.flush()
     await session.refresh(tx)
-    return tx
+    result = await _tx_out(session, tx, new_capital if new_capital is not None else current_user.capital)
+    if idempotency is not None:
+        result = await idempotency.save(result, TransactionOut)
+    await session.commit()
+    return result
+
+
+@transaction_router.get("/export", status_code=status.HTTP_200_OK)
+async def export_my_transactions(
+        fmt: Literal["csv", "ndjson"] = Query("csv", alias="format"),
+        filters: TransactionFilters = Depends(transaction_filters),
+        session: AsyncSession = Depends(get_db),
+        current_user: User = Depends(get_current_user),
+):
+    return StreamingResponse(
+        stream_export(session.bind, filters.apply(export_query(current_user.id_)), fmt),
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="transactions.{fmt}"'},
+    )
+
+
+@transaction_router.get("/summary", response_model=TransactionSummaryOut, status_code=status.HTTP_200_OK)
+async def get_transactions_summary(
+        group_by: List[Literal["period", "category", "kind"]] = Query(["category", "kind"]),
+        period: Literal["day", "week", "month"] = Query("month", description="Bucket size when grouping by period"),
+        date_from: Optional[datetime] = Query(None, description="Inclusive lower bound"),
+        date_to: Optional[datetime] = Query(None, description="Exclusive upper bound"),
+        session: AsyncSession = Depends(get_db),
+        current_user: User = Depends(get_current_user),
+):
+    try:
+        items = await spending_summary(session, current_user, group_by, period, date_from, date_to)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return {
+        "currency": current_user.default_currency,
+        "group_by": group_by,
+        "period": period if "period" in group_by else None,
+        "date_from": date_from,
+        "date_to": date_to,
+        "items": items,
+    }
+
+
+@transaction_router.get("/balance-history", response_model=BalanceHistoryOut, status_code=status.HTTP_200_OK)
+async def get_balance_history(
+        date_from: Optional[datetime] = Query(None, description="Inclusive lower bound, defaults to the first transaction"),
+        date_to: Optional[datetime] = Query(None, description="Exclusive upper bound, defaults to now"),
+        max_points: int = Query(500, ge=2, le=5000),
+        session: AsyncSession = Depends(get_db),
+        current_user: User = Depends(get_current_user),
+):
+    if date_from and date_to and date_from >= date_to:
+        raise HTTPException(status_code=400, detail="date_from must be before date_to")
+    return await balance_history(session, current_user, date_from, date_to, max_points)
 
 
 @transaction_router.get("/{tx_id}", response_model=TransactionOut, status_code=status.HTTP_200_OK)
@@ -129,18 +349,8 @@ async def get_transaction_by_id(
         session: AsyncSession = Depends(get_db),
         current_user: User = Depends(get_current_user),
 ):
-    stmt = (
-        select(Transaction)
-        .where(
-            Transaction.id_ == tx_id,
-            Transaction.user_id == current_user.id_,
-        )
-    )
-    tx = (await session.execute(stmt)).scalar_one_or_none()
-    if not tx:
-        raise HTTPException(status_code=404, detail="Transaction not found")
-
-    return tx
+    tx = await _get_user_tx_or_404(session, tx_id, current_user.id_)
+    return await _tx_out(session, tx)
 
 
 @transaction_router.delete("/{tx_id}", status_code=status.HTTP_200_OK)
@@ -148,49 +358,81 @@ async def delete_transaction(
         tx_id: int,
         session: AsyncSession = Depends(get_db),
         current_user: User = Depends(get_current_user),
+        idempotency: Optional[IdempotentRequest] = Depends(idempotency_key()),
 ):
-    stmt = select(Transaction).where(
-        Transaction.id_ == tx_id,
-        Transaction.user_id == current_user.id_,
-    )
-    tx = (await session.execute(stmt)).scalar_one_or_none()
+    if idempotency is not None and (replay := await idempotency.begin()) is not None:
+        return replay
+
+    tx = await delete_transaction_row(session, tx_id, current_user.id_)
     if not tx:
         raise HTTPException(status_code=404, detail="Transaction not found")
+    tx = await with_names(session, tx)
 
     default_currency = current_user.default_currency
-    val = await convert_to_user_currency(session, default_currency, tx.kind, tx.amount, tx.currency)
-    current_user.capital = round(float(current_user.capital) - float(val), 2)
+    try:
+        val = await convert_to_user_currency(
+            session, default_currency, tx["kind"], tx["amount"], tx["currency"], tx["date"],
+        )
+    except ValueError as e:
+        await session.rollback()
+        raise HTTPException(status_code=422, detail=str(e))
 
-    await session.delete(tx)
-    await session.commit()
-    await session.refresh(current_user)
-    return {
+    new_capital = await apply_capital_delta(session, current_user, -val)
+    result = {
         "message": "Transaction has been deleted",
-        "id_": tx.id_,
-        "amount": tx.amount,
-        "name": tx.name,
-        "kind": tx.kind,
-        "category_name": tx.category_name,
-        "currency": tx.currency,
-        "date": tx.date,
-        "new_capital": current_user.capital
+        "id_": tx["id_"],
+        "amount": tx["amount"],
+        "name": tx["name"],
+        "kind": tx["kind"],
+        "category_name": tx["category_name"],
+        "currency": tx["currency"],
+        "date": tx["date"],
+        "new_capital": new_capital
     }
+    if idempotency is not None:
+        result = await idempotency.save(result)
+    await session.commit()
+    return result
 
 
 @transaction_router.get("", response_model=List[TransactionOut], status_code=status.HTTP_200_OK)
 async def list_my_transactions(
+        request: Request,
+        response: Response,
         limit: int = Query(50, ge=1, le=1000),
         offset: int = Query(0, ge=0),
+        cursor: Optional[str] = Query(None, description="Opaque token from the X-Next-Cursor header"),
+        q: Optional[str] = Query(None, min_length=1, max_length=64, description="Search in name and category"),
+        filters: TransactionFilters = Depends(transaction_filters),
         session: AsyncSession = Depends(get_db),
         current_user: User = Depends(get_current_user),
 ):
-    stmt = (
-        select(Transaction)
-        .where(Transaction.user_id == current_user.id_)
-        .order_by(Transaction.date.desc(), Transaction.id_.desc())
-        .offset(offset)
-        .limit(limit)
-    )
-    result = await session.execute(stmt)
-    transactions = result.scalars().all()
-    return transactions
+    if (cached := not_modified(request, response, current_user)) is not None:
+        return cached
+
+    sort_keys = [Transaction.date, Transaction.id_]
+    sort_types = [datetime, int]
+    stmt = join_names(select(*OUT_COLUMNS)).where(Transaction.user_id == current_user.id_)
+    if q is not None:
+        dialect_name = session.get_bind().dialect.name
+        stmt = stmt.where(search_clause(dialect_name, q))
+        sort_keys.insert(0, search_rank(dialect_name, q))
+        sort_types.insert(0, float)
+    stmt = filters.apply(stmt).add_columns(*sort_keys)
+    stmt = stmt.order_by(*(key.desc() for key in sort_keys)).limit(limit)
+
+    if cursor is not None:
+        if offset:
+            raise HTTPException(status_code=400, detail="Use either 'cursor' or 'offset', not both")
+        try:
+            last_key = decode_cursor(cursor, sort_types)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        stmt = stmt.where(tuple_(*sort_keys) < tuple_(*last_key))
+    else:
+        stmt = stmt.offset(offset)
+
+    rows = (await session.execute(stmt)).all()
+    if len(rows) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor(*rows[-1][len(OUT_COLUMNS):])
+    return rows_response(rows, OUT_KEYS, response, defaults={"new_capital": None})
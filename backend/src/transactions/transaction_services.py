@@ -0,0 +1,165 @@
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+from sqlalchemy import Numeric, bindparam, cast, delete, func, insert, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import RowMapping
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
+
+from src.models import Transaction, User
+from src.transactions.rollup import apply_rollup_deltas, rollup_cte_for, rollup_deltas
+from src.utils.conditional import data_version_bump
+
+transactions_table = Transaction.__table__
+users_table = User.__table__
+
+
+BULK_COLUMNS = ("user_id", "amount", "name", "kind", "category_id", "currency_id", "date", "import_hash")
+# rows per INSERT, well below the bind-parameter limits of both dialects
+INSERT_CHUNK_SIZE = 1000
+
+
+def _is_postgres(session: AsyncSession) -> bool:
+    return session.get_bind().dialect.name == "postgresql"
+
+
+def _is_asyncpg(session: AsyncSession) -> bool:
+    return session.get_bind().dialect.driver == "asyncpg"
+
+
+def _capital_increment(user_id: int, delta: Union[float, Decimal]):
+    """``UPDATE users SET capital = round(capital + :delta, 2)`` — atomic, no read-modify-write.
+
+    Also bumps ``data_version``, as every caller is writing transactions.
+    """
+    return (
+        update(users_table)
+        .where(users_table.c.id_ == user_id)
+        .values(capital=func.round(cast(users_table.c.capital + float(delta), Numeric), 2), **data_version_bump())
+        .returning(users_table.c.capital, users_table.c.data_version)
+    )
+
+
+def _sync_capital(user: User, capital: float, data_version: int) -> None:
+    # keep the already loaded ORM object in line with the row without another SELECT
+    set_committed_value(user, "capital", float(capital))
+    set_committed_value(user, "data_version", data_version)
+
+
+async def apply_capital_delta(session: AsyncSession, user: User, delta: Union[float, Decimal]) -> float:
+    """Add ``delta`` to the user's capital in the DB and return the new value."""
+    capital, data_version = (await session.execute(_capital_increment(user.id_, delta))).one()
+    _sync_capital(user, capital, data_version)
+    return float(capital)
+
+
+async def apply_capital_deltas(session: AsyncSession, deltas: Dict[int, Union[float, Decimal]]) -> None:
+    """Grouped form of :func:`apply_capital_delta`: one executemany for ``{user_id: delta}``."""
+    params = [{"uid": user_id, "delta": float(delta)} for user_id, delta in deltas.items()]
+    if not params:
+        return
+    await session.execute(
+        update(users_table)
+        .where(users_table.c.id_ == bindparam("uid"))
+        .values(capital=func.round(cast(users_table.c.capital + bindparam("delta"), Numeric), 2), **data_version_bump()),
+        params,
+    )
+
+
+async def insert_transaction(
+        session: AsyncSession, user: User, values: Dict[str, Any], delta: Decimal
+) -> Tuple[RowMapping, float]:
+    """Insert a transaction, move the user's capital by ``delta`` and update the monthly rollup.
+
+    On Postgres all writes go out as one statement (data-modifying CTEs);
+    other dialects run the statements back to back in the same
+    transaction. Nothing is committed here.
+    """
+    ins = insert(transactions_table).values(**values).returning(*transactions_table.c)
+    upd = _capital_increment(user.id_, delta)
+
+    if _is_postgres(session):
+        new_tx = ins.cte("new_tx")
+        new_capital = upd.cte("new_capital")
+        stmt = select(new_tx, new_capital.c.capital, new_capital.c.data_version).add_cte(rollup_cte_for(new_tx))
+        row = (await session.execute(stmt)).mappings().one()
+        capital, data_version = row["capital"], row["data_version"]
+    else:
+        row = (await session.execute(ins)).mappings().one()
+        capital, data_version = (await session.execute(upd)).one()
+        await apply_rollup_deltas(session, rollup_deltas([row]))
+
+    _sync_capital(user, capital, data_version)
+    return row, float(capital)
+
+
+async def delete_transaction_row(session: AsyncSession, tx_id: int, user_id: int) -> Optional[RowMapping]:
+    """``DELETE ... RETURNING`` the user's transaction, ``None`` if it does not exist.
+
+    Under concurrent deletes of the same row only one caller gets the row
+    back, so the capital and the rollup are never reverted twice.
+    """
+    stmt = (
+        delete(transactions_table)
+        .where(transactions_table.c.id_ == tx_id, transactions_table.c.user_id == user_id)
+        .returning(*transactions_table.c)
+    )
+    row = (await session.execute(stmt)).mappings().one_or_none()
+    if row is not None:
+        await apply_rollup_deltas(session, rollup_deltas([row], sign=-1))
+    return row
+
+
+async def bulk_insert_transactions(session: AsyncSession, rows: List[Dict[str, Any]]) -> int:
+    """Write many transaction rows at once: ``COPY`` on asyncpg, executemany elsewhere.
+
+    Rows without a ``date`` are stamped with the current time, since ``COPY``
+    does not fall back to the server default. Callers must already have
+    written something in the current transaction (e.g. the capital update),
+    so that the ``COPY`` runs inside it instead of autocommitting.
+    """
+    if not rows:
+        return 0
+    now = datetime.now(timezone.utc)
+    rows = [{**row, "date": row.get("date") or now, "import_hash": row.get("import_hash")} for row in rows]
+
+    if _is_asyncpg(session):
+        conn = await session.connection()
+        raw = await conn.get_raw_connection()
+        records = [
+            tuple(row[col].name if col == "kind" else row.get(col) for col in BULK_COLUMNS)
+            for row in rows
+        ]
+        await raw.driver_connection.copy_records_to_table(
+            transactions_table.name, records=records, columns=list(BULK_COLUMNS),
+        )
+    else:
+        await session.execute(insert(transactions_table), rows)
+    await apply_rollup_deltas(session, rollup_deltas(rows))
+    return len(rows)
+
+
+async def insert_new_transactions(
+        session: AsyncSession, rows: List[Dict[str, Any]], conflict_columns: Sequence[str]
+) -> List[RowMapping]:
+    """``INSERT ... ON CONFLICT (conflict_columns) DO NOTHING RETURNING *`` and the rollup of what it wrote.
+
+    Only rows this call actually wrote come back, so a row another writer
+    stored first is neither doubled nor counted twice. Callers move the
+    capital by the returned rows only. Nothing is committed here.
+    """
+    insert_fn = pg_insert if _is_postgres(session) else sqlite_insert
+    inserted: List[RowMapping] = []
+    for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+        stmt = (
+            insert_fn(transactions_table)
+            .values(rows[start:start + INSERT_CHUNK_SIZE])
+            .on_conflict_do_nothing(index_elements=list(conflict_columns))
+            .returning(*transactions_table.c)
+        )
+        inserted.extend((await session.execute(stmt)).mappings().all())
+    await apply_rollup_deltas(session, rollup_deltas(inserted))
+    return inserted
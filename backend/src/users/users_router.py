@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, Response, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -6,12 +6,15 @@ from src.database import get_db
 from src.dependencies import get_current_user
 from src.models import Currencies, User
 from src.users.schemas import UserOut, UserUpdate
+from src.utils.conditional import not_modified
 
 users_router = APIRouter()
 
 
 @users_router.get("/me", response_model=UserOut, status_code=status.HTTP_200_OK)
-async def get_me(current_user: User = Depends(get_current_user)):
+async def get_me(request: Request, response: Response, current_user: User = Depends(get_current_user)):
+    if (cached := not_modified(request, response, current_user)) is not None:
+        return cached
     return current_user
 
 
@@ -66,6 +69,7 @@ async def update_me(
 
     for field, value in data.items():
         setattr(current_user, field, value)
+    current_user.data_version = User.data_version + 1
 
     await session.commit()
     await session.refresh(current_user)
@@ -0,0 +1,45 @@
+from typing import Optional
+
+from fastapi import Request, Response, status
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
+from src.models import User
+
+users_table = User.__table__
+
+
+def user_etag(user: User) -> str:
+    # the same version means the same data for any URL, so the URL is not part of the tag
+    return f'W/"{user.id_}-{user.data_version}"'
+
+
+def not_modified(request: Request, response: Response, user: User) -> Optional[Response]:
+    """Tag ``response`` with the user's ETag; a 304 if ``If-None-Match`` already has it.
+
+    Call it before querying anything, so a poll that hits costs nothing
+    beyond loading the current user.
+    """
+    etag = user_etag(user)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache", "Vary": "Authorization"}
+    response.headers.update(headers)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or etag in (t.strip() for t in if_none_match.split(","))):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return None
+
+
+def data_version_bump() -> dict:
+    """``values()`` fragment for UPDATEs of ``users`` that change user-owned data."""
+    return {"data_version": users_table.c.data_version + 1}
+
+
+async def bump_data_version(session: AsyncSession, user: User) -> None:
+    """Invalidate the user's ETags; runs in the caller's transaction."""
+    stmt = (
+        update(users_table)
+        .where(users_table.c.id_ == user.id_)
+        .values(**data_version_bump())
+        .returning(users_table.c.data_version)
+    )
+    set_committed_value(user, "data_version", (await session.execute(stmt)).scalar_one())
@@ -0,0 +1,38 @@
+from decimal import Decimal
+from typing import Any, Iterable, Mapping, Optional, Sequence
+
+import orjson
+from fastapi import Response
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    """orjson with the same output pydantic gives: Decimal as string, UTC as ``Z``, enums by value."""
+    return orjson.dumps(content, default=_default, option=orjson.OPT_UTC_Z)
+
+
+def rows_response(
+        rows: Iterable[Sequence[Any]],
+        keys: Sequence[str],
+        response: Optional[Response] = None,
+        defaults: Optional[Mapping[str, Any]] = None,
+) -> Response:
+    """JSON array of objects built straight from result rows, skipping ``response_model``.
+
+    ``keys`` name the leading columns of each row; anything after them
+    (e.g. sort keys) is dropped. Headers already set on the injected
+    ``response`` are carried over, as FastAPI does not merge them into a
+    returned ``Response``.
+    """
+    # zip() stops at the last key
+    if defaults:
+        items = [{**dict(zip(keys, row)), **defaults} for row in rows]
+    else:
+        items = [dict(zip(keys, row)) for row in rows]
+    headers = dict(response.headers) if response is not None else None
+    return Response(dumps(items), media_type="application/json", headers=headers)
@@ -0,0 +1,152 @@
+import hashlib
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Callable, Optional, Type
+
+from fastapi import Depends, FastAPI, HTTPException, Request, Response, status
+from fastapi.encoders import jsonable_encoder
+from fastapi_utilities import repeat_every
+from pydantic import BaseModel
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.config import IDEMPOTENCY_KEY_TTL_HOURS, logger
+from src.database import AsyncSessionLocal, get_db
+from src.dependencies import get_current_user
+from src.models import IdempotencyKey, User
+from src.utils.fast_json import dumps
+
+keys_table = IdempotencyKey.__table__
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotency-Replayed"
+MAX_KEY_LENGTH = 255
+
+
+class IdempotentRequest:
+    """One keyed request: :meth:`begin` before the write path, :meth:`save` before the commit."""
+
+    def __init__(self, session: AsyncSession, user_id: int, key: str, fingerprint: str):
+        self.session = session
+        self.user_id = user_id
+        self.key = key
+        self.fingerprint = fingerprint
+
+    async def _stored(self, now: datetime) -> Optional[Response]:
+        row = (await self.session.execute(
+            select(keys_table.c.fingerprint, keys_table.c.status_code, keys_table.c.response_body)
+            .where(
+                keys_table.c.user_id == self.user_id,
+                keys_table.c.key == self.key,
+                keys_table.c.expires_at > now,
+            )
+        )).one_or_none()
+        if row is None:
+            return None
+        if row.fingerprint != self.fingerprint:
+            raise HTTPException(status_code=422, detail=f"{IDEMPOTENCY_HEADER} was already used for another request")
+        if row.status_code is None:
+            raise HTTPException(status_code=409, detail=f"A request with this {IDEMPOTENCY_HEADER} is in progress")
+        return Response(
+            row.response_body, status_code=row.status_code, media_type="application/json",
+            headers={REPLAYED_HEADER: "true"},
+        )
+
+    async def begin(self) -> Optional[Response]:
+        """The stored response for a repeat, otherwise claim the key and return ``None``.
+
+        The claim is an upsert that only replaces an expired row. On Postgres
+        a concurrent request with the same key waits on the unique index
+        until the first one commits, then finds its stored response.
+        """
+        now = datetime.now(timezone.utc)
+        replay = await self._stored(now)
+        if replay is not None:
+            return replay
+
+        insert_fn = pg_insert if self.session.get_bind().dialect.name == "postgresql" else sqlite_insert
+        values = {
+            "fingerprint": self.fingerprint,
+            "status_code": None,
+            "response_body": None,
+            "expires_at": now + timedelta(hours=IDEMPOTENCY_KEY_TTL_HOURS),
+        }
+        stmt = insert_fn(keys_table).values(user_id=self.user_id, key=self.key, **values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["user_id", "key"], set_=values, where=keys_table.c.expires_at <= now,
+        ).returning(keys_table.c.key)
+        if (await self.session.execute(stmt)).first() is not None:
+            return None
+        return await self._stored(now)
+
+    async def release(self) -> None:
+        """Drop the claim after a failure, so the client can retry with the same key."""
+        await self.session.execute(
+            delete(keys_table).where(keys_table.c.user_id == self.user_id, keys_table.c.key == self.key)
+        )
+
+    async def save(
+            self, content: Any, model: Optional[Type[BaseModel]] = None, status_code: int = status.HTTP_200_OK
+    ) -> Response:
+        """Store the response in the claimed row and return it; the caller commits.
+
+        ``content`` goes through ``model`` the way ``response_model`` would,
+        so the first answer and every replay carry the same bytes.
+        """
+        data = model.model_validate(content).model_dump(mode="json") if model else jsonable_encoder(content)
+        body = dumps(data)
+        await self.session.execute(
+            update(keys_table)
+            .where(keys_table.c.user_id == self.user_id, keys_table.c.key == self.key)
+            .values(status_code=status_code, response_body=body)
+        )
+        return Response(body, status_code=status_code, media_type="application/json")
+
+
+def idempotency_key(hash_body: bool = True) -> Callable:
+    """Dependency giving an :class:`IdempotentRequest`, or ``None`` without the header.
+
+    Pass ``hash_body=False`` for streamed uploads; their fingerprint then
+    only covers the method, path and query string. If the endpoint raises,
+    the uncommitted claim is rolled back, so the key stays free for a retry.
+    """
+    async def dependency(
+            request: Request,
+            session: AsyncSession = Depends(get_db),
+            current_user: User = Depends(get_current_user),
+    ) -> AsyncIterator[Optional[IdempotentRequest]]:
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if key is None:
+            yield None
+            return
+        if not key or len(key) > MAX_KEY_LENGTH:
+            raise HTTPException(status_code=400, detail=f"Invalid {IDEMPOTENCY_HEADER}")
+
+        digest = hashlib.sha256(f"{request.method} {request.url.path}?{request.url.query}\n".encode())
+        if hash_body:
+            digest.update(await request.body())
+        try:
+            yield IdempotentRequest(session, current_user.id_, key, digest.hexdigest())
+        except Exception:
+            await session.rollback()
+            raise
+
+    return dependency
+
+
+async def purge_expired_keys(session: AsyncSession) -> int:
+    result = await session.execute(delete(keys_table).where(keys_table.c.expires_at <= datetime.now(timezone.utc)))
+    return result.rowcount
+
+
+def register_idempotency_cron(app: FastAPI) -> None:
+    @app.on_event("startup")
+    @repeat_every(seconds=60*60, wait_first=True, logger=logger)
+    async def scheduled_purge() -> None:
+        async with AsyncSessionLocal() as session:
+            try:
+                purged = await purge_expired_keys(session)
+                await session.commit()
+                logger.info("Expired idempotency keys purged: %s rows", purged)
+            except Exception:
+                logger.exception("Idempotency keys purge failed")
@@ -0,0 +1,109 @@
+import hashlib
+import os
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+from src.config import LEADER_LOCK_DIR, logger
+
+try:
+    import fcntl
+except ImportError:     # Windows: no flock, single-process dev setups only
+    fcntl = None
+
+
+def lock_key(name: str) -> int:
+    """Stable signed 64-bit advisory lock key for ``name``."""
+    return int.from_bytes(hashlib.sha256(name.encode()).digest()[:8], "big", signed=True)
+
+
+class LeaderLock:
+    """Leadership of one named job among every process sharing a database.
+
+    On Postgres the leader holds a session-level advisory lock on a
+    dedicated connection, so the lock goes away with the process (or the
+    connection). Other databases fall back to an exclusive ``flock`` on a
+    file in ``LEADER_LOCK_DIR``, which covers the workers of one host.
+
+    :meth:`acquire` is cheap to call on every run: the leader only checks
+    that its connection is still alive, the others retry the lock, so a
+    follower takes over on its next run after the leader dies.
+    """
+
+    def __init__(self, engine: AsyncEngine, name: str, lock_dir: str = LEADER_LOCK_DIR):
+        self.engine = engine
+        self.name = name
+        self.key = lock_key(name)
+        self.path = os.path.join(lock_dir, f"homiak-{name}.lock")
+        self._conn: Optional[AsyncConnection] = None
+        self._fd: Optional[int] = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._conn is not None or self._fd is not None
+
+    async def acquire(self) -> bool:
+        if self.engine.dialect.name == "postgresql":
+            return await self._acquire_advisory()
+        return self._acquire_file()
+
+    async def _acquire_advisory(self) -> bool:
+        if self._conn is not None:
+            try:
+                await self._conn.execute(text("SELECT 1"))
+                return True
+            except Exception:
+                logger.warning("Lost the '%s' leader connection", self.name)
+                await self._close_connection()
+
+        conn = await self.engine.connect()
+        try:
+            # autocommit: the lock belongs to the session, not to a transaction left open
+            await conn.execution_options(isolation_level="AUTOCOMMIT")
+            acquired = (await conn.execute(
+                text("SELECT pg_try_advisory_lock(:key)"), {"key": self.key}
+            )).scalar_one()
+        except Exception:
+            await conn.close()
+            raise
+        if not acquired:
+            await conn.close()
+            return False
+        self._conn = conn
+        logger.info("Process %s leads '%s'", os.getpid(), self.name)
+        return True
+
+    def _acquire_file(self) -> bool:
+        if self._fd is not None:
+            return True
+        if fcntl is None:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._fd = fd
+        logger.info("Process %s leads '%s'", os.getpid(), self.name)
+        return True
+
+    async def _close_connection(self) -> None:
+        conn, self._conn = self._conn, None
+        try:
+            await conn.invalidate()
+        except Exception:
+            pass
+
+    async def release(self) -> None:
+        if self._conn is not None:
+            try:
+                await self._conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": self.key})
+                await self._conn.close()
+            except Exception:
+                await self._close_connection()
+            self._conn = None
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
@@ -8,6 +8,7 @@ from sqlalchemy.pool import StaticPool
 from src.app import create_app
 from src.database import Base, get_db
 from src.models import Currencies, Currency, User
+from src.transactions.currency_converter import rate_cache
 from src.utils.auth_services import hash_password
 
 app = create_app(enable_cron=False)
@@ -22,7 +23,7 @@ engine = create_async_engine(
 )
 TestingSession = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
 
-TABLES_TO_CLEAN = ["notifications", "transactions", "goals", "users", "currencies"]
+TABLES_TO_CLEAN = ["notifications", "idempotency_keys", "archived_balances", "transaction_monthly_rollups", "transactions", "recurring_transactions", "goals", "users", "currencies", "currency_rates"]
 
 
 # ── DB lifecycle ──────────────────────────────────────────────────────────────
@@ -43,6 +44,7 @@ async def clean_tables():
     async with engine.begin() as conn:
         for table in TABLES_TO_CLEAN:
             await conn.execute(text(f"DELETE FROM {table}"))
+    rate_cache.clear()
 
 
 @pytest_asyncio.fixture()
@@ -109,6 +111,7 @@ async def seed_currency(db):
         Currency(name="PLN", rate=4.0),
     ])
     await db.commit()
+    rate_cache.clear()
 
 
 @pytest_asyncio.fixture()
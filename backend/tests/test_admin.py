@@ -0,0 +1,115 @@
+"""
+API tests – /api/admin
+Tests: 70-72
+"""
+import pytest
+from sqlalchemy import update
+from src.models import User, UserStatus
+
+
+async def _make_admin(db, user):
+    await db.execute(update(User).where(User.id_ == user.id_).values(role=UserStatus.ADMIN))
+    await db.commit()
+
+
+@pytest.mark.asyncio
+class TestCapitalReconciliation:
+
+    async def test_requires_admin(self, client, auth_headers, test_user):              # 70
+        r = await client.post("/api/admin/reconcile-capital", headers=auth_headers)
+        assert r.status_code == 403
+
+    async def test_consistent_capital_has_no_drift(self, client, db, auth_headers,
+                                                   seed_currency, test_user):           # 71
+        await _make_admin(db, test_user)
+        for payload in (
+            {"name": "Pay", "amount": 1000, "kind": 1, "category_name": "salary", "currency": "UAH"},
+            {"name": "Tea", "amount": 3.33, "kind": 0, "category_name": "food", "currency": "EUR"},
+            {"name": "Bus", "amount": 2, "kind": 0, "category_name": "transportation"},
+        ):
+            await client.post("/api/transactions", json=payload, headers=auth_headers)
+
+        r = await client.post("/api/admin/reconcile-capital", headers=auth_headers)
+        assert r.status_code == 200
+        body = r.json()
+        assert body["users_checked"] == 1
+        assert body["drifted_count"] == 0
+
+    async def test_reports_and_fixes_drift(self, client, db, auth_headers, auth_headers2,
+                                           test_user, test_user2):                      # 72
+        await _make_admin(db, test_user)
+        await client.post("/api/transactions", json={
+            "name": "Pay", "amount": 100, "kind": 1, "category_name": "salary", "currency": "USD",
+        }, headers=auth_headers2)
+        await db.execute(update(User).where(User.id_ == test_user2.id_).values(capital=42.0))
+        await db.commit()
+
+        r = await client.post("/api/admin/reconcile-capital?batch_size=1", headers=auth_headers)
+        body = r.json()
+        assert body["users_checked"] == 2
+        assert body["drifted"] == [{"user_id": test_user2.id_, "capital": 42.0, "expected": 100.0, "drift": 58.0}]
+        assert body["fixed"] == 0
+
+        r = await client.post("/api/admin/reconcile-capital?fix=true", headers=auth_headers)
+        assert r.json()["fixed"] == 1
+        await db.refresh(test_user2)
+        assert test_user2.capital == pytest.approx(100.0)
+
+    async def test_backdated_rows_use_dated_rates(self, client, db, auth_headers,
+                                                  seed_currency, test_user):           # 91
+        from datetime import date
+
+        from src.currencies.history import record_rates
+
+        await _make_admin(db, test_user)
+        await record_rates(db, {date(2024, 1, 1): {"EUR": 0.5}, date(2024, 3, 1): {"EUR": 0.8}})
+        await db.commit()
+
+        old = await client.post("/api/transactions", json={
+            "name": "Hotel", "amount": 10, "kind": 0, "category_name": "travel", "currency": "EUR",
+            "date": "2024-02-10T12:00:00",
+        }, headers=auth_headers)
+        assert old.json()["new_capital"] == pytest.approx(-20.0)
+        r = await client.post("/api/transactions", json={
+            "name": "Tea", "amount": 10, "kind": 0, "category_name": "food", "currency": "EUR",
+        }, headers=auth_headers)
+        assert r.json()["new_capital"] == pytest.approx(-20.0 - 9.26)
+
+        r = await client.post("/api/admin/reconcile-capital", headers=auth_headers)
+        assert r.json()["drifted_count"] == 0
+        r = await client.delete(f"/api/transactions/{old.json()['id_']}", headers=auth_headers)
+        assert r.json()["new_capital"] == pytest.approx(-9.26)
+
+    async def test_archived_month_keeps_capital_reconciled(self, client, db, auth_headers,
+                                                           seed_currency, test_user):   # 110
+        from sqlalchemy import select, text
+        from src.models import ArchivedBalance
+        from src.transactions.partitioning import archive_partition
+
+        await _make_admin(db, test_user)
+        for payload in (
+            {"name": "Rent", "amount": 400, "kind": 0, "category_name": "housing", "currency": "EUR",
+             "date": "2024-01-05T12:00:00"},
+            {"name": "Pay", "amount": 1000, "kind": 1, "category_name": "salary", "date": "2024-01-20T12:00:00"},
+            {"name": "Tea", "amount": 3, "kind": 0, "category_name": "food", "date": "2024-02-01T12:00:00"},
+        ):
+            await client.post("/api/transactions", json=payload, headers=auth_headers)
+
+        # what DETACH PARTITION leaves behind: January's rows in a table of their own
+        january = "date >= '2024-01-01' AND date < '2024-02-01'"
+        await db.execute(text(f"CREATE TABLE transactions_p2024_01 AS SELECT * FROM transactions WHERE {january}"))
+        await db.execute(text(f"DELETE FROM transactions WHERE {january}"))
+        r = await client.post("/api/admin/reconcile-capital", headers=auth_headers)
+        assert r.json()["drifted_count"] == 1
+
+        try:
+            await archive_partition(await db.connection(), "transactions_p2024_01")
+            await db.commit()
+            total = (await db.execute(select(ArchivedBalance.total))).scalar_one()
+            assert float(total) == pytest.approx(1000 - 400 / 1.08, abs=0.01)
+            r = await client.post("/api/admin/reconcile-capital", headers=auth_headers)
+            assert r.json()["drifted_count"] == 0
+        finally:
+            await db.execute(text("DROP TABLE IF EXISTS transactions_p2024_01"))
+            await db.execute(text("DROP TABLE IF EXISTS transactions_archive_2024_01"))
+            await db.commit()
@@ -3,7 +3,12 @@ API tests – /api/currencies + /health
 Tests: 47-50
 """
 
+from datetime import date, datetime, timezone
+
 import pytest
+from src.config import CURRENCY_REFRESH_SECONDS
+from src.currencies.history import record_rates
+from src.transactions.currency_converter import RateCache, rate_cache
 
 
 @pytest.mark.asyncio
@@ -29,4 +34,42 @@ class TestCurrenciesAPI:
 
     async def test_get_rate_unknown_code_returns_404(self, client, seed_currency):     # 50
         r = await client.get("/api/currencies/XYZ")
-        assert r.status_code == 404
\ No newline at end of file
+        assert r.status_code == 404
+
+    async def test_rates_are_cacheable_and_revalidate(self, client, db, seed_currency):  # 99
+        await record_rates(db, {date(2024, 5, 1): {"EUR": 1.08}}, datetime(2024, 5, 1, 9, 30, tzinfo=timezone.utc))
+        await db.commit()
+
+        r = await client.get("/api/currencies")
+        assert r.status_code == 200
+        assert r.headers["cache-control"] == f"public, max-age={CURRENCY_REFRESH_SECONDS}"
+        # taken from the stored rates, so another worker loading them advertises the same time
+        assert r.headers["last-modified"] == "Wed, 01 May 2024 09:30:00 GMT"
+        assert (await RateCache().reload(db)).changed_at == rate_cache.snapshot.changed_at
+        etag, last_modified = r.headers["etag"], r.headers["last-modified"]
+
+        again = await client.get("/api/currencies", headers={"If-None-Match": etag})
+        assert again.status_code == 304
+        assert again.content == b""
+        assert again.headers["etag"] == etag
+
+        since = await client.get("/api/currencies", headers={"If-Modified-Since": last_modified})
+        assert since.status_code == 304
+        older = await client.get("/api/currencies", headers={"If-Modified-Since": "Tue, 30 Apr 2024 00:00:00 GMT"})
+        assert older.status_code == 200
+
+        stale = await client.get("/api/currencies", headers={"If-None-Match": '"other"'})
+        assert stale.status_code == 200
+        assert stale.json() == r.json()
+
+    async def test_etag_follows_rate_changes(self, client, seed_currency):             # 100
+        r = await client.get("/api/currencies/UAH")
+        etag = r.headers["etag"]
+        assert etag != (await client.get("/api/currencies/EUR")).headers["etag"]
+
+        rates = (await client.get("/api/currencies")).json()
+        rate_cache.publish({**rates, "UAH": 42.0})
+        changed = await client.get("/api/currencies/UAH", headers={"If-None-Match": etag})
+        assert changed.status_code == 200
+        assert changed.json() == 42.0
+        assert changed.headers["etag"] != etag
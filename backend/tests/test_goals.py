@@ -102,4 +102,18 @@ class TestGoalDelete:
         assert r.status_code == 204
         # confirm gone
         get_r = await client.get(f"/api/goals/{goal_id}", headers=auth_headers)
-        assert get_r.status_code == 404
\ No newline at end of file
+        assert get_r.status_code == 404
+
+
+@pytest.mark.asyncio
+class TestGoalConditionalGet:
+
+    async def test_list_goals_etag(self, client, auth_headers, test_user):             # 83
+        r = await client.get("/api/goals", headers=auth_headers)
+        etag = r.headers["ETag"]
+        r = await client.get("/api/goals", headers={**auth_headers, "If-None-Match": etag})
+        assert r.status_code == 304
+        await _create_goal(client, auth_headers)
+        r = await client.get("/api/goals", headers={**auth_headers, "If-None-Match": etag})
+        assert r.status_code == 200
+        assert r.headers["ETag"] != etag
@@ -7,8 +7,11 @@ from unittest.mock import MagicMock
 import pytest
 from sqlalchemy import select
 from src.models import Currencies, Goal, Transaction, TransactionKind, User
+from src.transactions.references import with_keys
 from src.utils.auth_services import hash_password
 
+FOOD_USD = {"category_name": "food", "currency": "USD"}
+
 
 def _pwned_mock():
     m = MagicMock()
@@ -70,8 +73,7 @@ class TestUserIntegration:
             user_id=user.id_,
             amount=100,
             kind=TransactionKind.INCOME,
-            category_name="food",
-            currency="USD",
+            **await with_keys(db, FOOD_USD),
             name="test",
         )
         db.add(tx)
@@ -108,8 +110,7 @@ class TestTransactionIntegration:
             user_id=user.id_,
             amount=250.75,
             kind=TransactionKind.INCOME,
-            category_name="food",
-            currency="USD",
+            **await with_keys(db, FOOD_USD),
             name="Salary",
         )
         db.add(tx)
@@ -137,8 +138,7 @@ class TestTransactionIntegration:
                 user_id=user.id_,
                 amount=10 * (i + 1),
                 kind=TransactionKind.EXPENSE,
-                category_name="food",
-                currency="USD",
+                **await with_keys(db, FOOD_USD),
                 name=f"tx{i}",
             ))
         await db.commit()
@@ -161,7 +161,7 @@ class TestTransactionIntegration:
         await db.refresh(u2)
 
         db.add(Transaction(user_id=u1.id_, amount=99, kind=TransactionKind.INCOME,
-                           category_name="food", currency="USD", name="u1tx"))
+                           name="u1tx", **await with_keys(db, FOOD_USD)))
         await db.commit()
 
         result = await db.execute(
@@ -281,4 +281,53 @@ class TestAuthServiceIntegration:
         await db.commit()
 
         result = await authenticate_user(db, "authinteg2@example.com", "WrongPass!")
-        assert result is None
\ No newline at end of file
+        assert result is None
+
+# ─────────────────────────────────────────────
+# Rates cache
+# ─────────────────────────────────────────────
+class TestRateCache:
+
+    @pytest.mark.asyncio
+    async def test_snapshot_served_until_refresh_or_ttl(self, db, seed_currency):  # 90
+        from src.models import Currency
+        from src.transactions.currency_converter import RateCache
+
+        cache = RateCache(ttl=3600)
+        first = await cache.current(db)
+        assert first.rates["EUR"] == 1.08 and first.rates["USD"] == 1.0
+
+        (await db.execute(select(Currency).where(Currency.name == "EUR"))).scalar_one().rate = 1.2
+        await db.commit()
+        assert await cache.current(db) is first
+
+        refreshed = await cache.reload(db)
+        assert refreshed.version == first.version + 1
+        assert refreshed.rates["EUR"] == 1.2
+
+        cache.ttl = 0
+        reloaded = await cache.current(db)
+        assert reloaded is not refreshed and reloaded.version == refreshed.version
+
+    @pytest.mark.asyncio
+    async def test_listener_applies_notifications_and_polls(self, db, seed_currency):  # 98
+        import asyncio
+        import json
+
+        from src.currencies.rate_events import RateListener
+        from src.transactions.currency_converter import RateCache
+
+        cache = RateCache(ttl=3600)
+        listener = RateListener(db.bind, cache, poll_seconds=0.01)
+        listener.handle(json.dumps({"version": 2, "rates": {"USD": 1.0, "EUR": 0.5}}))
+        listener.handle(json.dumps({"version": 1, "rates": {"USD": 1.0, "EUR": 0.1}}))
+        assert cache.snapshot.rates["EUR"] == 0.5
+
+        # SQLite has no NOTIFY: the listener polls the table instead
+        listener.start()
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            if cache.snapshot.rates["EUR"] == 1.08:
+                break
+        await listener.stop()
+        assert cache.snapshot.rates["EUR"] == 1.08
@@ -0,0 +1,97 @@
+"""
+API tests – /api/recurring
+Tests: 75-78
+"""
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import func, select, update
+from src.models import RecurringTransaction, Transaction
+from src.recurring.scheduler import materialize_due
+
+MONTHLY_RENT = {
+    "name": "Rent",
+    "amount": 400,
+    "kind": 0,
+    "category_name": "housing",
+    "currency": "USD",
+    "schedule": "0 9 1 * *",
+    "start_at": "2024-01-01T00:00:00Z",
+}
+
+
+@pytest.mark.asyncio
+class TestRecurring:
+
+    async def test_create_sets_first_occurrence(self, client, auth_headers, test_user):   # 75
+        r = await client.post("/api/recurring", json=MONTHLY_RENT, headers=auth_headers)
+        assert r.status_code == 201
+        assert r.json()["next_run_at"].startswith("2024-01-01T09:00:00")
+
+    async def test_invalid_schedule(self, client, auth_headers, test_user):               # 76
+        r = await client.post("/api/recurring", json={**MONTHLY_RENT, "schedule": "every month"},
+                              headers=auth_headers)
+        assert r.status_code == 422
+
+    async def test_materialize_backfills_and_moves_capital(self, client, db, auth_headers,
+                                                            test_user):                   # 77
+        await client.post("/api/recurring", json=MONTHLY_RENT, headers=auth_headers)
+        created = await materialize_due(db, now=datetime(2024, 3, 15, tzinfo=timezone.utc))
+        assert created == 3
+
+        r = await client.get("/api/transactions", headers=auth_headers)
+        assert [tx["date"][:10] for tx in r.json()] == ["2024-03-01", "2024-02-01", "2024-01-01"]
+        await db.refresh(test_user)
+        assert test_user.capital == pytest.approx(-1200.0)
+
+        rules = (await client.get("/api/recurring", headers=auth_headers)).json()
+        assert rules[0]["next_run_at"].startswith("2024-04-01T09:00:00")
+
+    async def test_concurrent_runs_never_double(self, client, db, auth_headers,
+                                                 test_user):                               # 78
+        r = await client.post("/api/recurring", json=MONTHLY_RENT, headers=auth_headers)
+        now = datetime(2024, 2, 10, tzinfo=timezone.utc)
+        assert await materialize_due(db, now=now) == 2
+
+        # a second worker that read the rule before the first one advanced it
+        await db.execute(
+            update(RecurringTransaction)
+            .where(RecurringTransaction.id_ == r.json()["id_"])
+            .values(next_run_at=datetime(2024, 1, 1, 9, tzinfo=timezone.utc))
+        )
+        await db.commit()
+        assert await materialize_due(db, now=now) == 0
+
+        count = (await db.execute(select(func.count()).select_from(Transaction))).scalar_one()
+        assert count == 2
+        await db.refresh(test_user)
+        assert test_user.capital == pytest.approx(-800.0)
+
+    async def test_unconvertible_currency_rejected(self, client, auth_headers, test_user):  # 104
+        r = await client.post("/api/recurring", json={**MONTHLY_RENT, "currency": "XYZ"}, headers=auth_headers)
+        assert r.status_code == 422
+        r = await client.post("/api/recurring", json={**MONTHLY_RENT, "category_name": "Pottery"}, headers=auth_headers)
+        assert r.status_code == 422
+
+        rule_id = (await client.post("/api/recurring", json=MONTHLY_RENT, headers=auth_headers)).json()["id_"]
+        r = await client.patch(f"/api/recurring/{rule_id}", json={"currency": "XYZ"}, headers=auth_headers)
+        assert r.status_code == 422
+
+    async def test_unconvertible_rule_is_paused_not_written(self, client, db, auth_headers,
+                                                             test_user):                  # 105
+        rule_id = (await client.post("/api/recurring", json=MONTHLY_RENT, headers=auth_headers)).json()["id_"]
+        # e.g. a rule stored before its currency was validated
+        await db.execute(
+            update(RecurringTransaction).where(RecurringTransaction.id_ == rule_id).values(currency="XYZ")
+        )
+        await db.commit()
+
+        assert await materialize_due(db, now=datetime(2024, 3, 15, tzinfo=timezone.utc)) == 0
+        count = (await db.execute(select(func.count()).select_from(Transaction))).scalar_one()
+        assert count == 0
+        await db.refresh(test_user)
+        assert test_user.capital == pytest.approx(0.0)
+
+        rule = (await client.get(f"/api/recurring/{rule_id}", headers=auth_headers)).json()
+        assert rule["active"] is False
+        assert rule["next_run_at"].startswith("2024-01-01T09:00:00")
@@ -2,7 +2,13 @@
 API tests – /api/transactions
 Tests: 14-28
 """
+import json
+
 import pytest
+from sqlalchemy import select
+from src.models import TransactionMonthlyRollup
+from src.transactions.references import categories, currency_codes
+from src.transactions.rollup import rebuild_rollups
 
 VALID_TX = {
     "name": "Salary",
@@ -58,6 +64,39 @@ class TestTransactionCreate:
         assert r.status_code in (422, 400)
 
 
+@pytest.mark.asyncio
+class TestTransactionBatch:
+
+    async def test_batch_creates_items_and_moves_capital(self, client, auth_headers, test_user):  # 58
+        items = [VALID_TX, VALID_EXPENSE, VALID_EXPENSE]
+        r = await client.post("/api/transactions/batch", json={"items": items}, headers=auth_headers)
+        assert r.status_code == 200
+        body = r.json()
+        assert body["created"] == 3
+        assert body["errors"] == []
+        assert body["new_capital"] == pytest.approx(989.0)
+
+        listed = await client.get("/api/transactions", headers=auth_headers)
+        assert len(listed.json()) == 3
+
+    async def test_batch_reports_invalid_items(self, client, auth_headers, test_user):     # 59
+        items = [VALID_TX, {**VALID_TX, "amount": -1}, {**VALID_TX, "currency": "XYZ"}]
+        r = await client.post("/api/transactions/batch", json={"items": items}, headers=auth_headers)
+        assert r.status_code == 200
+        body = r.json()
+        assert body["created"] == 1
+        assert [e["index"] for e in body["errors"]] == [1, 2]
+        assert body["new_capital"] == pytest.approx(1000.0)
+
+    async def test_batch_reports_non_object_items(self, client, auth_headers, test_user):  # 101
+        items = ["oops", VALID_TX, 42, None]
+        r = await client.post("/api/transactions/batch", json={"items": items}, headers=auth_headers)
+        assert r.status_code == 200
+        body = r.json()
+        assert body["created"] == 1
+        assert [e["index"] for e in body["errors"]] == [0, 2, 3]
+
+
 @pytest.mark.asyncio
 class TestTransactionRead:
 
@@ -73,6 +112,98 @@ class TestTransactionRead:
         assert r.status_code == 200
         assert len(r.json()) <= 2
 
+    async def test_list_cursor_walks_all_pages(self, client, auth_headers, test_user):   # 55
+        created = []
+        for i in range(5):
+            r = await _create_tx(client, auth_headers, {**VALID_TX, "date": f"2024-01-0{i + 1}T10:00:00"})
+            created.append(r.json()["id_"])
+
+        seen, cursor = [], None
+        while True:
+            url = "/api/transactions?limit=2" + (f"&cursor={cursor}" if cursor else "")
+            r = await client.get(url, headers=auth_headers)
+            assert r.status_code == 200
+            seen.extend(tx["id_"] for tx in r.json())
+            cursor = r.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+        assert seen == list(reversed(created))
+
+    async def test_list_invalid_cursor_returns_400(self, client, auth_headers, test_user):  # 56
+        r = await client.get("/api/transactions?cursor=not-a-cursor", headers=auth_headers)
+        assert r.status_code == 400
+
+    async def test_list_filters(self, client, auth_headers, test_user):                  # 67
+        await _create_tx(client, auth_headers, {**VALID_TX, "date": "2024-01-05T10:00:00"})
+        await _create_tx(client, auth_headers, {**VALID_EXPENSE, "date": "2024-02-05T10:00:00"})
+        await _create_tx(client, auth_headers, {**VALID_EXPENSE, "amount": 50, "category_name": "car",
+                                                "date": "2024-03-05T10:00:00"})
+
+        async def names(query):
+            r = await client.get(f"/api/transactions?{query}", headers=auth_headers)
+            assert r.status_code == 200
+            return [(tx["category_name"], float(tx["amount"])) for tx in r.json()]
+
+        assert await names("kind=0") == [("car", 50.0), ("food", 5.5)]
+        assert await names("category_name=food") == [("food", 5.5), ("food", 1000.0)]
+        assert await names("amount_min=10&amount_max=100") == [("car", 50.0)]
+        assert await names("date_from=2024-02-01T00:00:00&date_to=2024-03-01T00:00:00") == [("food", 5.5)]
+        assert await names("currency=usd&kind=1") == [("food", 1000.0)]
+
+    async def test_list_search_ranks_and_pages(self, client, auth_headers, test_user):   # 68
+        for name, category in [("Pet food", "shopping"), ("Dinner", "food"),
+                               ("Late pet vet", "health"), ("Collar", "pets"),
+                               ("50%_off", "shopping")]:
+            await _create_tx(client, auth_headers, {**VALID_EXPENSE, "name": name, "category_name": category})
+
+        first = await client.get("/api/transactions?q=PET&limit=2", headers=auth_headers)
+        assert first.status_code == 200
+        assert [tx["name"] for tx in first.json()] == ["Pet food", "Late pet vet"]
+        rest = await client.get(f"/api/transactions?q=PET&limit=2&cursor={first.headers['X-Next-Cursor']}",
+                                headers=auth_headers)
+        assert [tx["name"] for tx in rest.json()] == ["Collar"]
+
+        literal = await client.get("/api/transactions?q=%25_", headers=auth_headers)
+        assert [tx["name"] for tx in literal.json()] == ["50%_off"]
+
+    async def test_category_and_currency_are_interned(self, client, auth_headers, db, seed_currency):  # 89
+        from src.models import Category, CurrencyCode
+
+        first = await _create_tx(client, auth_headers, {**VALID_EXPENSE, "category_name": " lottery ", "currency": "eur"})
+        assert first.status_code == 201
+        assert (first.json()["category_name"], first.json()["currency"]) == ("lottery", "EUR")
+        second = await _create_tx(client, auth_headers, {**VALID_EXPENSE, "category_name": "lottery", "currency": "EUR"})
+        r = await client.patch(f"/api/transactions/{second.json()['id_']}",
+                               json={"currency": None}, headers=auth_headers)
+        assert r.json()["currency"] is None
+
+        assert len((await db.execute(select(Category).where(Category.name == "lottery"))).all()) == 1
+        assert len((await db.execute(select(CurrencyCode).where(CurrencyCode.code == "EUR"))).all()) == 1
+        r = await client.get("/api/transactions?category_name=lottery", headers=auth_headers)
+        assert [tx["currency"] for tx in r.json()] == [None, "EUR"]
+        r = await client.get(f"/api/transactions/{first.json()['id_']}", headers=auth_headers)
+        assert r.json()["category_name"] == "lottery"
+
+    async def test_unknown_category_is_rejected(self, client, auth_headers, db, test_user):  # 106
+        from src.models import Category
+
+        junk = {**VALID_EXPENSE, "category_name": "Pottery"}
+        r = await _create_tx(client, auth_headers, junk)
+        assert r.status_code == 422
+
+        r = await client.post("/api/transactions/batch", json={"items": [VALID_EXPENSE, junk]}, headers=auth_headers)
+        assert (r.json()["created"], [e["index"] for e in r.json()["errors"]]) == (1, [1])
+
+        tx_id = (await client.get("/api/transactions", headers=auth_headers)).json()[0]["id_"]
+        r = await client.patch(f"/api/transactions/{tx_id}", json={"category_name": "Pottery"}, headers=auth_headers)
+        assert r.status_code == 422
+
+        csv_body = "date,amount,name,category_name\n2024-03-01T09:00:00,-1,Vase,Pottery\n"
+        r = await client.post("/api/transactions/import?format=csv", content=csv_body, headers=auth_headers)
+        assert (r.json()["imported"], r.json()["error_count"]) == (0, 1)
+
+        assert (await db.execute(select(Category).where(Category.name == "Pottery"))).first() is None
+
     async def test_get_by_id_success(self, client, auth_headers, test_user):            # 21
         create_r = await _create_tx(client, auth_headers)
         tx_id = create_r.json()["id_"]
@@ -93,6 +224,323 @@ class TestTransactionRead:
         assert r.status_code == 404
 
 
+@pytest.mark.asyncio
+class TestTransactionExport:
+
+    async def test_export_csv(self, client, auth_headers, test_user):                     # 60
+        await _create_tx(client, auth_headers, VALID_TX)
+        await _create_tx(client, auth_headers, VALID_EXPENSE)
+        r = await client.get("/api/transactions/export?format=csv", headers=auth_headers)
+        assert r.status_code == 200
+        assert r.headers["content-type"].startswith("text/csv")
+        lines = r.text.strip().splitlines()
+        assert lines[0] == "id_,date,name,amount,kind,category_name,currency"
+        assert len(lines) == 3
+
+    async def test_export_ndjson(self, client, auth_headers, test_user):                  # 61
+        await _create_tx(client, auth_headers, VALID_TX)
+        r = await client.get("/api/transactions/export?format=ndjson", headers=auth_headers)
+        assert r.status_code == 200
+        rows = [json.loads(line) for line in r.text.splitlines()]
+        assert len(rows) == 1
+        assert rows[0]["name"] == "Salary"
+        assert rows[0]["kind"] == "INCOME"      # same as the CSV column, which import accepts back
+
+
+@pytest.mark.asyncio
+class TestTransactionImport:
+
+    CSV = (
+        "date,amount,name,category_name,currency\n"
+        "2024-03-01T09:00:00,-12.50,\"Uber, ride\",transportation,USD\n"
+        "2024-03-02T09:00:00,2000,Salary,salary,USD\n"
+        "2024-03-02T09:00:00,2000,Salary,salary,USD\n"
+        "not-a-date,10,Broken,food,USD\n"
+    )
+
+    OFX = """OFXHEADER:100
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><CURDEF>USD
+<BANKTRANLIST>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20240305120000[-5:EST]<TRNAMT>-4.20<FITID>A1<NAME>Coffee</STMTTRN>
+<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20240306<TRNAMT>100.00<FITID>A2<NAME>Refund</STMTTRN>
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+"""
+
+    async def test_import_csv_skips_duplicates(self, client, auth_headers, test_user):    # 62
+        r = await client.post("/api/transactions/import?format=csv", content=self.CSV, headers=auth_headers)
+        assert r.status_code == 200
+        body = r.json()
+        # the two identical salary rows of one file are two transactions
+        assert body["imported"] == 3
+        assert body["duplicates"] == 0
+        assert body["error_count"] == 1
+        assert body["errors"][0]["row"] == 4
+        assert body["new_capital"] == pytest.approx(3987.5)
+
+        again = await client.post("/api/transactions/import?format=csv", content=self.CSV, headers=auth_headers)
+        assert again.json()["imported"] == 0
+        assert again.json()["duplicates"] == 3
+        assert again.json()["new_capital"] == pytest.approx(3987.5)
+
+    async def test_import_race_counts_rows_once(self, client, auth_headers, test_user, monkeypatch):  # 109
+        from src.transactions import statement_import
+
+        r = await client.post("/api/transactions/import?format=csv", content=self.CSV, headers=auth_headers)
+        assert r.json()["imported"] == 3
+
+        # a concurrent upload that checked for existing hashes before the first one committed
+        async def nothing_yet(session, user_id, hashes):
+            return set()
+
+        monkeypatch.setattr(statement_import, "_existing_hashes", nothing_yet)
+        again = await client.post("/api/transactions/import?format=csv", content=self.CSV, headers=auth_headers)
+        assert again.status_code == 200
+        assert again.json()["imported"] == 0
+        assert again.json()["duplicates"] == 3
+        assert again.json()["new_capital"] == pytest.approx(3987.5)
+
+        r = await client.get("/api/transactions/summary", headers=auth_headers)
+        assert sum(float(i["total"]) for i in r.json()["items"]) == pytest.approx(3987.5)
+
+    async def test_import_ofx(self, client, auth_headers, test_user):                     # 63
+        r = await client.post("/api/transactions/import?format=ofx", content=self.OFX, headers=auth_headers)
+        assert r.status_code == 200
+        assert r.json()["imported"] == 2
+        assert r.json()["new_capital"] == pytest.approx(95.8)
+
+    async def test_import_rejects_unstorable_amounts(self, client, auth_headers, test_user):  # 102
+        csv_body = (
+            "date,amount,name\n"
+            "2024-03-01T09:00:00,Infinity,Inf\n"
+            "2024-03-01T09:00:00,NaN,Nan\n"
+            "2024-03-01T09:00:00,1e20,Huge\n"
+            "2024-03-01T09:00:00,1.005,Fraction\n"
+            "2024-03-01T09:00:00,-7.25,Fine\n"
+        )
+        r = await client.post("/api/transactions/import?format=csv", content=csv_body, headers=auth_headers)
+        assert r.status_code == 200
+        body = r.json()
+        assert body["imported"] == 1
+        assert [e["row"] for e in body["errors"]] == [1, 2, 3, 4]
+        assert body["new_capital"] == pytest.approx(-7.25)
+
+        ofx = self.OFX.replace("<TRNAMT>100.00", "<TRNAMT>-Infinity")
+        r = await client.post("/api/transactions/import?format=ofx", content=ofx, headers=auth_headers)
+        assert r.status_code == 200
+        assert r.json()["imported"] == 1
+        assert r.json()["errors"][0]["row"] == 2
+
+
+@pytest.mark.asyncio
+class TestTransactionSummary:
+
+    async def test_summary_by_category_and_kind(self, client, auth_headers, test_user):   # 64
+        await _create_tx(client, auth_headers, VALID_TX)
+        await _create_tx(client, auth_headers, VALID_EXPENSE)
+        await _create_tx(client, auth_headers, {**VALID_EXPENSE, "category_name": "car", "amount": 20})
+        r = await client.get("/api/transactions/summary", headers=auth_headers)
+        assert r.status_code == 200
+        body = r.json()
+        assert body["currency"] == "USD"
+        totals = {(i["category_name"], i["kind"]): float(i["total"]) for i in body["items"]}
+        assert totals == {("car", 0): -20.0, ("food", 0): -5.5, ("food", 1): 1000.0}
+
+    async def test_summary_by_month_with_range(self, client, auth_headers, test_user):    # 65
+        for day in ("2024-01-15", "2024-01-20", "2024-02-03", "2024-03-01"):
+            await _create_tx(client, auth_headers, {**VALID_EXPENSE, "date": f"{day}T12:00:00"})
+        r = await client.get(
+            "/api/transactions/summary?group_by=period&period=month"
+            "&date_from=2024-01-01T00:00:00&date_to=2024-03-01T00:00:00",
+            headers=auth_headers,
+        )
+        assert r.status_code == 200
+        items = r.json()["items"]
+        assert [(i["period"], i["count"]) for i in items] == [("2024-01-01", 2), ("2024-02-01", 1)]
+        assert float(items[0]["total"]) == pytest.approx(-11.0)
+
+    async def test_summary_matches_scalar_conversion(self, client, db, auth_headers, seed_currency,
+                                                     test_user):                         # 107
+        from collections import defaultdict
+        from datetime import date, datetime, timezone
+        from decimal import Decimal
+
+        from src.currencies.history import record_rates
+        from src.models import TransactionKind
+        from src.transactions.currency_converter import convert_with_rates, load_historical_rates
+
+        r = await client.get("/api/transactions/summary", headers=auth_headers)
+        assert r.json()["items"] == []
+
+        await record_rates(db, {date(2024, 1, 10): {"EUR": 0.5, "UAH": 40.0}, date(2024, 2, 1): {"EUR": 0.9}})
+        await db.commit()
+
+        # today, before any recorded rate, and on days covered by the history
+        days = (None, "2024-01-05", "2024-01-15", "2024-02-03")
+        sums = defaultdict(Decimal)
+        for i in range(60):
+            tx = {**VALID_EXPENSE, "kind": i % 2, "amount": f"{i * 7.13 + 0.05:.2f}",
+                  "category_name": ("food", "car", "travel")[i % 3],
+                  "currency": (None, "USD", "EUR", "UAH", "PLN")[i % 5]}
+            day = days[i % 4]
+            if day is not None:
+                tx["date"] = f"{day}T12:00:00"
+            assert (await _create_tx(client, auth_headers, tx)).status_code == 201
+            sums[tx["category_name"], tx["kind"], tx["currency"], day] += Decimal(tx["amount"])
+
+        moments = {day: day and datetime.fromisoformat(day).replace(tzinfo=timezone.utc) for day in days}
+        history = await load_historical_rates(db, moments.values())
+        expected = defaultdict(Decimal)
+        for (category, kind, currency, day), amount in sums.items():
+            expected[category, kind] += convert_with_rates(
+                history.on(moments[day]), "USD", TransactionKind(kind), amount, currency,
+            )
+
+        r = await client.get("/api/transactions/summary", headers=auth_headers)
+        totals = {(i["category_name"], i["kind"]): Decimal(str(i["total"])) for i in r.json()["items"]}
+        assert totals == expected
+
+    async def test_summary_uses_rates_of_the_day(self, client, db, auth_headers, seed_currency,
+                                                 test_user):                             # 108
+        from datetime import date
+
+        from src.currencies.history import record_rates
+
+        await record_rates(db, {date(2024, 1, 10): {"EUR": 0.5}})
+        await db.commit()
+
+        r = await _create_tx(client, auth_headers,
+                             {**VALID_EXPENSE, "amount": 10, "currency": "EUR", "date": "2024-01-15T12:00:00"})
+        delta = r.json()["new_capital"]
+        assert delta == pytest.approx(-20.0)          # 10 EUR at 0.5 per USD, not today's 1.08
+
+        for query in ("", "?group_by=period&period=day"):
+            items = (await client.get(f"/api/transactions/summary{query}", headers=auth_headers)).json()["items"]
+            assert [float(i["total"]) for i in items] == [delta]
+
+
+@pytest.mark.asyncio
+class TestIdempotencyKey:
+
+    async def test_repeat_replays_without_second_write(self, client, auth_headers, test_user):  # 86
+        headers = {**auth_headers, "Idempotency-Key": "create-1"}
+        first = await client.post("/api/transactions", json=VALID_EXPENSE, headers=headers)
+        again = await client.post("/api/transactions", json=VALID_EXPENSE, headers=headers)
+        assert first.status_code == again.status_code == 201
+        assert again.headers["Idempotency-Replayed"] == "true"
+        assert again.json() == first.json()
+
+        listed = await client.get("/api/transactions", headers=auth_headers)
+        assert len(listed.json()) == 1
+        me = await client.get("/api/users/me", headers=auth_headers)
+        assert me.json()["capital"] == pytest.approx(-5.5)
+
+    async def test_key_reused_for_other_request(self, client, auth_headers, test_user):         # 87
+        headers = {**auth_headers, "Idempotency-Key": "create-2"}
+        await client.post("/api/transactions", json=VALID_EXPENSE, headers=headers)
+        r = await client.post("/api/transactions", json={**VALID_EXPENSE, "amount": 6}, headers=headers)
+        assert r.status_code == 422
+
+    async def test_failed_request_does_not_store_key(self, client, auth_headers, test_user):     # 88
+        headers = {**auth_headers, "Idempotency-Key": "delete-1"}
+        tx_id = (await _create_tx(client, auth_headers)).json()["id_"]
+        r = await client.delete(f"/api/transactions/{tx_id + 1}", headers=headers)
+        assert r.status_code == 404
+        # the 404 left nothing behind, so the key is free for the real delete, and its repeat replays
+        r = await client.delete(f"/api/transactions/{tx_id}", headers=headers)
+        assert r.status_code == 200
+        r = await client.delete(f"/api/transactions/{tx_id}", headers=headers)
+        assert r.status_code == 200 and r.json()["id_"] == tx_id
+
+
+@pytest.mark.asyncio
+class TestTransactionConditionalGet:
+
+    async def test_list_304_until_next_write(self, client, auth_headers, test_user):     # 82
+        await _create_tx(client, auth_headers)
+        r = await client.get("/api/transactions", headers=auth_headers)
+        etag = r.headers["ETag"]
+        r = await client.get("/api/transactions", headers={**auth_headers, "If-None-Match": etag})
+        assert r.status_code == 304
+        assert r.content == b""
+
+        tx_id = (await _create_tx(client, auth_headers)).json()["id_"]
+        r = await client.get("/api/transactions", headers={**auth_headers, "If-None-Match": etag})
+        assert r.status_code == 200 and len(r.json()) == 2
+
+        # a rename moves no capital but still changes the data
+        etag = r.headers["ETag"]
+        await client.patch(f"/api/transactions/{tx_id}", json={"name": "Renamed"}, headers=auth_headers)
+        r = await client.get("/api/transactions", headers={**auth_headers, "If-None-Match": etag})
+        assert r.status_code == 200
+
+
+@pytest.mark.asyncio
+class TestBalanceHistory:
+
+    async def test_balance_history_ends_at_capital(self, client, auth_headers, seed_currency, test_user):  # 73
+        await _create_tx(client, auth_headers, {**VALID_TX, "date": "2024-01-01T10:00:00"})
+        await _create_tx(client, auth_headers, {**VALID_EXPENSE, "date": "2024-01-02T10:00:00"})
+        await _create_tx(client, auth_headers, {**VALID_EXPENSE, "amount": 415, "currency": "UAH",
+                                                "date": "2024-01-03T10:00:00"})
+        r = await client.get("/api/transactions/balance-history?max_points=5000", headers=auth_headers)
+        assert r.status_code == 200
+        body = r.json()
+        assert body["currency"] == "USD"
+        assert float(body["opening_balance"]) == 0.0
+        assert [float(p["balance"]) for p in body["points"]] == [1000.0, 994.5, 984.5]
+
+    async def test_balance_history_downsamples_range(self, client, auth_headers, test_user):  # 74
+        for day in range(1, 21):
+            await _create_tx(client, auth_headers, {**VALID_EXPENSE, "amount": 1,
+                                                    "date": f"2024-01-{day:02d}T12:00:00"})
+        r = await client.get(
+            "/api/transactions/balance-history?max_points=2"
+            "&date_from=2024-01-05T00:00:00&date_to=2024-01-15T00:00:00",
+            headers=auth_headers,
+        )
+        body = r.json()
+        assert float(body["opening_balance"]) == -4.0
+        # last transaction of each 5-day bucket, anchored to the full history
+        assert [(p["date"][:10], float(p["balance"])) for p in body["points"]] == [
+            ("2024-01-09", -9.0), ("2024-01-14", -14.0),
+        ]
+
+
+@pytest.mark.asyncio
+class TestTransactionRollup:
+
+    @staticmethod
+    async def _rollup_rows(db):
+        rows = (await db.execute(
+            select(TransactionMonthlyRollup).where(TransactionMonthlyRollup.count != 0)
+        )).scalars().all()
+        return sorted([
+            (
+                r.month.isoformat(), await categories.name_for(db, r.category_id), r.kind.name,
+                await currency_codes.name_for(db, r.currency_id), float(r.total), r.count,
+            )
+            for r in rows
+        ])
+
+    async def test_rollup_follows_writes_and_matches_rebuild(self, client, auth_headers, db, test_user):  # 66
+        jan = {**VALID_EXPENSE, "date": "2024-01-10T08:00:00"}
+        await _create_tx(client, auth_headers, jan)
+        moved = await _create_tx(client, auth_headers, jan)
+        dropped = await _create_tx(client, auth_headers, {**VALID_TX, "date": "2024-02-01T08:00:00"})
+        await client.post("/api/transactions/batch", json={"items": [jan]}, headers=auth_headers)
+        await client.patch(f"/api/transactions/{moved.json()['id_']}",
+                           json={"category_name": "car", "date": "2024-03-05T08:00:00"}, headers=auth_headers)
+        await client.delete(f"/api/transactions/{dropped.json()['id_']}", headers=auth_headers)
+
+        incremental = await self._rollup_rows(db)
+        assert incremental == [
+            ("2024-01-01", "food", "EXPENSE", "USD", 11.0, 2),
+            ("2024-03-01", "car", "EXPENSE", "USD", 5.5, 1),
+        ]
+        await rebuild_rollups(db)
+        assert await self._rollup_rows(db) == incremental
+
+
 @pytest.mark.asyncio
 class TestTransactionUpdate:
 
@@ -105,6 +553,21 @@ class TestTransactionUpdate:
         assert r.status_code == 200
         assert r.json()["name"] == "Updated name"
 
+    async def test_update_amount_and_kind_moves_capital(self, client, auth_headers,
+                                                         seed_currency, test_user):     # 69
+        create_r = await _create_tx(client, auth_headers, VALID_EXPENSE)               # -5.50
+        tx_id = create_r.json()["id_"]
+
+        r = await client.patch(f"/api/transactions/{tx_id}", json={"amount": 8}, headers=auth_headers)
+        assert r.json()["new_capital"] == pytest.approx(-8.0)
+        r = await client.patch(f"/api/transactions/{tx_id}", json={"kind": 1}, headers=auth_headers)
+        assert r.json()["new_capital"] == pytest.approx(8.0)
+        r = await client.patch(f"/api/transactions/{tx_id}", json={"currency": "UAH"}, headers=auth_headers)
+        assert r.json()["new_capital"] == pytest.approx(0.19)        # 8 UAH at 41.5 per USD
+
+        me = await client.get("/api/users/me", headers=auth_headers)
+        assert me.json()["capital"] == pytest.approx(0.19)
+
     async def test_update_forbidden_for_other_user(self, client, auth_headers,
                                                     auth_headers2, test_user,
                                                     test_user2):                        # 25
@@ -123,6 +586,17 @@ class TestTransactionUpdate:
                                 headers=auth_headers)
         assert r.status_code == 422
 
+    @pytest.mark.parametrize("field", ["amount", "date", "kind", "name"])
+    async def test_update_null_required_field(self, client, auth_headers, test_user, field):  # 103
+        created = (await _create_tx(client, auth_headers)).json()
+        r = await client.patch(f"/api/transactions/{created['id_']}", json={field: None}, headers=auth_headers)
+        assert r.status_code == 422
+
+        unchanged = await client.get(f"/api/transactions/{created['id_']}", headers=auth_headers)
+        assert unchanged.json()[field] == created[field]
+        me = await client.get("/api/users/me", headers=auth_headers)
+        assert me.json()["capital"] == pytest.approx(1000.0)
+
 
 @pytest.mark.asyncio
 class TestTransactionDelete:
@@ -134,6 +608,16 @@ class TestTransactionDelete:
         assert r.status_code == 200
         assert r.json()["id_"] == tx_id
 
+    async def test_delete_reverts_capital(self, client, auth_headers, test_user):       # 57
+        await _create_tx(client, auth_headers, VALID_TX)
+        create_r = await _create_tx(client, auth_headers, VALID_EXPENSE)
+        assert create_r.json()["new_capital"] == pytest.approx(994.5)
+
+        r = await client.delete(f"/api/transactions/{create_r.json()['id_']}", headers=auth_headers)
+        assert r.json()["new_capital"] == pytest.approx(1000.0)
+        me = await client.get("/api/users/me", headers=auth_headers)
+        assert me.json()["capital"] == pytest.approx(1000.0)
+
     async def test_delete_not_found(self, client, auth_headers, test_user):             # 28
         r = await client.delete("/api/transactions/999999", headers=auth_headers)
         assert r.status_code == 404
\ No newline at end of file
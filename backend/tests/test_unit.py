@@ -117,4 +117,187 @@ class TestJwtHandlers:
         t1 = await create_access_token({"sub": "1"})
         t2 = await create_access_token({"sub": "1"})
         # exp timestamps differ by at least 1s in practice, but let's check type
-        assert isinstance(t1, str) and isinstance(t2, str)
\ No newline at end of file
+        assert isinstance(t1, str) and isinstance(t2, str)
+
+# ─────────────────────────────────────────────
+# transactions partitioning: month arithmetic
+# ─────────────────────────────────────────────
+class TestPartitionHelpers:
+
+    def test_add_months_wraps_years(self):                              # 79
+        from datetime import date
+
+        from src.transactions.partitioning import add_months
+        assert add_months(date(2024, 11, 1), 3) == date(2025, 2, 1)
+        assert add_months(date(2024, 1, 1), -1) == date(2023, 12, 1)
+
+    def test_partition_name_round_trip(self):                           # 80
+        from datetime import date
+
+        from src.transactions.partitioning import partition_month, partition_name
+        assert partition_name(date(2024, 3, 1)) == "transactions_p2024_03"
+        assert partition_month("transactions_p2024_03") == date(2024, 3, 1)
+        assert partition_month("transactions_default") is None
+
+    def test_months_to_detach_keeps_retention_window(self):             # 81
+        from datetime import date
+
+        from src.transactions.partitioning import months_to_detach
+        names = ["transactions_p2023_12", "transactions_p2024_01", "transactions_p2024_02", "transactions_default"]
+        assert months_to_detach(names, date(2024, 3, 15), retention_months=2) == ["transactions_p2023_12"]
+
+
+# ─────────────────────────────────────────────
+# fast_json: same bytes as the response_model path
+# ─────────────────────────────────────────────
+class TestFastJson:
+
+    def test_rows_match_pydantic_output(self):                          # 85
+        import json
+        from datetime import datetime, timedelta, timezone
+        from decimal import Decimal
+
+        from src.models import TransactionKind
+        from src.transactions.schemas import TransactionOut
+        from src.utils.fast_json import rows_response
+
+        keys = ("id_", "name", "amount", "kind", "category_name", "currency", "date")
+        rows = [
+            (1, "Salary", Decimal("1000.00"), TransactionKind.INCOME, "salary", "USD",
+             datetime(2024, 1, 1, 10, 0, 0, 123456, tzinfo=timezone.utc)),
+            (2, "Café", Decimal("5.50"), TransactionKind.EXPENSE, "food", None, datetime(2024, 1, 2, 8, 30)),
+            (3, "Rent", Decimal("400.00"), TransactionKind.EXPENSE, "housing", "EUR",
+             datetime(2024, 1, 3, tzinfo=timezone(timedelta(hours=2)))),
+        ]
+        fast = json.loads(rows_response(rows, keys, defaults={"new_capital": None}).body)
+        expected = [TransactionOut(**dict(zip(keys, row))).model_dump(mode="json") for row in rows]
+        assert fast == expected
+
+
+# ─────────────────────────────────────────────
+# NBU history files
+# ─────────────────────────────────────────────
+class TestNbuHistory:
+
+    def test_rates_grouped_by_exchange_date(self):                     # 92
+        from datetime import date
+
+        from src.currencies.history import nbu_history
+
+        items = [
+            {"cc": "USD", "rate": 40.0, "exchangedate": "02.01.2024"},
+            {"cc": "EUR", "rate": 44.0, "exchangedate": "02.01.2024"},
+            {"cc": "EUR", "rate": 45.0, "exchangedate": "03.01.2024"},   # no USD quote that day
+        ]
+        history = nbu_history(items)
+        assert list(history) == [date(2024, 1, 2)]
+        assert history[date(2024, 1, 2)]["UAH"] == 40.0
+        assert history[date(2024, 1, 2)]["EUR"] == pytest.approx(40.0 / 44.0)
+
+
+# ─────────────────────────────────────────────
+# Cross-rate matrix
+# ─────────────────────────────────────────────
+class TestRateMatrix:
+
+    RATES = {"USD": 1.0, "EUR": 0.7, "UAH": 1.15, "PLN": 0.35, "GBP": 0.2, "JPY": 41.5}
+
+    def test_cents_match_scalar_conversion(self):                       # 93
+        from decimal import Decimal
+
+        from src.models import TransactionKind
+        from src.transactions.currency_converter import convert_with_rates
+        from src.transactions.rate_matrix import RateMatrix
+
+        codes = list(self.RATES)
+        cents, src, dst, expense = [], [], [], []
+        for i in range(5000):       # includes half-cent ties, e.g. 190 USD cents -> 218.5 UAH cents
+            cents.append(i * 7 + 1)
+            src.append(codes[i % len(codes)])
+            dst.append(codes[(i // len(codes)) % len(codes)])
+            expense.append(i % 3 == 0)
+        expected = [
+            int(convert_with_rates(
+                self.RATES, d, TransactionKind.EXPENSE if e else TransactionKind.INCOME, Decimal(c).scaleb(-2), s,
+            ).scaleb(2))
+            for c, s, d, e in zip(cents, src, dst, expense)
+        ]
+        assert RateMatrix(self.RATES).convert_cents(cents, src, dst, expense).tolist() == expected
+
+    def test_unknown_code_raises(self):                                 # 94
+        from src.transactions.rate_matrix import RateMatrix
+
+        matrix = RateMatrix(self.RATES)
+        assert matrix.convert_cents([100], ["usd "], ["EUR"]).tolist() == [70]
+        with pytest.raises(ValueError, match="target currency 'CAD'"):
+            matrix.convert_cents([100], ["USD"], ["CAD"])
+
+
+# ─────────────────────────────────────────────
+# Leader election
+# ─────────────────────────────────────────────
+class TestLeaderLock:
+
+    @pytest.mark.asyncio
+    async def test_file_lock_has_one_leader_until_released(self, tmp_path):  # 95
+        from sqlalchemy.ext.asyncio import create_async_engine
+        from src.utils.leader import LeaderLock, lock_key
+
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        first = LeaderLock(engine, "refresh", lock_dir=str(tmp_path))
+        second = LeaderLock(engine, "refresh", lock_dir=str(tmp_path))
+
+        assert await first.acquire() is True
+        assert await first.acquire() is True
+        assert await second.acquire() is False
+        await first.release()
+        assert await second.acquire() is True and second.is_leader
+        await second.release()
+        await engine.dispose()
+        assert lock_key("refresh") == lock_key("refresh") != lock_key("other")
+
+
+# ─────────────────────────────────────────────
+# NBU client
+# ─────────────────────────────────────────────
+class TestNbuClient:
+
+    PAYLOAD = b'[{"cc": "USD", "rate": 40.0}, {"cc": "EUR", "rate": 44.0}]'
+
+    @pytest.mark.asyncio
+    async def test_retries_then_revalidates(self):                      # 96
+        import httpx
+        from src.currencies.nbu_client import NbuClient
+
+        seen = []
+
+        def handler(request):
+            seen.append(request.headers.get("if-none-match"))
+            if len(seen) == 1:
+                return httpx.Response(503)
+            if request.headers.get("if-none-match") == '"v1"':
+                return httpx.Response(304)
+            return httpx.Response(200, content=self.PAYLOAD, headers={"ETag": '"v1"'})
+
+        client = NbuClient("https://nbu.test/rates", backoff=0, transport=httpx.MockTransport(handler))
+        rates = await client.fetch()
+        assert rates["UAH"] == 40.0 and rates["EUR"] == pytest.approx(40.0 / 44.0)
+        client.confirm()
+        assert await client.fetch() is None
+        assert seen == [None, None, '"v1"']
+        await client.aclose()
+
+    @pytest.mark.asyncio
+    async def test_file_source_skips_unchanged_content(self, tmp_path):  # 97
+        from src.currencies.nbu_client import NbuClient
+
+        path = tmp_path / "nbu.json"
+        path.write_bytes(self.PAYLOAD)
+        client = NbuClient(path.as_uri())
+        assert (await client.fetch())["UAH"] == 40.0
+        # not confirmed (e.g. the write failed): fetched again
+        assert (await client.fetch())["UAH"] == 40.0
+        client.confirm()
+        assert await client.fetch() is None
+        path.write_bytes(self.PAYLOAD.replace(b"44.0", b"45.0"))
+        assert (await client.fetch())["EUR"] == pytest.approx(40.0 / 45.0)
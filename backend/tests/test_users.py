@@ -15,6 +15,14 @@ class TestUsersAPI:
         assert data["email"] == test_user.email
         assert data["username"] == test_user.username
 
+    async def test_get_me_etag(self, client, auth_headers, test_user):                  # 84
+        etag = (await client.get("/api/users/me", headers=auth_headers)).headers["ETag"]
+        r = await client.get("/api/users/me", headers={**auth_headers, "If-None-Match": etag})
+        assert r.status_code == 304
+        await client.patch("/api/users/me", json={"username": "renamed_user"}, headers=auth_headers)
+        r = await client.get("/api/users/me", headers={**auth_headers, "If-None-Match": etag})
+        assert r.status_code == 200
+
     async def test_get_user_by_own_id(self, client, auth_headers, test_user):           # 14
         r = await client.get(f"/api/users/{test_user.id_}", headers=auth_headers)
         assert r.status_code == 200
@@ -53,6 +53,10 @@ class TransactionAPI {
 
     if (filters.limit) params.append('limit', filters.limit.toString());
     if (filters.offset) params.append('offset', filters.offset.toString());
+    if (filters.kind !== undefined) params.append('kind', filters.kind.toString());
+    if (filters.category) params.append('category_name', filters.category);
+    if (filters.dateFrom) params.append('date_from', filters.dateFrom);
+    if (filters.dateTo) params.append('date_to', filters.dateTo);
 
     const endpoint = `/transactions${params.toString() ? `?${params.toString()}` : ''}`;
     return this.request<Transaction[]>(endpoint, {